@@ -55,7 +55,10 @@ exports: (
     erc20.mint,
     erc20.set_minter,
     ow.owner,
-    ow.transfer_ownership
+    # Not ow.transfer_ownership: this one also moves the minter role from
+    # the old owner to the new one, so the deployer cannot mint or burn
+    # once the DSC is handed to the engine
+    erc20.transfer_ownership
 )
 
 
@@ -63,7 +66,37 @@ exports: (
 #                           CONSTRUCTOR
 # ------------------------------------------------------------------
 @deploy
-def __init__():
+def __init__(minter: address):
+    """
+    @notice Deploy the DSC, optionally handing it to its engine right away
+    @dev With a nonzero `minter` (the DSCEngine, whose address the deploy
+         script predicts), the minter role and ownership are set here instead
+         of by a `set_minter` and a `transfer_ownership` transaction.
+         The deployer, made minter by erc20.__init__, loses the role: only
+         the engine can mint or burn without allowance
+    @param minter Address made minter and owner, or empty(address) to keep the deployer as owner
+    """
     ow.__init__()
     erc20.__init__(NAME, SYMBOL, DECIMALS, NAME, EIP712_VERSION)
+    if minter != empty(address):
+        erc20.is_minter[msg.sender] = False
+        log erc20.RoleMinterChanged(minter=msg.sender, status=False)
+        erc20.is_minter[minter] = True
+        log erc20.RoleMinterChanged(minter=minter, status=True)
+        ow._transfer_ownership(minter)
 
+
+# ------------------------------------------------------------------
+#                       EXTERNAL FUNCTIONS
+# ------------------------------------------------------------------
+@external
+def minter_burn_from(owner: address, amount: uint256):
+    """
+    @notice Destroy DSC from `owner` without spending an allowance
+    @dev Only minters (the DSCEngine) can call this. The engine only burns
+         DSC of the account that called it, so no approve is needed first
+    @param owner Address whose DSC will be destroyed
+    @param amount Amount of DSC to destroy
+    """
+    assert erc20.is_minter[msg.sender], "erc20: access is denied"
+    erc20._burn(owner, amount)
@@ -20,6 +20,7 @@
 # ------------------------------------------------------------------
 # Handle collateral tokens: WETH, WBTC contracts
 from ethereum.ercs import IERC20
+from ethereum.ercs import IERC20Detailed
 
 # Control your DSC token
 from contracts.interfaces import i_decentralized_stable_coin
@@ -31,19 +32,32 @@ from contracts.interfaces import AggregatorV3Interface
 # ------------------------------------------------------------------
 #                             CONSTANT
 # ------------------------------------------------------------------
+# Price scale of an 8-decimal Chainlink USD feed (see COLLATERAL_PRICE_SCALES)
 ADDITIONAL_FEE_PRECISION: public(constant(uint256)) = 1 * (10 ** 10)
 PRECISION: public(constant(uint256)) = 1 * (10 ** 18)
 LIQUIDATION_TRESHOLD: public(constant(uint256)) = 50
 LIQUIDATION_PRECISION: public(constant(uint256)) = 100
 LIQUIDATION_BONUS: public(constant(uint256)) = 10
 MIN_HEALTH_FACTOR: public(constant(uint256)) = 1 * (10 ** 18)
+MAX_COLLATERAL_TOKENS: public(constant(uint256)) = 10
+MAX_LIQUIDATIONS: public(constant(uint256)) = 100
+MAX_ACCOUNTS_BATCH: public(constant(uint256)) = 1000
+MAX_OPERATIONS: public(constant(uint256)) = 32
+# Prices older than this are rejected (Chainlink heartbeat + margin)
+ORACLE_TIMEOUT: public(constant(uint256)) = 3 * 60 * 60
+# Positions are packed as uint128 halves of a storage word
+UINT128_MASK: constant(uint256) = 2 ** 128 - 1
 
 
 # ------------------------------------------------------------------
 #                            IMMUTABLES
 # ------------------------------------------------------------------
 DSC: public(immutable(i_decentralized_stable_coin))
-COLLATERAL_TOKENS: public(immutable(address[2]))
+COLLATERAL_TOKENS: public(immutable(DynArray[address, MAX_COLLATERAL_TOKENS]))
+COLLATERAL_PRICE_FEEDS: public(immutable(DynArray[address, MAX_COLLATERAL_TOKENS]))
+COLLATERAL_PRECISIONS: public(immutable(DynArray[uint256, MAX_COLLATERAL_TOKENS]))
+# Scales each feed's answer to 18 decimals: 10 ** (18 - feed decimals)
+COLLATERAL_PRICE_SCALES: public(immutable(DynArray[uint256, MAX_COLLATERAL_TOKENS]))
 
 
 # ------------------------------------------------------------------
@@ -53,26 +67,92 @@ COLLATERAL_TOKENS: public(immutable(address[2]))
 # Track which Chainlink oracle to use for each token's price
 token_to_price_feed: public(HashMap[address, address]) 
 
-# Track each user's collateral holdings separately.  user          token    amount
-user_to_token_to_amount_deposited: public(HashMap[address, HashMap[address, uint256]])
+# Track each token's position in COLLATERAL_TOKENS, offset by one (0 = not supported)
+token_to_collateral_id: public(HashMap[address, uint256])
 
-# Track each user's debt (how much DSC they owe)
-user_to_dsc_minted: public(HashMap[address, uint256]) 
+# Track each user's position in one word: debt (how much DSC they owe) in the low
+# 128 bits, held collaterals in the high 128 bits (bit i <=> COLLATERAL_TOKENS[i] > 0)
+user_to_position: HashMap[address, uint256]
+
+# Track each user's collateral holdings, two tokens per word.  user   word    amounts
+# Word k holds COLLATERAL_TOKENS[2k] in the low and COLLATERAL_TOKENS[2k + 1] in the high 128 bits
+user_to_collateral_balances: HashMap[address, HashMap[uint256, uint256]]
+
+# Track the protocol-wide totals, kept in step with every position change
+# total_deposited counts deposits only: tokens sent straight to the engine are not collateral
+total_deposited: public(HashMap[address, uint256])
+total_debt: public(uint256)
+
+# Price of each collateral already read in this transaction (0 = not read yet), indexed
+# like COLLATERAL_TOKENS. Transient storage (EIP-1153) is cleared when the transaction
+# ends, so the operations of a batch or of nested calls read each feed once
+price_cache: transient(uint256[MAX_COLLATERAL_TOKENS])
+
+
+# ------------------------------------------------------------------
+#                             STRUCTS
+# ------------------------------------------------------------------
+flag Action:
+    DEPOSIT
+    REDEEM
+    MINT
+    BURN
+
+
+# One step of execute, applied to msg.sender's position. token is ignored by MINT and BURN
+struct Operation:
+    action: Action
+    token: address
+    amount: uint256
+
+
+struct AccountInformation:
+    total_dsc_minted: uint256
+    # Indexed like COLLATERAL_TOKENS
+    collateral_balances: uint256[MAX_COLLATERAL_TOKENS]
+    collateral_value_usd: uint256
+    health_factor: uint256
 
 
 # ------------------------------------------------------------------
 #                              EVENTS
 # ------------------------------------------------------------------
+# Every position change is logged, so positions can be rebuilt from logs alone:
+#   collateral  += CollateralDeposited.amount  (user)
+#               -= CollateralRedeem.amount     (redeemed_from, also in liquidations)
+#   debt        += DscMinted.amount            (user)
+#               -= DscBurned.amount            (on_behalf_of)
+#               -= Liquidation.debt_covered    (user)
 event CollateralDeposited:
     user: indexed(address)
-    amount: indexed(uint256)
+    token: indexed(address)
+    amount: uint256
 
 
 event CollateralRedeem:
     token: indexed(address)
-    amount: indexed(uint256)
-    _from: address
-    _to: address
+    redeemed_from: indexed(address)
+    redeemed_to: indexed(address)
+    amount: uint256
+
+
+event DscMinted:
+    user: indexed(address)
+    amount: uint256
+
+
+event DscBurned:
+    on_behalf_of: indexed(address)
+    dsc_from: indexed(address)
+    amount: uint256
+
+
+event Liquidation:
+    user: indexed(address)
+    liquidator: indexed(address)
+    collateral: indexed(address)
+    debt_covered: uint256
+    collateral_seized: uint256
 
 
 # ------------------------------------------------------------------
@@ -80,22 +160,38 @@ event CollateralRedeem:
 # ------------------------------------------------------------------
 @deploy
 def __init__(
-    token_addresses: address[2], 
-    price_feed_addresses: address[2], 
+    token_addresses: DynArray[address, MAX_COLLATERAL_TOKENS], 
+    price_feed_addresses: DynArray[address, MAX_COLLATERAL_TOKENS], 
     dsc_address: address
 ):
     """
     @notice Initialize the DSCEngine with collateral tokens and price feed
-    @dev Sets up the mapping between collateral tokens and their Chainlink price feeds
-    @param token_addresses Array containing WETH and WBTC token addresses
+    @dev Sets up the collateral registry: token, Chainlink price feed, token
+         precision and feed scale are fixed at construction and stored as immutables
+    @param token_addresses Array containing the collateral token addresses (e.g. WETH, WBTC)
     @param price_feed_addresses Array containing corresponding Chainlink price feed addresses
     @param dsc_address Address of the Decentralized Stable Coin (DSC) contract
     """
+    assert len(token_addresses) == len(price_feed_addresses), "DSCEngine: Token and price feed lengths differ"
+
+    precisions: DynArray[uint256, MAX_COLLATERAL_TOKENS] = []
+    price_scales: DynArray[uint256, MAX_COLLATERAL_TOKENS] = []
+    for i: uint256 in range(len(token_addresses), bound=MAX_COLLATERAL_TOKENS):
+        token: address = token_addresses[i]
+        assert self.token_to_collateral_id[token] == 0, "DSCEngine: Duplicate collateral token"
+        self.token_to_price_feed[token] = price_feed_addresses[i]
+        self.token_to_collateral_id[token] = i + 1
+        decimals: uint8 = staticcall IERC20Detailed(token).decimals()
+        precisions.append(10 ** convert(decimals, uint256))
+        feed_decimals: uint8 = staticcall AggregatorV3Interface(price_feed_addresses[i]).decimals()
+        assert feed_decimals <= 18, "DSCEngine: Price feed decimals too high"
+        price_scales.append(10 ** convert(18 - feed_decimals, uint256))
+
     DSC = i_decentralized_stable_coin(dsc_address)
     COLLATERAL_TOKENS = token_addresses
-    # This is gas inefficient, better Dynarrays!
-    self.token_to_price_feed[token_addresses[0]] = price_feed_addresses[0]
-    self.token_to_price_feed[token_addresses[1]] = price_feed_addresses[1]
+    COLLATERAL_PRICE_FEEDS = price_feed_addresses
+    COLLATERAL_PRECISIONS = precisions
+    COLLATERAL_PRICE_SCALES = price_scales
 
 
 # ------------------------------------------------------------------
@@ -126,6 +222,76 @@ def deposit_and_mint(token_collateral_address: address, amount_collateral: uint2
     self._mint_dsc(amount_dsc)
 
 
+@external
+def deposit_with_permit(
+    token_collateral_address: address,
+    amount_collateral: uint256,
+    deadline: uint256,
+    v: uint8,
+    r: bytes32,
+    s: bytes32
+):
+    """
+    @notice Approve and deposit collateral in a single transaction
+    @dev Uses the collateral token's EIP-2612 permit instead of a separate approve
+    @param token_collateral_address Address of the collateral token to deposit
+    @param amount_collateral Amount of collateral to deposit
+    @param deadline Timestamp until which the permit signature is valid
+    @param v The secp256k1 1-byte signature parameter v
+    @param r The secp256k1 32-byte signature parameter r
+    @param s The secp256k1 32-byte signature parameter s
+    """
+    self._permit(token_collateral_address, amount_collateral, deadline, v, r, s)
+    self._deposit_collateral(token_collateral_address, amount_collateral)
+
+
+@external
+def deposit_and_mint_with_permit(
+    token_collateral_address: address,
+    amount_collateral: uint256,
+    amount_dsc: uint256,
+    deadline: uint256,
+    v: uint8,
+    r: bytes32,
+    s: bytes32
+):
+    """
+    @notice Approve, deposit collateral and mint DSC in a single transaction
+    @dev Uses the collateral token's EIP-2612 permit instead of a separate approve
+    @param token_collateral_address Address of the collateral token to deposit
+    @param amount_collateral Amount of collateral to deposit
+    @param amount_dsc Amount of DSC to mint
+    @param deadline Timestamp until which the permit signature is valid
+    @param v The secp256k1 1-byte signature parameter v
+    @param r The secp256k1 32-byte signature parameter r
+    @param s The secp256k1 32-byte signature parameter s
+    """
+    self._permit(token_collateral_address, amount_collateral, deadline, v, r, s)
+    self._deposit_collateral(token_collateral_address, amount_collateral)
+    self._mint_dsc(amount_dsc)
+
+
+@external
+def deposit_multi_and_mint(
+    tokens: DynArray[address, MAX_COLLATERAL_TOKENS],
+    amounts: DynArray[uint256, MAX_COLLATERAL_TOKENS],
+    amount_dsc: uint256
+):
+    """
+    @notice Deposit several collaterals and mint DSC in a single transaction
+    @dev The health factor is checked once, after every deposit. With amount_dsc
+         of 0 nothing is minted and no health check is needed
+    @param tokens Addresses of the collateral tokens to deposit
+    @param amounts Amount of each collateral to deposit
+    @param amount_dsc Amount of DSC to mint
+    """
+    assert len(tokens) == len(amounts), "DSCEngine: Tokens and amounts lengths differ"
+    for i: uint256 in range(len(tokens), bound=MAX_COLLATERAL_TOKENS):
+        self._deposit_collateral(tokens[i], amounts[i])
+    if amount_dsc > 0:
+        self._mint_dsc(amount_dsc)
+
+
 @external
 def mint_dsc(amount: uint256):
     """
@@ -145,7 +311,7 @@ def redeem_collateral(token_collateral_address: address, amount: uint256):
     @param amount Amount of collateral to redeem
     """
     self._redeem_collateral(token_collateral_address, amount, msg.sender, msg.sender)
-    self._revert_if_health_factor_broken(msg.sender)
+    self._revert_if_health_factor_broken(msg.sender, empty(uint256[MAX_COLLATERAL_TOKENS]))
     
 
 @external
@@ -159,7 +325,29 @@ def redeem_for_dsc(token_collateral: address, amount_collateral: uint256, amount
     """
     self._burn_dsc(amount_dsc, msg.sender, msg.sender)
     self._redeem_collateral(token_collateral, amount_collateral, msg.sender, msg.sender)
-    self._revert_if_health_factor_broken(msg.sender)
+    self._revert_if_health_factor_broken(msg.sender, empty(uint256[MAX_COLLATERAL_TOKENS]))
+
+
+@external
+def burn_and_redeem_multi(
+    tokens: DynArray[address, MAX_COLLATERAL_TOKENS],
+    amounts: DynArray[uint256, MAX_COLLATERAL_TOKENS],
+    amount_dsc: uint256
+):
+    """
+    @notice Burn DSC and redeem several collaterals in a single transaction
+    @dev Burns DSC first (if amount_dsc > 0), then redeems every collateral,
+         and checks the health factor once at the end
+    @param tokens Addresses of the collateral tokens to redeem
+    @param amounts Amount of each collateral to redeem
+    @param amount_dsc Amount of DSC to burn
+    """
+    assert len(tokens) == len(amounts), "DSCEngine: Tokens and amounts lengths differ"
+    if amount_dsc > 0:
+        self._burn_dsc(amount_dsc, msg.sender, msg.sender)
+    for i: uint256 in range(len(tokens), bound=MAX_COLLATERAL_TOKENS):
+        self._redeem_collateral(tokens[i], amounts[i], msg.sender, msg.sender)
+    self._revert_if_health_factor_broken(msg.sender, empty(uint256[MAX_COLLATERAL_TOKENS]))
 
 
 @external
@@ -170,7 +358,31 @@ def burn_dsc(amount: uint256):
     @param amount Amount of DSC to burn
     """
     self._burn_dsc(amount, msg.sender, msg.sender)
-    self._revert_if_health_factor_broken(msg.sender)
+    self._revert_if_health_factor_broken(msg.sender, empty(uint256[MAX_COLLATERAL_TOKENS]))
+
+
+@external
+def execute(operations: DynArray[Operation, MAX_OPERATIONS]):
+    """
+    @notice Apply several deposits, redemptions, mints and burns in a single transaction
+    @dev Operations run in order on msg.sender's position, each exactly like its
+         standalone function but without a health check. Only the final health
+         factor is checked, once: intermediate states are never left on chain
+    @param operations Operations to apply, in order
+    """
+    for operation: Operation in operations:
+        if operation.action == Action.DEPOSIT:
+            self._deposit_collateral(operation.token, operation.amount)
+        elif operation.action == Action.REDEEM:
+            self._redeem_collateral(operation.token, operation.amount, msg.sender, msg.sender)
+        elif operation.action == Action.MINT:
+            self._add_debt(operation.amount)
+            extcall DSC.mint(msg.sender, operation.amount)
+        elif operation.action == Action.BURN:
+            self._burn_dsc(operation.amount, msg.sender, msg.sender)
+        else:
+            raise "DSCEngine: Unknown action"
+    self._revert_if_health_factor_broken(msg.sender, empty(uint256[MAX_COLLATERAL_TOKENS]))
 
 
 @external
@@ -180,26 +392,69 @@ def liquidate(collateral: address, user: address, debt_to_cover: uint256):
     @dev Liquidator pays off user's debt and receives collateral plus a bonus
          The liquidated user's health factor must be below MIN_HEALTH_FACTOR
          The liquidation must improve the user's health factor
+         Prices are read once and shared by every valuation in the call
     @param collateral Address of the collateral token to seize
     @param user Address of the user to liquidate
     @param debt_to_cover Amount of DSC debt to cover
     """
-    assert debt_to_cover > 0, "DSCEngine: Needs more than zero"
-    starting_health_factor: uint256 = self._health_factor(user)
-    assert starting_health_factor < MIN_HEALTH_FACTOR, "DSCEngine: Health factor is good"
+    collateral_index: uint256 = self._collateral_index(collateral)
+    prices: uint256[MAX_COLLATERAL_TOKENS] = self._cache_prices(
+        (self.user_to_position[user] >> 128) | (1 << collateral_index),
+        empty(uint256[MAX_COLLATERAL_TOKENS])
+    )
 
-    token_amount_from_debt_covered: uint256 = self._get_token_amount_from_usd(collateral, debt_to_cover)
-    bonus_collateral: uint256 = (token_amount_from_debt_covered * LIQUIDATION_BONUS) // LIQUIDATION_PRECISION
+    self._liquidate(collateral, collateral_index, user, debt_to_cover, prices, False)
+    # Minter burn: the caller does not need to approve the engine first
+    extcall DSC.minter_burn_from(msg.sender, debt_to_cover)
 
-    self._redeem_collateral(collateral, token_amount_from_debt_covered + bonus_collateral, user, msg.sender)
-    self._burn_dsc(debt_to_cover, user, msg.sender)
+    self._revert_if_health_factor_broken(msg.sender, prices)
 
-    ending_health_factor: uint256 = self._health_factor(user)
-    assert ending_health_factor > starting_health_factor, "DSCEngine: Didn't improve health factor"
-    self._revert_if_health_factor_broken(msg.sender)
+
+@external
+def liquidate_many(
+    collateral: address,
+    users: DynArray[address, MAX_LIQUIDATIONS],
+    debts: DynArray[uint256, MAX_LIQUIDATIONS],
+    skip_healthy: bool
+) -> uint256:
+    """
+    @notice Liquidate several undercollateralized positions in one transaction
+    @dev Every position follows the rules of liquidate. Like liquidate, only the
+         collaterals of the listed users and the seized token are priced, each once:
+         a stale feed of a token none of them holds does not block the batch.
+         The covered DSC is burned from the liquidator in a single call and the
+         liquidator's health factor is checked once at the end
+    @param collateral Address of the collateral token to seize
+    @param users Addresses of the users to liquidate
+    @param debts Amount of DSC debt to cover for each user
+    @param skip_healthy If True, healthy users are skipped instead of reverting
+    @return Number of positions liquidated
+    """
+    assert len(users) == len(debts), "DSCEngine: Users and debts lengths differ"
+    collateral_index: uint256 = self._collateral_index(collateral)
+    prices: uint256[MAX_COLLATERAL_TOKENS] = empty(uint256[MAX_COLLATERAL_TOKENS])
+
+    liquidated: uint256 = 0
+    total_debt_covered: uint256 = 0
+    for i: uint256 in range(len(users), bound=MAX_LIQUIDATIONS):
+        # Price lazily: only what this user holds, plus the seized token
+        prices = self._cache_prices(
+            (self.user_to_position[users[i]] >> 128) | (1 << collateral_index), prices
+        )
+        if self._liquidate(collateral, collateral_index, users[i], debts[i], prices, skip_healthy):
+            liquidated += 1
+            total_debt_covered += debts[i]
+
+    if total_debt_covered > 0:
+        # Minter burn: the caller does not need to approve the engine first
+        extcall DSC.minter_burn_from(msg.sender, total_debt_covered)
+
+    self._revert_if_health_factor_broken(msg.sender, prices)
+    return liquidated
 
 
 @external
+@view
 def get_account_information(user: address) -> (uint256, uint256):
     """
     @notice Get user's account information
@@ -208,7 +463,7 @@ def get_account_information(user: address) -> (uint256, uint256):
     @return total_dsc_minted Total DSC debt of the user
     @return collateral_value_usd Total collateral value in USD (18 decimals)
     """
-    return self._get_account_information(user)
+    return self._get_account_information(user, empty(uint256[MAX_COLLATERAL_TOKENS]))
 
 
 @external
@@ -221,7 +476,8 @@ def get_token_amount_from_usd(token: address, usd_amount_in_wei: uint256) -> uin
     @param usd_amount_in_wei USD amount with 18 decimals
     @return Token amount corresponding to the USD value
     """
-    return self._get_token_amount_from_usd(token, usd_amount_in_wei)
+    collateral_index: uint256 = self._collateral_index(token)
+    return self._get_token_amount_from_usd(collateral_index, usd_amount_in_wei, self._get_price(collateral_index))
 
 
 @external
@@ -234,10 +490,12 @@ def get_usd_value(token: address, amount: uint256) -> uint256:
     @param amount Amount of tokens
     @return USD value with 18 decimals
     """
-    return self._get_usd_value(token, amount)
+    collateral_index: uint256 = self._collateral_index(token)
+    return self._get_usd_value(collateral_index, amount, self._get_price(collateral_index))
 
 
 @external
+@pure
 def calculate_health_factor(total_dsc_minted: uint256, total_collateral_value_usd: uint256) -> uint256:
     """
     @notice Calculate health factor from given values
@@ -251,6 +509,7 @@ def calculate_health_factor(total_dsc_minted: uint256, total_collateral_value_us
 
 
 @external
+@view
 def health_factor(user: address) -> uint256:
     """
     @notice Get user's current health factor
@@ -258,7 +517,129 @@ def health_factor(user: address) -> uint256:
     @param user Address of the user to query
     @return Health factor with 18 decimals (1e18 = 100%)
     """
-    return self._health_factor(user)
+    return self._health_factor(user, empty(uint256[MAX_COLLATERAL_TOKENS]))
+
+
+@external
+@view
+def get_max_mintable(user: address) -> uint256:
+    """
+    @notice Get how much more DSC a user can mint
+    @dev Exact: minting the result keeps the health factor >= MIN_HEALTH_FACTOR,
+         one wei more reverts. 0 if the position is already at or below the minimum
+    @param user Address of the user to query
+    @return Amount of DSC the user can still mint
+    """
+    total_dsc_minted: uint256 = 0
+    collateral_value_usd: uint256 = 0
+    total_dsc_minted, collateral_value_usd = self._get_account_information(user, empty(uint256[MAX_COLLATERAL_TOKENS]))
+    max_dsc_minted: uint256 = min(self._max_debt(collateral_value_usd), UINT128_MASK)
+    if max_dsc_minted <= total_dsc_minted:
+        return 0
+    return max_dsc_minted - total_dsc_minted
+
+
+@external
+@view
+def get_max_redeemable(user: address, token_collateral: address) -> uint256:
+    """
+    @notice Get how much of one collateral a user can redeem
+    @dev Exact: redeeming the result keeps the health factor >= MIN_HEALTH_FACTOR,
+         one unit more reverts. Each token's amount assumes the others stay deposited.
+         The whole balance without debt, 0 if the position is already broken
+    @param user Address of the user to query
+    @param token_collateral Address of the collateral token
+    @return Amount of the collateral the user can redeem
+    """
+    collateral_index: uint256 = self._collateral_index(token_collateral)
+    position: uint256 = self.user_to_position[user]
+    total_dsc_minted: uint256 = position & UINT128_MASK
+    balance: uint256 = self._get_collateral_amount(user, collateral_index)
+    if total_dsc_minted == 0 or balance == 0:
+        return balance
+
+    prices: uint256[MAX_COLLATERAL_TOKENS] = empty(uint256[MAX_COLLATERAL_TOKENS])
+    prices[collateral_index] = self._get_price(collateral_index)
+    collateral_value_usd: uint256 = self._get_account_collateral_value(user, position >> 128, prices)
+    other_value_usd: uint256 = collateral_value_usd - self._get_usd_value(collateral_index, balance, prices[collateral_index])
+    min_value_usd: uint256 = self._min_collateral_value(total_dsc_minted)
+    if other_value_usd >= min_value_usd:
+        return balance
+
+    # Smallest amount left whose (floored) value covers the rest of min_value_usd
+    price_scaled: uint256 = prices[collateral_index] * COLLATERAL_PRICE_SCALES[collateral_index]
+    min_amount: uint256 = ((min_value_usd - other_value_usd) * COLLATERAL_PRECISIONS[collateral_index] + price_scaled - 1) // price_scaled
+    if min_amount >= balance:
+        return 0
+    return balance - min_amount
+
+
+@external
+@view
+def get_accounts_information(
+    users: DynArray[address, MAX_ACCOUNTS_BATCH]
+) -> DynArray[AccountInformation, MAX_ACCOUNTS_BATCH]:
+    """
+    @notice Get debt, collateral and health factor of many users in one call
+    @dev Meant for off-chain monitoring through eth_call. The price of every
+         collateral held by any of the users is read once for the whole batch.
+         Memory is laid out for MAX_ACCOUNTS_BATCH users, so even a small batch
+         costs a few hundred thousand gas; use get_account_information for one user
+    @param users Addresses of the users to query
+    @return One AccountInformation per user, in the same order
+    """
+    held_by_any: uint256 = 0
+    for user: address in users:
+        held_by_any |= self.user_to_position[user] >> 128
+    prices: uint256[MAX_COLLATERAL_TOKENS] = self._get_price_snapshot(held_by_any)
+
+    accounts: DynArray[AccountInformation, MAX_ACCOUNTS_BATCH] = []
+    for user: address in users:
+        position: uint256 = self.user_to_position[user]
+        collateral_balances: uint256[MAX_COLLATERAL_TOKENS] = empty(uint256[MAX_COLLATERAL_TOKENS])
+        collateral_value_usd: uint256 = 0
+        held: uint256 = position >> 128
+        for i: uint256 in range(MAX_COLLATERAL_TOKENS):
+            if held == 0:
+                break
+            if held & 1 != 0:
+                collateral_balances[i] = self._get_collateral_amount(user, i)
+                collateral_value_usd += self._get_usd_value(i, collateral_balances[i], prices[i])
+            held >>= 1
+        accounts.append(
+            AccountInformation(
+                total_dsc_minted=position & UINT128_MASK,
+                collateral_balances=collateral_balances,
+                collateral_value_usd=collateral_value_usd,
+                health_factor=self._calculate_health_factor(position & UINT128_MASK, collateral_value_usd)
+            )
+        )
+    return accounts
+
+
+@external
+@view
+def get_protocol_state() -> (uint256, uint256, uint256):
+    """
+    @notice Get the solvency of the whole protocol in one call
+    @dev Values the aggregate counters, so the cost depends on the number of
+         collateral tokens, never on the number of users. Each deposited
+         token costs one price feed call
+    @return total_collateral_value_usd Value of all deposited collateral in USD (18 decimals)
+    @return total_debt Total DSC owed to the protocol
+    @return collateral_ratio Collateral value per unit of debt with 18 decimals
+            (1e18 = 100%), max_value(uint256) without debt
+    """
+    total_collateral_value_usd: uint256 = 0
+    for i: uint256 in range(len(COLLATERAL_TOKENS), bound=MAX_COLLATERAL_TOKENS):
+        amount: uint256 = self.total_deposited[COLLATERAL_TOKENS[i]]
+        if amount != 0:
+            total_collateral_value_usd += self._get_usd_value(i, amount, self._get_price(i))
+
+    total_debt: uint256 = self.total_debt
+    if total_debt == 0:
+        return total_collateral_value_usd, 0, max_value(uint256)
+    return total_collateral_value_usd, total_debt, (total_collateral_value_usd * PRECISION) // total_debt
 
 
 @external
@@ -270,7 +651,44 @@ def get_collateral_balance_of_user(user: address, token_collateral: address) ->
     @param token_collateral Address of the collateral token
     @return Amount of collateral deposited by the user
     """
-    return self.user_to_token_to_amount_deposited[user][token_collateral]
+    return self._get_collateral_balance(user, token_collateral)
+
+
+@external
+@view
+def user_to_token_to_amount_deposited(user: address, token_collateral: address) -> uint256:
+    """
+    @notice Get user's collateral balance for a specific token
+    @dev Unpacks the balance from user_to_collateral_balances
+    @param user Address of the user to query
+    @param token_collateral Address of the collateral token
+    @return Amount of collateral deposited by the user
+    """
+    return self._get_collateral_balance(user, token_collateral)
+
+
+@external
+@view
+def user_to_dsc_minted(user: address) -> uint256:
+    """
+    @notice Get user's debt (how much DSC they owe)
+    @dev Unpacks the debt from user_to_position
+    @param user Address of the user to query
+    @return Amount of DSC minted by the user
+    """
+    return self.user_to_position[user] & UINT128_MASK
+
+
+@external
+@view
+def user_to_collateral_bitmap(user: address) -> uint256:
+    """
+    @notice Get which collaterals a user holds
+    @dev Unpacks the bitmap from user_to_position
+    @param user Address of the user to query
+    @return Bitmap with bit i set <=> balance of COLLATERAL_TOKENS[i] > 0
+    """
+    return self.user_to_position[user] >> 128
 
 
 # ------------------------------------------------------------------
@@ -286,13 +704,19 @@ def _deposit_collateral(token_collateral_address: address, amount_collateral: ui
     """
     # Checks
     assert amount_collateral > 0, "DSCEngine: Needs more than zero"
-    assert self.token_to_price_feed[token_collateral_address] != empty(address), "DSCEngine: Token not supported"
+    collateral_index: uint256 = self._collateral_index(token_collateral_address)
         
     # Effects (Internal)
-    self.user_to_token_to_amount_deposited[msg.sender][
-        token_collateral_address] += amount_collateral
+    starting_amount: uint256 = 0
+    new_amount: uint256 = 0
+    starting_amount, new_amount = self._update_collateral_amount(
+        msg.sender, collateral_index, amount_collateral, True
+    )
+    # First deposit of this token: mark it as held
+    if starting_amount == 0:
+        self.user_to_position[msg.sender] |= (1 << (128 + collateral_index))
     # update storage
-    log CollateralDeposited(user=msg.sender, amount=amount_collateral)
+    log CollateralDeposited(user=msg.sender, token=token_collateral_address, amount=amount_collateral)
 
     # Interactions (External)
     # Need IERC20 to call transferFrom on WETH/WBTC
@@ -305,6 +729,32 @@ def _deposit_collateral(token_collateral_address: address, amount_collateral: ui
     # Now DSCEngine contract HOLDS the WETH as collateral
 
 
+@internal
+def _permit(token: address, amount: uint256, deadline: uint256, v: uint8, r: bytes32, s: bytes32):
+    """
+    @notice Let the engine spend the caller's collateral through an EIP-2612 permit
+    @dev Anyone who sees the signature in the mempool can submit it first, which
+         makes our permit call revert. The allowance is in place either way, so
+         a failed permit is accepted if the allowance already covers the amount
+    @param token Address of the collateral token
+    @param amount Amount the engine is allowed to spend
+    @param deadline Timestamp until which the permit signature is valid
+    @param v The secp256k1 1-byte signature parameter v
+    @param r The secp256k1 32-byte signature parameter r
+    @param s The secp256k1 32-byte signature parameter s
+    """
+    success: bool = raw_call(
+        token,
+        abi_encode(
+            msg.sender, self, amount, deadline, v, r, s,
+            method_id=method_id("permit(address,address,uint256,uint256,uint8,bytes32,bytes32)")
+        ),
+        revert_on_failure=False
+    )
+    if not success:
+        assert staticcall IERC20(token).allowance(msg.sender, self) >= amount, "DSCEngine: Permit failed"
+
+
 @internal
 def _redeem_collateral(token_collateral_address: address, amount: uint256, _from: address, _to: address):
     """
@@ -315,8 +765,14 @@ def _redeem_collateral(token_collateral_address: address, amount: uint256, _from
     @param _from Address whose collateral balance will be reduced
     @param _to Address that will receive the collateral tokens
     """
-    self.user_to_token_to_amount_deposited[_from][token_collateral_address] -= amount
-    log CollateralRedeem(token=token_collateral_address, amount=amount, _from=msg.sender, _to=msg.sender)
+    collateral_index: uint256 = self._collateral_index(token_collateral_address)
+    starting_amount: uint256 = 0
+    remaining_amount: uint256 = 0
+    starting_amount, remaining_amount = self._update_collateral_amount(_from, collateral_index, amount, False)
+    # Fully redeemed: stop valuing this token for the user
+    if remaining_amount == 0:
+        self.user_to_position[_from] &= ~(1 << (128 + collateral_index))
+    log CollateralRedeem(token=token_collateral_address, redeemed_from=_from, redeemed_to=_to, amount=amount)
 
     # Need IERC20 to call transfer on WETH/WBTC
     succes: bool = extcall IERC20(token_collateral_address).transfer(_to, amount)
@@ -330,102 +786,333 @@ def _mint_dsc(amount_dsc_to_mint: uint256):
     @dev Updates user's minted balance, checks health factor, then mints tokens
     @param amount_dsc_to_mint Amount of DSC to mint
     """
-    assert amount_dsc_to_mint > 0, "DSCEngine: Needs more than zero"
-    self.user_to_dsc_minted[msg.sender] += amount_dsc_to_mint
+    self._add_debt(amount_dsc_to_mint)
 
     # Revert't mint_dsc if ratio is broken
-    self._revert_if_health_factor_broken(msg.sender)
+    self._revert_if_health_factor_broken(msg.sender, empty(uint256[MAX_COLLATERAL_TOKENS]))
 
     # Need i_decentralized_stable_coin to call mint
     extcall DSC.mint(msg.sender, amount_dsc_to_mint)
 
 
 @internal
-def _revert_if_health_factor_broken(user: address):
+def _add_debt(amount_dsc_to_mint: uint256):
+    """
+    @notice Record DSC minted by msg.sender, without minting it or checking health
+    @param amount_dsc_to_mint Amount of DSC to add to the user's debt
+    """
+    assert amount_dsc_to_mint > 0, "DSCEngine: Needs more than zero"
+    self._set_debt(msg.sender, (self.user_to_position[msg.sender] & UINT128_MASK) + amount_dsc_to_mint)
+    log DscMinted(user=msg.sender, amount=amount_dsc_to_mint)
+
+
+@internal
+def _revert_if_health_factor_broken(user: address, prices: uint256[MAX_COLLATERAL_TOKENS]):
     """
     @notice Check if user's health factor is below minimum threshold
-    @dev Reverts if health factor < MIN_HEALTH_FACTOR (1e18)
+    @dev Reverts if health factor < MIN_HEALTH_FACTOR (1e18). Prices the
+         snapshot lacks come from the transaction's price cache
     @param user Address of the user to check
+    @param prices Price snapshot, indexed like COLLATERAL_TOKENS
     """
-    user_health_factor: uint256 = self._health_factor(user)
+    position: uint256 = self.user_to_position[user]
+    total_dsc_minted: uint256 = position & UINT128_MASK
+    # Without debt the health factor is max_value(uint256): no price is needed
+    if total_dsc_minted == 0:
+        return
+    collateral_value_usd: uint256 = self._get_account_collateral_value(
+        user, position >> 128, self._cache_prices(position >> 128, prices)
+    )
+    user_health_factor: uint256 = self._calculate_health_factor(total_dsc_minted, collateral_value_usd)
     assert user_health_factor >= MIN_HEALTH_FACTOR, "DSCEngine: Health factor broken"
 
 
 @internal
-def _get_account_information(user: address) -> (uint256, uint256):
+@view
+def _get_account_information(user: address, prices: uint256[MAX_COLLATERAL_TOKENS]) -> (uint256, uint256):
     """
     @notice returns the total DSC minted, and the total value collateral deposited
     @param user Address of the user to query
+    @param prices Price snapshot, indexed like COLLATERAL_TOKENS
     @return total_dsc_minted Total DSC debt of the user
     @return collateral_value_usd Total collateral value in USD (18 decimals)
     """
-    total_dsc_minted: uint256 = self.user_to_dsc_minted[user] # value dsc minted in $
-    collateral_value_usd: uint256 = self._get_account_collateral_value(user)
+    position: uint256 = self.user_to_position[user]
+    total_dsc_minted: uint256 = position & UINT128_MASK # value dsc minted in $
+    collateral_value_usd: uint256 = self._get_account_collateral_value(user, position >> 128, prices)
     return total_dsc_minted, collateral_value_usd
 
 
 @internal
-def _get_account_collateral_value(user: address) -> uint256:
+@view
+def _get_account_collateral_value(
+    user: address,
+    collateral_bitmap: uint256,
+    prices: uint256[MAX_COLLATERAL_TOKENS]
+) -> uint256:
     """
     @notice Calculate total USD value of user's collateral across all token types
-    @dev Iterates through all collateral tokens and sums their USD values
+    @dev Walks the user's collateral bitmap, so tokens with a zero balance cost
+         neither a storage read nor an oracle call. Prices missing from the
+         snapshot (0) are read from the price feed
     @param user Address of the user to query
+    @param collateral_bitmap Collaterals held by the user, from user_to_position
+    @param prices Price snapshot, indexed like COLLATERAL_TOKENS
     @return total_collateral_value_usd Total collateral value in USD (18 decimals)
     """
+    # The value is not stored between transactions: telling whether it is still
+    # current takes each feed's round id, i.e. the same latestRoundData call the
+    # valuation makes, and a stored value costs the same cold SLOAD as the balance
+    # word it replaces plus an SSTORE on every refresh
     total_collateral_value_usd: uint256 = 0
-    for token: address in COLLATERAL_TOKENS:
-        amount: uint256 = self.user_to_token_to_amount_deposited[user][token]
-        total_collateral_value_usd += self._get_usd_value(token, amount)
+    held: uint256 = collateral_bitmap
+    for i: uint256 in range(MAX_COLLATERAL_TOKENS):
+        if held == 0:
+            break
+        if held & 1 != 0:
+            amount: uint256 = self._get_collateral_amount(user, i)
+            price: uint256 = prices[i]
+            if price == 0:
+                price = self._get_price(i)
+            total_collateral_value_usd += self._get_usd_value(i, amount, price)
+        held = held >> 1
     return total_collateral_value_usd
 
 
 @internal
 @view
-def _get_usd_value(token: address, amount: uint256) -> uint256:
+def _get_price(collateral_index: uint256) -> uint256:
+    """
+    @notice Latest price of a collateral
+    @dev A price this transaction already cached is returned without calling the feed
+    @param collateral_index Index of the token in COLLATERAL_TOKENS
+    @return Price with the feed's decimals
+    """
+    cached_price: uint256 = self.price_cache[collateral_index]
+    if cached_price != 0:
+        return cached_price
+    return self._read_price_feed(collateral_index)
+
+
+@internal
+@view
+def _read_price_feed(collateral_index: uint256) -> uint256:
+    """
+    @notice Read the latest price of a collateral from its Chainlink price feed
+    @dev One latestRoundData call gives both the answer and its update time.
+         Reverts if the answer is not positive, is older than ORACLE_TIMEOUT,
+         claims an update time in the future or was carried over from an
+         earlier round. Bypasses the price cache
+    @param collateral_index Index of the token in COLLATERAL_TOKENS
+    @return Price with the feed's decimals
+    """
+    price_feed: AggregatorV3Interface = AggregatorV3Interface(COLLATERAL_PRICE_FEEDS[collateral_index])
+    round_id: uint80 = 0
+    price: int256 = 0
+    started_at: uint256 = 0
+    updated_at: uint256 = 0
+    answered_in_round: uint80 = 0
+    round_id, price, started_at, updated_at, answered_in_round = staticcall price_feed.latestRoundData()
+    assert price > 0, "DSCEngine: Invalid price"
+    assert updated_at != 0 and updated_at <= block.timestamp, "DSCEngine: Stale price"
+    assert block.timestamp - updated_at <= ORACLE_TIMEOUT, "DSCEngine: Stale price"
+    assert answered_in_round >= round_id, "DSCEngine: Stale price"
+    return convert(price, uint256)
+
+
+@internal
+@view
+def _get_price_snapshot(collateral_mask: uint256) -> uint256[MAX_COLLATERAL_TOKENS]:
+    """
+    @notice Read the prices needed by one external call, once
+    @dev Only collaterals whose bit is set in collateral_mask are read, the
+         other entries are left at 0 and read on demand by the valuation
+    @param collateral_mask Bitmap of collateral indexes to price
+    @return prices Price of each collateral, indexed like COLLATERAL_TOKENS
+    """
+    prices: uint256[MAX_COLLATERAL_TOKENS] = empty(uint256[MAX_COLLATERAL_TOKENS])
+    mask: uint256 = collateral_mask
+    for i: uint256 in range(MAX_COLLATERAL_TOKENS):
+        if mask == 0:
+            break
+        if mask & 1 != 0:
+            prices[i] = self._get_price(i)
+        mask = mask >> 1
+    return prices
+
+
+@internal
+def _cache_prices(
+    collateral_mask: uint256,
+    prices: uint256[MAX_COLLATERAL_TOKENS]
+) -> uint256[MAX_COLLATERAL_TOKENS]:
+    """
+    @notice Complete a price snapshot from the transaction's price cache
+    @dev Collaterals of collateral_mask missing from prices (0) are taken from
+         price_cache, or read from their feed and written to price_cache, so
+         later operations of the same transaction skip the feed
+    @param collateral_mask Bitmap of collateral indexes to price
+    @param prices Price snapshot to complete, indexed like COLLATERAL_TOKENS
+    @return snapshot Price of each masked collateral, indexed like COLLATERAL_TOKENS
+    """
+    snapshot: uint256[MAX_COLLATERAL_TOKENS] = prices
+    mask: uint256 = collateral_mask
+    for i: uint256 in range(MAX_COLLATERAL_TOKENS):
+        if mask == 0:
+            break
+        if mask & 1 != 0 and snapshot[i] == 0:
+            snapshot[i] = self.price_cache[i]
+            if snapshot[i] == 0:
+                snapshot[i] = self._read_price_feed(i)
+                self.price_cache[i] = snapshot[i]
+        mask = mask >> 1
+    return snapshot
+
+
+@internal
+@view
+def _get_collateral_amount(user: address, collateral_index: uint256) -> uint256:
+    """
+    @notice Read one collateral balance from the user's packed balances
+    @param user Address of the user to query
+    @param collateral_index Index of the token in COLLATERAL_TOKENS
+    @return Amount of collateral deposited by the user
+    """
+    word: uint256 = self.user_to_collateral_balances[user][collateral_index // 2]
+    return (word >> (128 * (collateral_index % 2))) & UINT128_MASK
+
+
+@internal
+def _update_collateral_amount(
+    user: address,
+    collateral_index: uint256,
+    amount: uint256,
+    is_deposit: bool
+) -> (uint256, uint256):
     """
-    @notice Convert token amount to USD value using Chainlink price feed
-    @dev Chainlink returns prices with 8 decimals, we scale to 18 decimals
+    @notice Add to or subtract from one collateral balance in the user's packed balances
+    @dev Reads and writes the packed word once, reverts if the result does not fit in 128 bits.
+         Also updates the token's total_deposited
+    @param user Address of the user to update
+    @param collateral_index Index of the token in COLLATERAL_TOKENS
+    @param amount Amount of collateral to add or subtract
+    @param is_deposit True to add the amount, False to subtract it
+    @return starting_amount Balance before the update
+    @return new_amount Balance after the update
+    """
+    slot: uint256 = collateral_index // 2
+    offset: uint256 = 128 * (collateral_index % 2)
+    word: uint256 = self.user_to_collateral_balances[user][slot]
+    starting_amount: uint256 = (word >> offset) & UINT128_MASK
+    new_amount: uint256 = 0
+    if is_deposit:
+        new_amount = starting_amount + amount
+    else:
+        new_amount = starting_amount - amount
+    assert new_amount <= UINT128_MASK, "DSCEngine: Amount exceeds uint128"
+    self.user_to_collateral_balances[user][slot] = (word & ~(UINT128_MASK << offset)) | (new_amount << offset)
+
+    token: address = COLLATERAL_TOKENS[collateral_index]
+    if is_deposit:
+        self.total_deposited[token] += amount
+    else:
+        self.total_deposited[token] -= amount
+    return starting_amount, new_amount
+
+
+@internal
+def _set_debt(user: address, debt: uint256):
+    """
+    @notice Write the user's debt into their packed position
+    @dev Keeps the collateral bitmap and total_debt, reverts if the debt does not fit in 128 bits
+    @param user Address of the user to update
+    @param debt New amount of DSC owed by the user
+    """
+    assert debt <= UINT128_MASK, "DSCEngine: Amount exceeds uint128"
+    position: uint256 = self.user_to_position[user]
+    self.total_debt = self.total_debt + debt - (position & UINT128_MASK)
+    self.user_to_position[user] = (position & ~UINT128_MASK) | debt
+
+
+@internal
+@view
+def _get_collateral_balance(user: address, token: address) -> uint256:
+    """
+    @notice Read a user's collateral balance by token address
+    @dev Returns 0 for tokens that are not supported as collateral
+    @param user Address of the user to query
+    @param token Address of the collateral token
+    @return Amount of collateral deposited by the user
+    """
+    collateral_id: uint256 = self.token_to_collateral_id[token]
+    if collateral_id == 0:
+        return 0
+    return self._get_collateral_amount(user, collateral_id - 1)
+
+
+@internal
+@view
+def _collateral_index(token: address) -> uint256:
+    """
+    @notice Look up a token's position in the collateral registry
+    @dev Reverts if the token is not a supported collateral
     @param token Address of the token
+    @return Index of the token in COLLATERAL_TOKENS
+    """
+    collateral_id: uint256 = self.token_to_collateral_id[token]
+    assert collateral_id != 0, "DSCEngine: Token not supported"
+    return collateral_id - 1
+
+
+@internal
+@view
+def _get_usd_value(collateral_index: uint256, amount: uint256, price: uint256) -> uint256:
+    """
+    @notice Convert token amount to USD value using a Chainlink price
+    @dev The price is scaled to 18 decimals with the feed's precomputed scale
+    @param collateral_index Index of the token in COLLATERAL_TOKENS
     @param amount Amount of tokens
+    @param price Price of the token, as read from its price feed
     @return USD value with 18 decimals
     """
-    price_feed: AggregatorV3Interface = AggregatorV3Interface(self.token_to_price_feed[token])
-    price: int256 = staticcall price_feed.latestAnswer()
-    return ((convert(price, uint256) * ADDITIONAL_FEE_PRECISION) * amount) // PRECISION
+    return ((price * COLLATERAL_PRICE_SCALES[collateral_index]) * amount) // COLLATERAL_PRECISIONS[collateral_index]
 
 
 @internal
 @view
-def _get_token_amount_from_usd(token: address, usd_amount_in_wei: uint256) -> uint256:
+def _get_token_amount_from_usd(collateral_index: uint256, usd_amount_in_wei: uint256, price: uint256) -> uint256:
     """
-    @notice Convert USD amount to token amount using Chainlink price feed
-    @dev Chainlink returns prices with 8 decimals, USD amount has 18 decimals
-    @param token Address of the token
+    @notice Convert USD amount to token amount using a Chainlink price
+    @dev The price is scaled to 18 decimals like the USD amount
+    @param collateral_index Index of the token in COLLATERAL_TOKENS
     @param usd_amount_in_wei USD amount with 18 decimals
+    @param price Price of the token, as read from its price feed
     @return Token amount
     """
-    price_feed: AggregatorV3Interface = AggregatorV3Interface(self.token_to_price_feed[token])
-    price: int256 = staticcall price_feed.latestAnswer()
-    #return (usd_amount_in_wei * PRECISION) // (convert(price, uint256)) * ADDITIONAL_FEE_PRECISION
-    return (usd_amount_in_wei * (10 ** 8)) // (convert(price, uint256))
+    return (usd_amount_in_wei * COLLATERAL_PRECISIONS[collateral_index]) // (price * COLLATERAL_PRICE_SCALES[collateral_index])
 
 
 @internal
-def _health_factor(user: address) -> uint256:
+@view
+def _health_factor(user: address, prices: uint256[MAX_COLLATERAL_TOKENS]) -> uint256:
     """
     @notice How much DSC they minted and how much collateral they have deposited?
     @dev Health factor = (collateral_value * liquidation_threshold) / dsc_minted
-         Returns max uint256 if no DSC is minted
+         Returns max uint256 if no DSC is minted, without valuing any collateral
     @param user Address of the user to check
+    @param prices Price snapshot, indexed like COLLATERAL_TOKENS
     @return Health factor with 18 decimals (1e18 = 100%)
     """
-    total_dsc_minted: uint256 = 0
-    total_collateral_value_usd: uint256 = 0
-    total_dsc_minted, total_collateral_value_usd = self._get_account_information(user)
+    position: uint256 = self.user_to_position[user]
+    total_dsc_minted: uint256 = position & UINT128_MASK
+    if total_dsc_minted == 0:
+        return max_value(uint256)
+    total_collateral_value_usd: uint256 = self._get_account_collateral_value(user, position >> 128, prices)
     return self._calculate_health_factor(total_dsc_minted, total_collateral_value_usd)
 
 
 @internal
+@pure
 def _calculate_health_factor(total_dsc_minted: uint256, total_collateral_value_usd: uint256) -> uint256:
     """
     @notice Calculate health factor from DSC minted and collateral value
@@ -444,6 +1131,84 @@ def _calculate_health_factor(total_dsc_minted: uint256, total_collateral_value_u
     return (collateral_adjusted_for_treshold * PRECISION) // total_dsc_minted
 
 
+@internal
+@pure
+def _max_debt(total_collateral_value_usd: uint256) -> uint256:
+    """
+    @notice Largest debt a collateral value backs at MIN_HEALTH_FACTOR
+    @dev Inverts _calculate_health_factor with its rounding: with adjusted the
+         thresholded value, (adjusted * PRECISION) // debt >= MIN_HEALTH_FACTOR
+         <=> debt <= (adjusted * PRECISION) // MIN_HEALTH_FACTOR
+    @param total_collateral_value_usd Collateral value in USD (18 decimals)
+    @return Maximum total DSC minted
+    """
+    collateral_adjusted_for_treshold: uint256 = (total_collateral_value_usd * LIQUIDATION_TRESHOLD) // LIQUIDATION_PRECISION
+    return (collateral_adjusted_for_treshold * PRECISION) // MIN_HEALTH_FACTOR
+
+
+@internal
+@pure
+def _min_collateral_value(total_dsc_minted: uint256) -> uint256:
+    """
+    @notice Smallest collateral value that backs a debt at MIN_HEALTH_FACTOR
+    @dev Inverts _calculate_health_factor with its rounding: the thresholded value
+         must reach ceil(debt * MIN_HEALTH_FACTOR / PRECISION), which takes a value
+         of at least ceil(that * LIQUIDATION_PRECISION / LIQUIDATION_TRESHOLD)
+    @param total_dsc_minted Total DSC minted by the user
+    @return Minimum collateral value in USD (18 decimals)
+    """
+    min_adjusted: uint256 = (total_dsc_minted * MIN_HEALTH_FACTOR + PRECISION - 1) // PRECISION
+    return (min_adjusted * LIQUIDATION_PRECISION + LIQUIDATION_TRESHOLD - 1) // LIQUIDATION_TRESHOLD
+
+
+@internal
+def _liquidate(
+    collateral: address,
+    collateral_index: uint256,
+    user: address,
+    debt_to_cover: uint256,
+    prices: uint256[MAX_COLLATERAL_TOKENS],
+    skip_healthy: bool
+) -> bool:
+    """
+    @notice Internal function to liquidate one position
+    @dev Seizes collateral plus bonus to the liquidator and clears the user's
+         covered debt. The caller burns the covered DSC from the liquidator
+    @param collateral Address of the collateral token to seize
+    @param collateral_index Index of the collateral in COLLATERAL_TOKENS
+    @param user Address of the user to liquidate
+    @param debt_to_cover Amount of DSC debt to cover
+    @param prices Price snapshot, indexed like COLLATERAL_TOKENS
+    @param skip_healthy If True, return False for a healthy user instead of reverting
+    @return True if the position was liquidated
+    """
+    assert debt_to_cover > 0, "DSCEngine: Needs more than zero"
+    starting_health_factor: uint256 = self._health_factor(user, prices)
+    if starting_health_factor >= MIN_HEALTH_FACTOR:
+        assert skip_healthy, "DSCEngine: Health factor is good"
+        return False
+
+    token_amount_from_debt_covered: uint256 = self._get_token_amount_from_usd(
+        collateral_index, debt_to_cover, prices[collateral_index]
+    )
+    bonus_collateral: uint256 = (token_amount_from_debt_covered * LIQUIDATION_BONUS) // LIQUIDATION_PRECISION
+
+    collateral_seized: uint256 = token_amount_from_debt_covered + bonus_collateral
+    self._redeem_collateral(collateral, collateral_seized, user, msg.sender)
+    self._set_debt(user, (self.user_to_position[user] & UINT128_MASK) - debt_to_cover)
+    log Liquidation(
+        user=user,
+        liquidator=msg.sender,
+        collateral=collateral,
+        debt_covered=debt_to_cover,
+        collateral_seized=collateral_seized
+    )
+
+    ending_health_factor: uint256 = self._health_factor(user, prices)
+    assert ending_health_factor > starting_health_factor, "DSCEngine: Didn't improve health factor"
+    return True
+
+
 @internal
 def _burn_dsc(amount: uint256, on_behalf_of: address, dsc_from: address):
     """
@@ -453,8 +1218,9 @@ def _burn_dsc(amount: uint256, on_behalf_of: address, dsc_from: address):
     @param on_behalf_of Address whose minted balance will be reduced
     @param dsc_from Address from which DSC tokens will be burned
     """
-    self.user_to_dsc_minted[on_behalf_of] -= amount
+    self._set_debt(on_behalf_of, (self.user_to_position[on_behalf_of] & UINT128_MASK) - amount)
+    log DscBurned(on_behalf_of=on_behalf_of, dsc_from=dsc_from, amount=amount)
 
-    # Need i_decentralized_stable_coin to call burn_from
-    extcall DSC.burn_from(dsc_from, amount)
+    # Minter burn: the caller does not need to approve the engine first
+    extcall DSC.minter_burn_from(dsc_from, amount)
 
@@ -0,0 +1,30 @@
+# pragma version 0.4.1
+"""
+@title mock_engine_router
+@license MIT
+@notice Sends several DSCEngine operations in one transaction, as a router or
+        a batching wallet would
+"""
+from ethereum.ercs import IERC20
+
+interface IDSCEngine:
+    def deposit_and_mint(token_collateral_address: address, amount_collateral: uint256, amount_dsc: uint256): nonpayable
+
+MAX_OPERATIONS: constant(uint256) = 32
+
+ENGINE: immutable(IDSCEngine)
+
+
+@deploy
+def __init__(engine: address):
+    ENGINE = IDSCEngine(engine)
+
+
+@external
+def deposit_and_mint_many(token: address, amount_collateral: uint256, amount_dsc: uint256, times: uint256):
+    """
+    @notice Deposit `amount_collateral` of the router's `token` and mint `amount_dsc`, `times` times
+    """
+    extcall IERC20(token).approve(ENGINE.address, amount_collateral * times)
+    for i: uint256 in range(times, bound=MAX_OPERATIONS):
+        extcall ENGINE.deposit_and_mint(token, amount_collateral, amount_dsc)
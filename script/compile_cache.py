@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import tomllib
+from importlib.metadata import version
+from pathlib import Path
+
+import boa.interpret
+import vyper
+from vyper.compiler.output import build_abi_output
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+CACHE_DIR = PROJECT_ROOT / "out" / "cache"
+# Where the `import`s of a contract resolve, in the order moccasin searches them
+SEARCH_PATHS = [
+    PROJECT_ROOT,
+    PROJECT_ROOT / "contracts",
+    PROJECT_ROOT / "lib" / "pypi",
+    PROJECT_ROOT / "lib" / "github",
+]
+_IMPORT = re.compile(
+    r"^(?:from[ \t]+(\.*[\w.]*)[ \t]+import[ \t]+(?:\(([^)]*)\)|([\w \t,]+))|import[ \t]+([\w.]+))",
+    re.MULTILINE,
+)
+
+_boa_compiler_data = boa.interpret.compiler_data
+# Contracts compiled by this process, i.e. cache misses
+compiled: list[str] = []
+
+
+# ------------------------------------------------------------------
+#                             CACHE KEY
+# ------------------------------------------------------------------
+# boa's own disk cache (~/.cache/titanoboa) only looks up an artifact after
+# parsing and analysing the contract and every module it imports, snekmate
+# included, which costs about as much as loading the artifact. This key only
+# hashes files: the contract, the sources it imports, the compiler and the
+# dependency lock.
+def _resolve(module: str, base: Path) -> Path | None:
+    dots = len(module) - len(module.lstrip("."))
+    relative = Path(*module.lstrip(".").split(".")) if module.strip(".") else Path()
+    roots = [base.parents[dots - 1]] if dots else SEARCH_PATHS
+    for root in roots:
+        for suffix in (".vy", ".vyi"):
+            path = (root / relative).with_suffix(suffix)
+            if path.is_file():
+                return path.resolve()
+    # Built-in interfaces such as ethereum.ercs come with the compiler
+    return None
+
+
+def _imports(path: Path, source_code: str) -> list[Path]:
+    found = []
+    for match in _IMPORT.finditer(source_code):
+        package, parenthesized, names, module = match.groups()
+        if module:
+            candidates = [module]
+        else:
+            names = (parenthesized or names).replace("\n", " ").split(",")
+            prefix = package if package.endswith(".") else package + "."
+            candidates = [prefix + name.split()[0] for name in names if name.strip()]
+        for candidate in candidates:
+            if (resolved := _resolve(candidate, path)) is not None:
+                found.append(resolved)
+    return found
+
+
+def _import_closure(path: Path, source_code: str) -> list[tuple[Path, bytes]]:
+    sources, todo = {path: source_code.encode()}, _imports(path, source_code)
+    while todo:
+        imported = todo.pop()
+        if imported not in sources:
+            sources[imported] = imported.read_bytes()
+            todo.extend(_imports(imported, sources[imported].decode()))
+    return sorted(sources.items())
+
+
+def _dependency_lock() -> str:
+    """Dependencies moccasin.toml asks for and the versions installed in lib/"""
+    with open(PROJECT_ROOT / "moccasin.toml", "rb") as f:
+        requested = tomllib.load(f)["project"].get("dependencies", [])
+    installed = sorted(p.name for p in (PROJECT_ROOT / "lib").glob("*/*.dist-info"))
+    return json.dumps([requested, installed])
+
+
+def cache_key(path: Path, source_code: str, deployer=None, **kwargs) -> str:
+    digest = hashlib.sha256()
+    parts = [vyper.__version__, version("titanoboa"), _dependency_lock(), repr(deployer), repr(sorted(kwargs.items()))]
+    for part in parts:
+        digest.update(part.encode() + b"\0")
+    for source_path, contents in _import_closure(path, source_code):
+        digest.update(str(source_path.relative_to(PROJECT_ROOT)).encode() + b"\0" + contents + b"\0")
+    return digest.hexdigest()
+
+
+# ------------------------------------------------------------------
+#                             ARTIFACTS
+# ------------------------------------------------------------------
+def compiler_data(source_code: str, contract_name, filename, deployer=None, **kwargs):
+    """
+    Drop-in for boa.interpret.compiler_data. Contracts of this project are
+    loaded from out/cache/<path>.pickle when out/cache/<path>.json carries the
+    same key, and compiled (then stored) otherwise
+    """
+    path = Path(filename).resolve()
+    if not path.is_file() or not path.is_relative_to(PROJECT_ROOT):
+        return _boa_compiler_data(source_code, contract_name, filename, deployer, **kwargs)
+
+    key = cache_key(path, source_code, deployer, **kwargs)
+    artifact = CACHE_DIR / path.relative_to(PROJECT_ROOT).with_suffix(".json")
+    pickled = artifact.with_suffix(".pickle")
+    try:
+        if json.loads(artifact.read_text())["key"] == key:
+            with pickled.open("rb") as f:
+                return pickle.load(f)
+    except (OSError, ValueError, KeyError, pickle.UnpicklingError):
+        pass
+
+    data = _boa_compiler_data(source_code, contract_name, filename, deployer, **kwargs)
+    # Compile now, so the pickle holds the bytecode and source map
+    _ = data.bytecode, data.bytecode_runtime
+    if not hasattr(data, "source_map"):
+        data.source_map = boa.interpret._compute_source_map(data)
+    compiled.append(str(path.relative_to(PROJECT_ROOT)))
+
+    # The json is written last: it is what marks the pickle as current
+    _write(pickled, pickle.dumps(data))
+    _write(artifact, json.dumps({
+        "key": key,
+        "vyper_version": vyper.__version__,
+        "abi": build_abi_output(data),
+        "bytecode": "0x" + data.bytecode.hex(),
+        "bytecode_runtime": "0x" + data.bytecode_runtime.hex(),
+    }, indent=2).encode())
+    return data
+
+
+def _write(path: Path, contents: bytes):
+    # Test workers and stress workers may compile at once: write, then rename
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(contents)
+    os.replace(tmp_path, path)
+
+
+def install():
+    """Route boa's compilation of every contract import through the cache"""
+    boa.interpret.compiler_data = compiler_data
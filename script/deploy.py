@@ -1,8 +1,69 @@
+from moccasin.boa_tools import VyperContract
+from moccasin.config import get_active_network
+
+from script import hooks
+
+hooks.install()  # before the contract imports below
+
+from contracts import decentralized_stable_coin, dsc_engine
+from contracts.mocks import MockV3Aggregator, mock_token
+from script.deploy_batch import DeploymentBatch
 from script.deploy_dsc import deploy_dsc
 from script.deploy_dsc_engine import deploy_dsc_engine
+from script.mocks.deploy_price_feed import DECIMALS, INITIAL_VALUE
+from script.network import network_rpc
+
+# Indexed like COLLATERAL_TOKENS
+TOKENS = ["wbtc", "weth"]
+PRICE_FEEDS = ["btc_usd_price_feed", "eth_usd_price_feed"]
+# Same contracts and arguments as the deployer scripts of script/mocks
+MOCKS = {
+    "wbtc": (mock_token,),
+    "weth": (mock_token,),
+    "btc_usd_price_feed": (MockV3Aggregator, DECIMALS, INITIAL_VALUE),
+    "eth_usd_price_feed": (MockV3Aggregator, DECIMALS, INITIAL_VALUE),
+}
+
+
+def deploy_dsc_system() -> tuple[VyperContract, VyperContract]:
+    """
+    Deploy the DSC and the engine, with the collateral tokens and price feeds
+    of the named contracts. The DSC is constructed with the engine's predicted
+    address as minter and owner, so no set_minter or transfer_ownership
+    transactions follow. On a network the mocks without a configured address
+    join the DSC and the engine in one DeploymentBatch; locally they come from
+    their deployer scripts. Returns (dsc, dsc_engine)
+    """
+    active_network = get_active_network()
+    if active_network.is_zksync:
+        # zkSync derives create addresses from the bytecode hash, not the nonce:
+        # deploy the DSC first and hand it to the engine afterwards
+        dsc = deploy_dsc()
+        return dsc, deploy_dsc_engine(dsc)
+
+    if active_network.is_local_or_forked_network():
+        addresses = {name: active_network.manifest_named(name).address for name in TOKENS + PRICE_FEEDS}
+        # Created after the mocks, which take nonces of their own
+        batch = DeploymentBatch()
+    else:
+        batch = DeploymentBatch(network_rpc(), active_network.get_default_account())
+        addresses = {}
+        for name in TOKENS + PRICE_FEEDS:
+            address = active_network.get_named_contract(name).address
+            addresses[name] = address if address is not None else batch.add(*MOCKS[name])
+
+    # The engine is created right after the DSC
+    dsc_address = batch.add(decentralized_stable_coin, batch.next_address(ahead=1))
+    batch.add(
+        dsc_engine,
+        [addresses[name] for name in TOKENS],
+        [addresses[name] for name in PRICE_FEEDS],
+        dsc_address,
+    )
+    dsc, dsce = batch.submit()[-2:]
+    print(f"DSC Engine deployed at: {dsce.address}")
+    return dsc, dsce
 
 
 def moccasin_main():
-    dsc = deploy_dsc()
-    deploy_dsc_engine(dsc)
-    
\ No newline at end of file
+    return deploy_dsc_system()
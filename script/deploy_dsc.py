@@ -1,9 +1,17 @@
+from script import hooks
+
+hooks.install()  # before the contract imports below
+
 from contracts import decentralized_stable_coin
 from moccasin.boa_tools import VyperContract
 
-def deploy_dsc() -> VyperContract:
-    return decentralized_stable_coin.deploy()
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+
+def deploy_dsc(minter: str = ZERO_ADDRESS) -> VyperContract:
+    # With a minter (the engine), minter role and ownership are set by the constructor
+    return decentralized_stable_coin.deploy(minter)
 
 
 def moccasin_main() -> VyperContract:
-    return deploy_dsc()
\ No newline at end of file
+    return deploy_dsc()
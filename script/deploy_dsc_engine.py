@@ -1,5 +1,10 @@
 from moccasin.boa_tools import VyperContract
 from moccasin.config import get_active_network
+
+from script import hooks
+
+hooks.install()  # before the contract imports below
+
 from contracts import dsc_engine
 
 
@@ -15,8 +20,10 @@ def deploy_dsc_engine(dsc: VyperContract):
         [wbtc.address, weth.address],[btc_usd.address, eth_usd.address], dsc        
     )
 
-    dsc.set_minter(dsc_engine_contract.address, True)
-    dsc.transfer_ownership(dsc_engine_contract.address)
+    # A DSC deployed with this engine as its minter is wired already (script/deploy.py)
+    # transfer_ownership also makes the engine the minter and revokes the deployer's role
+    if dsc.owner() != dsc_engine_contract.address:
+        dsc.transfer_ownership(dsc_engine_contract.address)
     print(f"DSC Engine deployed at: {dsc_engine_contract.address}")
     return dsc_engine_contract
 
@@ -0,0 +1,11 @@
+from script import compile_cache, transient_storage
+
+
+def install():
+    """
+    Serve compiled contracts from the artifact cache in out/cache and give
+    boa's pyevm per-transaction transient storage. Call it before the first
+    `from contracts import ...`, which compiles the contract on import
+    """
+    compile_cache.install()
+    transient_storage.install()
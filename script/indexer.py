@@ -0,0 +1,319 @@
+import contextlib
+import json
+import os
+from pathlib import Path
+
+import boa
+from boa.contracts.event_decoder import RawLogEntry
+from boa.network import NetworkEnv
+from eth_utils import to_canonical_address
+from moccasin.config import get_active_network
+
+from script import hooks
+
+hooks.install()  # before the contract imports below
+
+from contracts import dsc_engine
+from script.network import network_rpc
+
+# ------------------------------------------------------------------
+#                         CONFIGURATION
+# ------------------------------------------------------------------
+CHECKPOINT_PATH = Path("out/indexer_checkpoint.json")
+# Largest block range asked for in one eth_getLogs request
+BLOCK_RANGE = 2_000
+# Cursor before any log: (block number, log index) of the last applied log
+START_CURSOR = (-1, -1)
+# The live engine the entry points follow, e.g. in .env. Without a start block
+# the engine's deployment block is looked up, which needs the node's history
+ENGINE_ADDRESS_VAR = "DSC_ENGINE_ADDRESS"
+START_BLOCK_VAR = "DSC_ENGINE_START_BLOCK"
+
+
+def _to_key(account) -> str:
+    """Book key of an address, a boa Address or a deployed contract"""
+    return str(getattr(account, "address", account))
+
+
+# ------------------------------------------------------------------
+#                            POSITIONS
+# ------------------------------------------------------------------
+class Position:
+    """One user's debt and collateral balances, indexed like COLLATERAL_TOKENS"""
+
+    __slots__ = ("debt", "collateral")
+
+    def __init__(self, debt: int, collateral: list[int]):
+        self.debt = debt
+        self.collateral = collateral
+
+    def is_empty(self) -> bool:
+        return self.debt == 0 and not any(self.collateral)
+
+
+# ------------------------------------------------------------------
+#                           LOG SOURCES
+# ------------------------------------------------------------------
+# A log source returns the engine's decoded logs of a block range as
+# (block number, log index, log), ordered by block and log index.
+class RpcLogSource:
+    """Engine logs from a JSON-RPC node (anvil, forks, live networks)"""
+
+    def __init__(self, dsce, rpc=None):
+        self.dsce = dsce
+        self.rpc = rpc or network_rpc()
+
+    def latest_block(self) -> int:
+        return int(self.rpc.fetch("eth_blockNumber", []), 16)
+
+    def deployment_block(self) -> int:
+        """First block with the engine's code, bisected with eth_getCode"""
+        address = str(self.dsce.address)
+        low, high = 0, self.latest_block()
+        while low < high:
+            middle = (low + high) // 2
+            if self.rpc.fetch("eth_getCode", [address, hex(middle)]) in ("0x", "0x0"):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def get_logs(self, from_block: int, to_block: int) -> list:
+        params = {
+            "address": str(self.dsce.address),
+            "fromBlock": hex(from_block),
+            "toBlock": hex(to_block),
+        }
+        logs = []
+        for entry in self.rpc.fetch("eth_getLogs", [params]):
+            log_index = int(entry["logIndex"], 16)
+            raw = RawLogEntry(
+                log_id=log_index,
+                address=to_canonical_address(entry["address"]),
+                topics=[int(topic, 16) for topic in entry["topics"]],
+                data=bytes.fromhex(entry["data"].removeprefix("0x")),
+            )
+            logs.append((int(entry["blockNumber"], 16), log_index, self.dsce.decode_log(raw)))
+        return sorted(logs, key=lambda log: log[:2])
+
+
+class PyevmLogSource:
+    """
+    Engine logs of every transaction sent through boa.env on pyevm.
+    pyevm keeps no log history, so the source records logs as the calls happen
+    and must be created before them. Call close() to stop recording.
+    """
+
+    def __init__(self, dsce):
+        self.dsce = dsce
+        self._engine = dsce.address.canonical_address
+        self._raw_logs = []  # (block number, log index, RawLogEntry)
+        self._next_log_index = {}  # block number -> index of its next log
+        self._first_block = self.latest_block()
+        self._execute_code = boa.env.execute_code
+        boa.env.execute_code = self._record
+
+    def _record(self, *args, **kwargs):
+        computation = self._execute_code(*args, **kwargs)
+        if kwargs.get("is_modifying", True) and not kwargs.get("simulate") and computation.is_success:
+            block = self.latest_block()
+            for entry in sorted(computation.get_raw_log_entries()):
+                raw = RawLogEntry(*entry)
+                if raw.address == self._engine:
+                    log_index = self._next_log_index.get(block, 0)
+                    self._raw_logs.append((block, log_index, raw))
+                    self._next_log_index[block] = log_index + 1
+        return computation
+
+    @contextlib.contextmanager
+    def anchor(self):
+        """Forget the logs recorded inside the block, like boa.env.anchor() forgets the state"""
+        n_logs, next_log_index = len(self._raw_logs), dict(self._next_log_index)
+        try:
+            yield
+        finally:
+            del self._raw_logs[n_logs:]
+            self._next_log_index = next_log_index
+
+    def close(self):
+        # Drop the instance attribute so boa.env.execute_code is the class method again
+        del boa.env.execute_code
+
+    def latest_block(self) -> int:
+        return boa.env.evm.patch.block_number
+
+    def deployment_block(self) -> int:
+        """Nothing before the source was created was recorded"""
+        return self._first_block
+
+    def get_logs(self, from_block: int, to_block: int) -> list:
+        return [
+            (block, log_index, self.dsce.decode_log(raw))
+            for block, log_index, raw in self._raw_logs
+            if from_block <= block <= to_block
+        ]
+
+
+# ------------------------------------------------------------------
+#                             INDEXER
+# ------------------------------------------------------------------
+class PositionIndexer:
+    """
+    Keeps every user's position in memory, built only from the engine's logs.
+    Each sync applies the logs after the cursor and checkpoints the positions
+    together with the cursor, so a restart only replays new blocks.
+    With checkpoint_path=None the book only lives in memory. Without a
+    start_block the first sync starts at the source's deployment_block().
+    """
+
+    def __init__(self, dsce, source, checkpoint_path=CHECKPOINT_PATH, start_block=None):
+        self.dsce = dsce
+        self.source = source
+        self.checkpoint_path = Path(checkpoint_path) if checkpoint_path else None
+        self.start_block = start_block
+        self.max_tokens = dsce.MAX_COLLATERAL_TOKENS()
+        self.positions: dict[str, Position] = {}
+        self.cursor = START_CURSOR
+        # Users whose position changed since the owner last cleared this set
+        self.updated_users: set[str] = set()
+        self._token_index: dict[str, int] = {}
+        self._load_checkpoint()
+
+    # ---------------------------- queries -----------------------------
+    def debt_of(self, user) -> int:
+        position = self.positions.get(_to_key(user))
+        return position.debt if position else 0
+
+    def collateral_of(self, user, token) -> int:
+        position = self.positions.get(_to_key(user))
+        return position.collateral[self._collateral_index(token)] if position else 0
+
+    # ---------------------------- syncing -----------------------------
+    def sync(self) -> int:
+        """Apply every log after the cursor, then checkpoint. Returns the number of logs applied"""
+        latest = self.source.latest_block()
+        if self.cursor != START_CURSOR:
+            first_block = self.cursor[0]
+        else:
+            if self.start_block is None:
+                self.start_block = self.source.deployment_block()
+            first_block = self.start_block
+        applied = 0
+        for from_block in range(first_block, latest + 1, BLOCK_RANGE):
+            to_block = min(from_block + BLOCK_RANGE - 1, latest)
+            for block, log_index, log in self.source.get_logs(from_block, to_block):
+                # The cursor block can be partly applied already
+                if (block, log_index) <= self.cursor:
+                    continue
+                self.apply(log)
+                self.cursor = (block, log_index)
+                applied += 1
+        self.save_checkpoint()
+        return applied
+
+    def apply(self, log):
+        """Update the book with one decoded engine log"""
+        event = type(log).__name__
+        if event == "CollateralDeposited":
+            user = _to_key(log.user)
+            self._position(user).collateral[self._collateral_index(log.token)] += log.amount
+        elif event == "CollateralRedeem":
+            user = _to_key(log.redeemed_from)
+            self._position(user).collateral[self._collateral_index(log.token)] -= log.amount
+        elif event == "DscMinted":
+            user = _to_key(log.user)
+            self._position(user).debt += log.amount
+        elif event == "DscBurned":
+            user = _to_key(log.on_behalf_of)
+            self._position(user).debt -= log.amount
+        elif event == "Liquidation":
+            # The seized collateral has its own CollateralRedeem log
+            user = _to_key(log.user)
+            self._position(user).debt -= log.debt_covered
+        else:
+            return
+
+        self.updated_users.add(user)
+        if self.positions[user].is_empty():
+            del self.positions[user]
+
+    # -------------------------- checkpoints ---------------------------
+    def save_checkpoint(self):
+        if self.checkpoint_path is None:
+            return
+        checkpoint = {
+            "engine": str(self.dsce.address),
+            "cursor": list(self.cursor),
+            "positions": {
+                user: [position.debt, position.collateral]
+                for user, position in self.positions.items()
+            },
+        }
+        self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so a crash never leaves half a checkpoint behind
+        tmp_path = self.checkpoint_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(checkpoint))
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _load_checkpoint(self):
+        if self.checkpoint_path is None or not self.checkpoint_path.exists():
+            return
+        checkpoint = json.loads(self.checkpoint_path.read_text())
+        # A checkpoint of another deployment is useless for this one
+        if checkpoint["engine"] != str(self.dsce.address):
+            return
+        self.cursor = tuple(checkpoint["cursor"])
+        self.positions = {
+            user: Position(debt, collateral)
+            for user, (debt, collateral) in checkpoint["positions"].items()
+        }
+
+    # ---------------------------- helpers -----------------------------
+    def _position(self, user: str) -> Position:
+        position = self.positions.get(user)
+        if position is None:
+            position = self.positions[user] = Position(0, [0] * self.max_tokens)
+        return position
+
+    def _collateral_index(self, token) -> int:
+        token = _to_key(token)
+        # One storage read per token, never per user
+        if token not in self._token_index:
+            self._token_index[token] = self.dsce.token_to_collateral_id(token) - 1
+        return self._token_index[token]
+
+
+# ------------------------------------------------------------------
+#                           ENTRY POINT
+# ------------------------------------------------------------------
+def deployed_engine() -> tuple:
+    """
+    The live engine named by DSC_ENGINE_ADDRESS, or by the dsc_engine address
+    of the network in moccasin.toml, and its RpcLogSource. Never deploys: an
+    engine deployed by this process would have no history to follow
+    """
+    if not isinstance(boa.env, NetworkEnv):
+        raise RuntimeError(
+            "pyevm keeps no log history between runs: follow a node, e.g. --network anvil"
+        )
+    address = os.environ.get(ENGINE_ADDRESS_VAR) or get_active_network().get_named_contract("dsc_engine").address
+    if not address:
+        raise RuntimeError(
+            f"No engine to follow: set {ENGINE_ADDRESS_VAR} or a dsc_engine address for the network in moccasin.toml"
+        )
+    dsce = dsc_engine.at(address)
+    return dsce, RpcLogSource(dsce)
+
+
+def start_block_from_env() -> int | None:
+    start_block = os.environ.get(START_BLOCK_VAR)
+    return int(start_block) if start_block else None
+
+
+def moccasin_main():
+    dsce, source = deployed_engine()
+    indexer = PositionIndexer(dsce, source, start_block=start_block_from_env())
+    applied = indexer.sync()
+    print(f"Applied {applied} logs, indexing {len(indexer.positions)} positions")
+    print(f"Cursor: block {indexer.cursor[0]}, log {indexer.cursor[1]}")
+    return indexer
@@ -0,0 +1,265 @@
+import heapq
+import logging
+
+import boa
+
+from script import hooks
+
+hooks.install()  # before the contract imports below
+
+from contracts import decentralized_stable_coin
+from contracts.mocks import MockV3Aggregator
+from script.indexer import PositionIndexer, deployed_engine, start_block_from_env
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------
+#                             KEEPER
+# ------------------------------------------------------------------
+class LiquidationKeeper:
+    """
+    Liquidates positions as soon as a price tick makes them unhealthy, without
+    rescanning every borrower.
+
+    Each collateral token has a heap of the positions holding it, keyed by the
+    token's trigger price: the lowest price at which the position's health
+    factor is still MIN_HEALTH_FACTOR, with the other tokens at their current
+    prices. heapq is a min-heap, so triggers are stored negated and the
+    position that breaks first is always on top. A tick only pops positions
+    whose trigger is above the new price.
+
+    Positions come from the event indexer. Positions holding several tokens
+    have triggers that depend on the other prices, so they are re-keyed
+    whenever one of their other tokens ticks.
+    """
+
+    def __init__(self, dsce, dsc, indexer: PositionIndexer, feeds, liquidator=None):
+        self.dsce = dsce
+        self.dsc = dsc
+        self.indexer = indexer
+        self.feeds = feeds  # indexed like COLLATERAL_TOKENS
+        self.liquidator = liquidator or boa.env.eoa
+        self.tokens = [dsce.COLLATERAL_TOKENS(i) for i in range(len(feeds))]
+        self.price_scales = [dsce.COLLATERAL_PRICE_SCALES(i) for i in range(len(feeds))]
+        self.precisions = [dsce.COLLATERAL_PRECISIONS(i) for i in range(len(feeds))]
+        self.liquidation_threshold = dsce.LIQUIDATION_TRESHOLD()
+        self.liquidation_precision = dsce.LIQUIDATION_PRECISION()
+        self.liquidation_bonus = dsce.LIQUIDATION_BONUS()
+        self.precision = dsce.PRECISION()
+        self.min_health_factor = dsce.MIN_HEALTH_FACTOR()
+
+        self.heaps: list[list] = [[] for _ in feeds]
+        self.triggers: dict[tuple[str, int], int] = {}  # current key of (user, token)
+        self.multi_holders: list[set[str]] = [set() for _ in feeds]
+        self.rounds = [None] * len(feeds)
+        self.prices = [0] * len(feeds)
+        # Stats: candidates checked on-chain, positions whose collateral cannot
+        # cover their debt, positions the liquidator lacked the DSC to cover
+        self.checked = 0
+        self.bad_debt: set[str] = set()
+        self.unfunded: set[str] = set()
+
+        self._read_prices()
+        self.indexer.sync()
+        self.indexer.updated_users.clear()
+        for user in list(self.indexer.positions):
+            self._rekey(user)
+
+    # ---------------------------- polling -----------------------------
+    def poll(self) -> list[tuple[str, int, int]]:
+        """
+        Pick up new positions and price rounds, then liquidate every position
+        whose trigger was crossed. Returns (user, token index, debt covered) per liquidation
+        """
+        self._sync_positions()
+        for token_index in self._read_prices():
+            for user in list(self.multi_holders[token_index]):
+                self._rekey(user, skip=token_index)
+
+        liquidations, unresolved = [], []
+        for token_index in range(len(self.feeds)):
+            # A partial liquidation re-keys the user, who may still be crossed
+            while crossed := self._pop_crossed(token_index):
+                for user in crossed:
+                    liquidation = self._liquidate(user)
+                    if liquidation:
+                        liquidations.append(liquidation)
+                        self._sync_positions()
+                    else:
+                        unresolved.append(user)
+        # Re-keyed only now, so a position that cannot be liquidated is not popped again this poll
+        for user in unresolved:
+            self._rekey(user)
+        return liquidations
+
+    def _read_prices(self) -> list[int]:
+        """Refresh prices from the feeds, returning the tokens whose round changed"""
+        changed = []
+        for i, feed in enumerate(self.feeds):
+            round_id, answer, _, _, _ = feed.latestRoundData()
+            if round_id != self.rounds[i]:
+                self.rounds[i], self.prices[i] = round_id, answer
+                changed.append(i)
+        return changed
+
+    def _sync_positions(self):
+        self.indexer.sync()
+        updated, self.indexer.updated_users = self.indexer.updated_users, set()
+        for user in updated:
+            self._rekey(user)
+
+    # ----------------------------- heaps ------------------------------
+    def _rekey(self, user: str, skip: int = None):
+        """Push the user's current trigger prices; older heap entries become stale"""
+        position = self.indexer.positions.get(user)
+        held = [i for i, amount in enumerate(position.collateral) if amount] if position else []
+        for i in range(len(self.feeds)):
+            if len(held) > 1 and i in held:
+                self.multi_holders[i].add(user)
+            else:
+                self.multi_holders[i].discard(user)
+            if i == skip:
+                continue
+            if position is None or position.debt == 0 or i not in held:
+                self.triggers.pop((user, i), None)
+                continue
+            trigger = self._trigger_price(position, i)
+            if self.triggers.get((user, i)) != trigger:
+                self.triggers[(user, i)] = trigger
+                heapq.heappush(self.heaps[i], (-trigger, user))
+
+    def _pop_crossed(self, token_index: int) -> list[str]:
+        """Pop every live entry whose trigger is above the token's current price"""
+        heap, crossed = self.heaps[token_index], []
+        while heap and -heap[0][0] > self.prices[token_index]:
+            negative_trigger, user = heapq.heappop(heap)
+            # Lazy deletion: skip entries replaced by a later _rekey
+            if self.triggers.get((user, token_index)) == -negative_trigger:
+                del self.triggers[(user, token_index)]
+                crossed.append(user)
+        return crossed
+
+    # --------------------------- contract math ------------------------
+    def _usd_value(self, token_index: int, amount: int, price: int) -> int:
+        """Mirrors DSCEngine._get_usd_value"""
+        return (price * self.price_scales[token_index] * amount) // self.precisions[token_index]
+
+    def _health_factor(self, debt: int, collateral_value: int) -> int:
+        """Mirrors DSCEngine._calculate_health_factor"""
+        if debt == 0:
+            return 2**256 - 1
+        adjusted = (collateral_value * self.liquidation_threshold) // self.liquidation_precision
+        return (adjusted * self.precision) // debt
+
+    def _trigger_price(self, position, token_index: int) -> int:
+        """Lowest price of the token at which the position keeps MIN_HEALTH_FACTOR"""
+        # With MIN_HEALTH_FACTOR == PRECISION the health factor holds while
+        # floor(V * threshold / precision) >= debt  <=>  V >= ceil(debt * precision / threshold)
+        needed_value = -(-position.debt * self.liquidation_precision // self.liquidation_threshold)
+        other_value = sum(
+            self._usd_value(i, amount, self.prices[i])
+            for i, amount in enumerate(position.collateral)
+            if i != token_index and amount
+        )
+        missing_value = needed_value - other_value
+        if missing_value <= 0:
+            return 0
+        # floor(p * scale * amount / precision) >= missing  <=>  p >= ceil(missing * precision / (scale * amount))
+        amount = position.collateral[token_index]
+        return -(-missing_value * self.precisions[token_index] // (self.price_scales[token_index] * amount))
+
+    def _debt_to_cover(self, position, token_index: int, available: int) -> int:
+        """
+        Debt to repay when seizing this token, out of `available` DSC: all of it
+        if the collateral covers debt plus bonus, else the most the collateral
+        covers. Returns 0 if that would not improve the health factor, as
+        liquidate requires
+        """
+        price = self.prices[token_index]
+        scaled_price = price * self.price_scales[token_index]
+        precision = self.precisions[token_index]
+        amount = position.collateral[token_index]
+        bonus_precision = self.liquidation_precision + self.liquidation_bonus
+
+        debt_to_cover = min(position.debt, available)
+        if debt_to_cover < position.debt or self._seized(debt_to_cover, scaled_price, precision) > amount:
+            # Largest cover whose seized collateral, bonus included, fits the balance
+            coverable = (amount * self.liquidation_precision // bonus_precision) * scaled_price // precision
+            debt_to_cover = min(debt_to_cover, coverable)
+        if debt_to_cover == 0:
+            return 0
+
+        value = sum(
+            self._usd_value(i, held, self.prices[i]) for i, held in enumerate(position.collateral) if held
+        )
+        seized_value = self._usd_value(
+            token_index, self._seized(debt_to_cover, scaled_price, precision), price
+        )
+        before = self._health_factor(position.debt, value)
+        after = self._health_factor(position.debt - debt_to_cover, value - seized_value)
+        return debt_to_cover if after > before else 0
+
+    def _seized(self, debt_to_cover: int, scaled_price: int, precision: int) -> int:
+        """Mirrors the collateral plus bonus that DSCEngine._liquidate seizes"""
+        token_amount = (debt_to_cover * precision) // scaled_price
+        return token_amount + (token_amount * self.liquidation_bonus) // self.liquidation_precision
+
+    # ---------------------------- liquidate ---------------------------
+    def _liquidate(self, user: str):
+        self.checked += 1
+        # The heap is a filter; the contract has the final say
+        if self.dsce.health_factor(user) >= self.min_health_factor:
+            return None
+        position = self.indexer.positions[user]
+        # Bad debt only when no collateral can cover anything, however much DSC the liquidator has
+        if self._best_cover(position, position.debt)[0] == 0:
+            self.bad_debt.add(user)
+            return None
+        debt_to_cover, token_index = self._best_cover(position, self.dsc.balanceOf(self.liquidator))
+        if debt_to_cover == 0:
+            self.unfunded.add(user)
+            logger.warning("Cannot liquidate %s: the liquidator holds too little DSC", user)
+            return None
+
+        try:
+            with boa.env.prank(self.liquidator):
+                self.dsce.liquidate(self.tokens[token_index], user, debt_to_cover)
+        except boa.BoaError as error:
+            # The indexer or the prices were behind the chain: re-keyed with the unresolved
+            logger.warning("Liquidating %s reverted: %s", user, error)
+            return None
+        self.bad_debt.discard(user)
+        self.unfunded.discard(user)
+        logger.info("Liquidated %s: covered %.2f DSC with token %d", user, debt_to_cover / 10**18, token_index)
+        return user, token_index, debt_to_cover
+
+    def _best_cover(self, position, available: int) -> tuple[int, int]:
+        """(debt to cover, token index) of the held token that covers the most debt"""
+        # Not necessarily the crossed token
+        return max(
+            (self._debt_to_cover(position, i, available), i)
+            for i, amount in enumerate(position.collateral[: len(self.feeds)])
+            if amount
+        )
+
+
+def moccasin_main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    # The live engine and its DSC, never fresh deployments (see script/indexer.py)
+    dsce, source = deployed_engine()
+    dsc = decentralized_stable_coin.at(dsce.DSC())
+    feeds = []
+    for i in range(dsce.MAX_COLLATERAL_TOKENS()):
+        try:
+            feeds.append(MockV3Aggregator.at(dsce.COLLATERAL_PRICE_FEEDS(i)))
+        except boa.BoaError:
+            # Reading past the end of COLLATERAL_PRICE_FEEDS reverts
+            break
+
+    indexer = PositionIndexer(dsce, source, start_block=start_block_from_env())
+    keeper = LiquidationKeeper(dsce, dsc, indexer, feeds)
+    liquidations = keeper.poll()
+    print(f"Liquidated {len(liquidations)} positions, checked {keeper.checked} candidates")
+    if keeper.unfunded:
+        print(f"{len(keeper.unfunded)} positions need more DSC in {keeper.liquidator}")
+    return keeper
@@ -1,3 +1,7 @@
+from script import hooks
+
+hooks.install()  # before the contract imports below
+
 from contracts.mocks import mock_token
 
 
@@ -0,0 +1,10 @@
+from boa.rpc import EthereumRPC
+from moccasin.config import get_active_network
+
+
+def network_rpc() -> EthereumRPC:
+    """A JSON-RPC client of the active network's node, built from its URL in moccasin.toml"""
+    active_network = get_active_network()
+    if active_network.url is None:
+        raise RuntimeError(f"Network {active_network.name} has no url to send JSON-RPC requests to")
+    return EthereumRPC(active_network.url)
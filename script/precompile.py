@@ -0,0 +1,24 @@
+import time
+
+import boa
+
+from script import compile_cache
+
+
+def precompile() -> list[str]:
+    """
+    Load every contract of the project through the compiled-artifact cache,
+    compiling only those whose sources, imports, compiler or dependencies
+    changed. Returns the contracts that had to be compiled
+    """
+    compile_cache.install()
+    for path in sorted((compile_cache.PROJECT_ROOT / "contracts").rglob("*.vy")):
+        boa.load_partial(str(path))
+    return compile_cache.compiled
+
+
+def moccasin_main():
+    start = time.time()
+    compiled = precompile()
+    print(f"Compiled {len(compiled)} contracts in {time.time() - start:.2f}s: {', '.join(compiled) or 'all cached'}")
+    print(f"Artifacts in {compile_cache.CACHE_DIR}")
@@ -0,0 +1,131 @@
+import numpy as np
+
+# ------------------------------------------------------------------
+#                         CONFIGURATION
+# ------------------------------------------------------------------
+# Largest (scenarios x positions) block evaluated at once. Each cell holds one
+# Python int per token, so this bounds memory to a few hundred MB per token
+CHUNK_CELLS = 1_000_000
+MAX_UINT256 = 2**256 - 1
+
+
+# ------------------------------------------------------------------
+#                           RISK ENGINE
+# ------------------------------------------------------------------
+class RiskEngine:
+    """
+    Health factors of many positions under many price scenarios, with the
+    exact integer results of DSCEngine. Products like price * scale * amount
+    reach ~1e37 and do not fit in int64 or float64, so arrays use dtype=object
+    (Python ints) and every division floors exactly like the EVM.
+
+    Shapes: amounts (positions, tokens), debts (positions,),
+            prices (scenarios, tokens) in raw feed answers.
+    """
+
+    def __init__(
+        self,
+        price_scales,
+        precisions,
+        liquidation_threshold=50,
+        liquidation_precision=100,
+        precision=10**18,
+        min_health_factor=10**18,
+    ):
+        self.price_scales = _uint_array(price_scales)
+        self.precisions = _uint_array(precisions)
+        self.liquidation_threshold = liquidation_threshold
+        self.liquidation_precision = liquidation_precision
+        self.precision = precision
+        self.min_health_factor = min_health_factor
+
+    @classmethod
+    def from_engine(cls, dsce, n_tokens: int):
+        """Read every constant and per-token scale from a deployed DSCEngine"""
+        return cls(
+            [dsce.COLLATERAL_PRICE_SCALES(i) for i in range(n_tokens)],
+            [dsce.COLLATERAL_PRECISIONS(i) for i in range(n_tokens)],
+            dsce.LIQUIDATION_TRESHOLD(),
+            dsce.LIQUIDATION_PRECISION(),
+            dsce.PRECISION(),
+            dsce.MIN_HEALTH_FACTOR(),
+        )
+
+    # ---------------------------- pricing -----------------------------
+    def usd_values(self, amounts, prices):
+        """
+        Collateral value in USD of every position in every scenario, shape
+        (scenarios, positions). Mirrors _get_usd_value summed over tokens:
+        ((price * scale) * amount) // precision, floored per token
+        """
+        amounts = _uint_array(amounts)
+        prices = _uint_array(prices)
+        scaled_prices = prices * self.price_scales  # (scenarios, tokens)
+        per_token = (scaled_prices[:, None, :] * amounts[None, :, :]) // self.precisions
+        return per_token.sum(axis=2)
+
+    def health_factors_from_values(self, debts, collateral_values):
+        """Mirrors _calculate_health_factor, broadcasting debts over the last axis"""
+        debts = _uint_array(debts)
+        # Avoid dividing by zero: debt-free positions get max uint256 below
+        safe_debts = np.where(debts == 0, 1, debts)
+        adjusted = (collateral_values * self.liquidation_threshold) // self.liquidation_precision
+        health_factors = (adjusted * self.precision) // safe_debts
+        return np.where(debts == 0, MAX_UINT256, health_factors)
+
+    # --------------------------- scenarios ----------------------------
+    def iter_health_factors(self, debts, amounts, prices, chunk_cells=CHUNK_CELLS):
+        """
+        Yield (scenario slice, position slice, health factors) blocks covering
+        every scenario and position, each at most chunk_cells large
+        """
+        debts = _uint_array(debts)
+        amounts = _uint_array(amounts)
+        prices = _uint_array(prices)
+        n_scenarios, n_positions = len(prices), len(debts)
+
+        positions_per_chunk = max(1, min(n_positions, chunk_cells))
+        scenarios_per_chunk = max(1, chunk_cells // positions_per_chunk)
+        for p_start in range(0, n_positions, positions_per_chunk):
+            positions = slice(p_start, p_start + positions_per_chunk)
+            for s_start in range(0, n_scenarios, scenarios_per_chunk):
+                scenarios = slice(s_start, s_start + scenarios_per_chunk)
+                values = self.usd_values(amounts[positions], prices[scenarios])
+                yield scenarios, positions, self.health_factors_from_values(debts[positions], values)
+
+    def health_factors(self, debts, amounts, prices, chunk_cells=CHUNK_CELLS):
+        """Health factor of every position in every scenario, shape (scenarios, positions)"""
+        result = np.empty((len(prices), len(debts)), dtype=object)
+        for scenarios, positions, block in self.iter_health_factors(debts, amounts, prices, chunk_cells):
+            result[scenarios, positions] = block
+        return result
+
+    def liquidatable_counts(self, debts, amounts, prices, chunk_cells=CHUNK_CELLS):
+        """Number of positions below MIN_HEALTH_FACTOR in each scenario, without keeping every value"""
+        counts = np.zeros(len(prices), dtype=np.int64)
+        for scenarios, _, block in self.iter_health_factors(debts, amounts, prices, chunk_cells):
+            counts[scenarios] += (block < self.min_health_factor).sum(axis=1).astype(np.int64)
+        return counts
+
+    def price_shocks(self, prices, shocks_bps):
+        """
+        Scenarios that move each token's price by a number of basis points,
+        floored like an integer feed answer. shocks_bps has shape (scenarios, tokens)
+        """
+        shocked = (_uint_array(prices)[None, :] * (10_000 + _int_array(shocks_bps))) // 10_000
+        assert (shocked > 0).all(), "Price shock leaves a non-positive price"
+        return shocked
+
+
+def _uint_array(values):
+    array = _int_array(values)
+    assert (array >= 0).all(), "Values must be unsigned"
+    return array
+
+
+def _int_array(values):
+    # dtype=object keeps arbitrary-precision Python ints, like uint256 without overflow.
+    # Never let numpy pick the dtype: values above int64 would become uint64 or float64
+    if isinstance(values, np.ndarray) and values.dtype == object:
+        return values
+    return np.array(values, dtype=object)
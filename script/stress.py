@@ -0,0 +1,200 @@
+import math
+import multiprocessing
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import NamedTuple
+
+import boa
+from moccasin import config as moccasin_config
+
+from script.deploy import deploy_dsc_system
+from script.indexer import PositionIndexer, PyevmLogSource
+from script.keeper import LiquidationKeeper
+
+# ------------------------------------------------------------------
+#                         CONFIGURATION
+# ------------------------------------------------------------------
+N_PATHS = 2_000
+N_STEPS = 30
+N_USERS = 25
+# Standard deviation of the log return of each price step
+VOLATILITY = 0.05
+SEED = 0
+# Range of health factors the population mints at, in units of MIN_HEALTH_FACTOR
+HEALTH_FACTOR_RANGE = (1.1, 3.0)
+
+
+class PathResult(NamedTuple):
+    path_id: int
+    liquidations: int
+    # Debt not backed by the collateral of its own position at the end of the path
+    bad_debt: int
+    # Worst point of protocol_must_have_more_value_than_total_supply
+    worst_step: int
+    worst_collateral_value: int
+    worst_total_supply: int
+
+
+# ------------------------------------------------------------------
+#                             WORKERS
+# ------------------------------------------------------------------
+# Each worker process deploys the system and seeds the population once, then
+# runs every path it gets inside boa.env.anchor(), so paths start from the
+# same state and never see each other's trades.
+_world = None
+
+
+class _World:
+    def __init__(self, seed: int, n_users: int):
+        # Same deployment as script/deploy.py
+        self.dsc, self.dsce = deploy_dsc_system()
+        active_network = moccasin_config.get_active_network()
+        # Indexed like COLLATERAL_TOKENS: [wbtc, weth]
+        self.tokens = [active_network.manifest_named("wbtc"), active_network.manifest_named("weth")]
+        self.feeds = [
+            active_network.manifest_named("btc_usd_price_feed"),
+            active_network.manifest_named("eth_usd_price_feed"),
+        ]
+        self.source = PyevmLogSource(self.dsce)
+        self.liquidator = boa.env.generate_address()
+        self.users = self._seed_population(random.Random(seed), n_users)
+        self.prices = [feed.latestAnswer() for feed in self.feeds]
+
+    def _seed_population(self, rng: random.Random, n_users: int) -> list:
+        """
+        Open random positions. Users hand their DSC to the liquidator, who
+        thus holds the whole supply and can always repay debt
+        """
+        wbtc, weth = self.tokens
+        users = []
+        for _ in range(n_users):
+            user = boa.env.generate_address()
+            weth_amount = rng.randrange(10**18, 10 * 10**18)
+            wbtc_amount = rng.randrange(0, 10**18) if rng.random() < 0.5 else 0
+            with boa.env.prank(user):
+                for token, amount in ((weth, weth_amount), (wbtc, wbtc_amount)):
+                    if amount:
+                        token.mint_amount(amount)
+                        token.approve(self.dsce, amount)
+                        self.dsce.deposit_collateral(token, amount)
+                _, collateral_value = self.dsce.get_account_information(user)
+                # Collateral counts for half its value, so this mints at the target health factor
+                debt = int(collateral_value / 2 / rng.uniform(*HEALTH_FACTOR_RANGE))
+                self.dsce.mint_dsc(debt)
+                self.dsc.transfer(self.liquidator, debt)
+            users.append(user)
+        return users
+
+    def collateral_value(self) -> int:
+        """Value of every token the engine holds, as the invariant measures it"""
+        return sum(
+            self.dsce.get_usd_value(token, token.balanceOf(self.dsce)) for token in self.tokens
+        )
+
+
+def _init_worker(seed: int, n_users: int):
+    global _world
+    # Spawned workers start without moccasin's config or an active network
+    if moccasin_config._config is None:
+        moccasin_config.initialize_global_config()
+        moccasin_config.get_config().set_active_network("pyevm")
+    # Deploy scripts print every address they deploy
+    sys.stdout = open(os.devnull, "w")
+    _world = _World(seed, n_users)
+
+
+def _run_path(path_id: int, seed: int, n_steps: int, volatility: float) -> PathResult:
+    """One random walk of every feed, with a keeper poll after each step"""
+    world = _world
+    rng = random.Random(f"{seed}-{path_id}")
+    with boa.env.anchor(), world.source.anchor():
+        indexer = PositionIndexer(world.dsce, world.source, checkpoint_path=None)
+        keeper = LiquidationKeeper(world.dsce, world.dsc, indexer, world.feeds, world.liquidator)
+        prices = list(world.prices)
+        liquidations = 0
+        worst = (0, world.collateral_value(), world.dsc.totalSupply())
+        for step in range(1, n_steps + 1):
+            for i, feed in enumerate(world.feeds):
+                prices[i] = max(1, int(prices[i] * math.exp(rng.gauss(0, volatility))))
+                feed.updateAnswer(prices[i])
+            liquidations += len(keeper.poll())
+
+            collateral_value, total_supply = world.collateral_value(), world.dsc.totalSupply()
+            # Lowest collateral value per DSC, compared without division
+            if collateral_value * worst[2] < worst[1] * total_supply:
+                worst = (step, collateral_value, total_supply)
+
+        accounts = world.dsce.get_accounts_information(world.users)
+        bad_debt = sum(
+            max(0, account.total_dsc_minted - account.collateral_value_usd) for account in accounts
+        )
+    return PathResult(path_id, liquidations, bad_debt, *worst)
+
+
+# ------------------------------------------------------------------
+#                             RUNNER
+# ------------------------------------------------------------------
+def stream_paths(
+    n_paths=N_PATHS, n_steps=N_STEPS, n_users=N_USERS, volatility=VOLATILITY, seed=SEED, workers=None
+):
+    """
+    Run the price paths over a process pool and yield each PathResult as soon
+    as it finishes, in completion order. Results only depend on the seed and
+    the path id, never on which worker ran the path.
+    """
+    # spawn, not fork: every worker builds its own boa environment from scratch
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(),
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(seed, n_users),
+    ) as executor:
+        futures = [
+            executor.submit(_run_path, path_id, seed, n_steps, volatility)
+            for path_id in range(n_paths)
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def summarize(results: list[PathResult]) -> dict:
+    worst = min(
+        results,
+        key=lambda result: result.worst_collateral_value / max(result.worst_total_supply, 1),
+    )
+    return {
+        "paths": len(results),
+        "liquidations": sum(result.liquidations for result in results),
+        "paths_with_bad_debt": sum(1 for result in results if result.bad_debt),
+        "total_bad_debt": sum(result.bad_debt for result in results),
+        "max_bad_debt": max(result.bad_debt for result in results),
+        "worst_path": worst.path_id,
+        "worst_step": worst.worst_step,
+        "worst_collateral_value": worst.worst_collateral_value,
+        "worst_total_supply": worst.worst_total_supply,
+    }
+
+
+def moccasin_main():
+    # mox loads this file under another module name, which spawned workers
+    # cannot import, so hand them the functions of script.stress
+    from script.stress import stream_paths, summarize
+
+    results = []
+    for result in stream_paths():
+        results.append(result)
+        if len(results) % 100 == 0:
+            print(f"{len(results)} / {N_PATHS} paths done")
+
+    report = summarize(results)
+    print(f"\nPaths: {report['paths']}, liquidations: {report['liquidations']}")
+    print(f"Paths with bad debt: {report['paths_with_bad_debt']}, "
+          f"total bad debt: {report['total_bad_debt'] / 10**18:,.2f} DSC, "
+          f"worst path: {report['max_bad_debt'] / 10**18:,.2f} DSC")
+    ratio = report["worst_collateral_value"] / max(report["worst_total_supply"], 1)
+    print(f"Worst collateral / supply: {ratio:.4f} "
+          f"(path {report['worst_path']}, step {report['worst_step']})")
+    return report
@@ -0,0 +1,25 @@
+import functools
+
+from boa.vm.py_evm import PyEVM
+
+
+# py-evm clears EIP-1153 transient storage at the end of each transaction, but
+# boa runs every call and deployment as a bare message, so transient values
+# would leak from one call into the next. Chains clear it after every
+# transaction: clear it before every top-level call instead.
+def _clearing_transient_storage(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self.vm.state.clear_transient_storage()
+        return method(self, *args, **kwargs)
+
+    wrapper.clears_transient_storage = True
+    return wrapper
+
+
+def install():
+    """Make every top-level call of a boa pyevm env start with empty transient storage"""
+    for name in ("execute_code", "deploy_code"):
+        method = getattr(PyEVM, name)
+        if not getattr(method, "clears_transient_storage", False):
+            setattr(PyEVM, name, _clearing_transient_storage(method))
@@ -0,0 +1,108 @@
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+import boa
+import pytest
+from eth.db.backends.memory import MemoryDB
+from eth.db.journal import JournalDB
+
+# ------------------------------------------------------------------
+#                         CONFIGURATION
+# ------------------------------------------------------------------
+# GAS_BENCH=check  (default) compare every measurement with the baseline
+# GAS_BENCH=update           rewrite the baseline with this run's numbers
+# GAS_BENCH_TOLERANCE=1.0    allowed regression in percent before failing
+BASELINE_PATH = Path(__file__).parent / "gas_baseline.json"
+MODE = os.environ.get("GAS_BENCH", "check")
+TOLERANCE_PERCENT = float(os.environ.get("GAS_BENCH_TOLERANCE", "1.0"))
+
+
+# ------------------------------------------------------------------
+#                           MEASUREMENT
+# ------------------------------------------------------------------
+@contextmanager
+def fresh_transaction():
+    """
+    Bill the calls inside the block like a new transaction: every account and
+    storage slot starts cold, and SSTORE refunds are computed against the
+    storage values at the start of the block. boa runs all calls in one
+    long-lived state, so without this the accesses and writes of earlier calls
+    would leak into the gas of later ones.
+    """
+    account_db = boa.env.evm.vm.state._account_db
+    accessed_state = account_db._journal_accessed_state
+    account_db._journal_accessed_state = JournalDB(MemoryDB())
+
+    get_storage = account_db.get_storage
+    original_values = {}
+
+    def get_storage_since_start(address, slot, from_journal=True):
+        if from_journal:
+            return get_storage(address, slot)
+        # SSTORE asks for the original value before it writes, so the first time
+        # a slot is asked for, its current value is its value at the start
+        key = (address, slot)
+        if key not in original_values:
+            original_values[key] = get_storage(address, slot)
+        return original_values[key]
+
+    account_db.get_storage = get_storage_since_start
+    try:
+        yield
+    finally:
+        account_db._journal_accessed_state = accessed_state
+        del account_db.get_storage
+
+
+def gas_used(contract) -> int:
+    """Execution gas of the contract's last call, net of the capped refund"""
+    computation = contract._computation
+    gas = computation.get_gas_used()
+    return gas - min(computation.get_gas_refund(), gas // 5)
+
+
+class GasBench:
+    def __init__(self, baseline: dict):
+        self.baseline = baseline
+        self.results = {}
+
+    def measure(self, name: str, contract, function: str, *args, sender=None):
+        """Call `contract.function(*args)` as a fresh transaction and record its gas"""
+        with boa.env.prank(sender or boa.env.eoa), fresh_transaction():
+            result = getattr(contract, function)(*args)
+        gas = gas_used(contract)
+        self.record(name, gas)
+        return result
+
+    def record(self, name: str, gas: int):
+        self.results[name] = gas
+        print(f"\n⛽ {name}: {gas:,} gas")
+        if MODE == "update":
+            return
+
+        assert name in self.baseline, (
+            f"{name} has no gas baseline, run with GAS_BENCH=update"
+        )
+        expected = self.baseline[name]
+        limit = expected * (100 + TOLERANCE_PERCENT) / 100
+        assert gas <= limit, (
+            f"{name} regressed: {gas:,} gas vs baseline {expected:,} "
+            f"(+{(gas - expected) * 100 / expected:.2f}%, tolerance {TOLERANCE_PERCENT}%)"
+        )
+
+
+# ------------------------------------------------------------------
+#                           FIXTURES
+# ------------------------------------------------------------------
+@pytest.fixture(scope="session")
+def gas_bench():
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    bench = GasBench(baseline)
+    yield bench
+
+    if MODE == "update" and bench.results:
+        # Merge, so running a subset of the benchmarks keeps the other entries
+        merged = {**baseline, **bench.results}
+        BASELINE_PATH.write_text(json.dumps(dict(sorted(merged.items())), indent=4) + "\n")
@@ -0,0 +1,315 @@
+import boa
+from eth_utils import to_wei
+
+from contracts.mocks import mock_engine_router
+
+from tests.conftest import (
+    COLLATERAL_AMOUNT, AMOUNT_TO_MINT, COLLATERAL_TO_COVER, new_permit_user, sign_permit
+)
+
+# Collateral worth exactly twice the debt: health factor of exactly 1e18 at $2000/ETH
+BOUNDARY_MINT = COLLATERAL_AMOUNT * 2000 // 2
+CRASHED_ETH_PRICE = 18 * 10**8
+
+
+def _open_position(dsce, weth, user, collateral=COLLATERAL_AMOUNT, debt=AMOUNT_TO_MINT):
+    with boa.env.prank(user):
+        weth.mint_amount(collateral)
+        weth.approve(dsce, collateral)
+        dsce.deposit_and_mint(weth, collateral, debt)
+
+
+def _fund_liquidator(dsce, weth, liquidator, positions=1):
+    _open_position(
+        dsce, weth, liquidator, COLLATERAL_TO_COVER * positions, AMOUNT_TO_MINT * positions
+    )
+
+
+# ------------------------------------------------------------------
+#                       DSCENGINE: DEPOSIT
+# ------------------------------------------------------------------
+def test_gas_deposit_collateral(gas_bench, dsce, weth, wbtc, some_user):
+    with boa.env.prank(some_user):
+        weth.approve(dsce, COLLATERAL_AMOUNT)
+        wbtc.approve(dsce, COLLATERAL_AMOUNT)
+
+    gas_bench.measure(
+        "dsc_engine.deposit_collateral[first]",
+        dsce, "deposit_collateral", weth, COLLATERAL_AMOUNT // 2, sender=some_user
+    )
+    gas_bench.measure(
+        "dsc_engine.deposit_collateral[repeat]",
+        dsce, "deposit_collateral", weth, COLLATERAL_AMOUNT // 2, sender=some_user
+    )
+    gas_bench.measure(
+        "dsc_engine.deposit_collateral[second_token]",
+        dsce, "deposit_collateral", wbtc, COLLATERAL_AMOUNT, sender=some_user
+    )
+
+
+def test_gas_deposit_and_mint(gas_bench, dsce, weth, some_user):
+    with boa.env.prank(some_user):
+        weth.approve(dsce, COLLATERAL_AMOUNT)
+
+    gas_bench.measure(
+        "dsc_engine.deposit_and_mint[first]",
+        dsce, "deposit_and_mint", weth, COLLATERAL_AMOUNT // 2, AMOUNT_TO_MINT, sender=some_user
+    )
+    gas_bench.measure(
+        "dsc_engine.deposit_and_mint[repeat]",
+        dsce, "deposit_and_mint", weth, COLLATERAL_AMOUNT // 2, AMOUNT_TO_MINT, sender=some_user
+    )
+
+
+def test_gas_deposit_with_permit(gas_bench, dsce, weth, liquidator):
+    deadline = boa.env.timestamp + 3600
+    account = new_permit_user(weth)
+    v, r, s = sign_permit(weth, account, dsce.address, COLLATERAL_AMOUNT, deadline)
+    gas_bench.measure(
+        "dsc_engine.deposit_with_permit[signed]",
+        dsce, "deposit_with_permit", weth, COLLATERAL_AMOUNT, deadline, v, r, s,
+        sender=account.address
+    )
+
+    # The permit was front-run: the deposit falls back to the allowance it already set
+    account = new_permit_user(weth)
+    v, r, s = sign_permit(weth, account, dsce.address, COLLATERAL_AMOUNT, deadline)
+    with boa.env.prank(liquidator):
+        weth.permit(account.address, dsce.address, COLLATERAL_AMOUNT, deadline, v, r, s)
+    gas_bench.measure(
+        "dsc_engine.deposit_with_permit[permit_used]",
+        dsce, "deposit_with_permit", weth, COLLATERAL_AMOUNT, deadline, v, r, s,
+        sender=account.address
+    )
+
+
+def test_gas_deposit_and_mint_with_permit(gas_bench, dsce, weth):
+    deadline = boa.env.timestamp + 3600
+    account = new_permit_user(weth)
+    v, r, s = sign_permit(weth, account, dsce.address, COLLATERAL_AMOUNT, deadline)
+    gas_bench.measure(
+        "dsc_engine.deposit_and_mint_with_permit[signed]",
+        dsce, "deposit_and_mint_with_permit", weth, COLLATERAL_AMOUNT, AMOUNT_TO_MINT, deadline, v, r, s,
+        sender=account.address
+    )
+    assert weth.allowance(account.address, dsce.address) == 0
+
+
+def test_gas_deposit_multi_and_mint(gas_bench, dsce, weth, wbtc, some_user):
+    with boa.env.prank(some_user):
+        weth.approve(dsce, COLLATERAL_AMOUNT)
+        wbtc.approve(dsce, COLLATERAL_AMOUNT)
+
+    gas_bench.measure(
+        "dsc_engine.deposit_multi_and_mint[two_tokens]",
+        dsce, "deposit_multi_and_mint",
+        [weth, wbtc], [COLLATERAL_AMOUNT, COLLATERAL_AMOUNT // 10], AMOUNT_TO_MINT,
+        sender=some_user
+    )
+    gas_bench.measure(
+        "dsc_engine.burn_and_redeem_multi[two_tokens]",
+        dsce, "burn_and_redeem_multi",
+        [weth, wbtc], [COLLATERAL_AMOUNT // 2, COLLATERAL_AMOUNT // 20], AMOUNT_TO_MINT // 2,
+        sender=some_user
+    )
+
+
+def test_gas_execute(gas_bench, dsce_minted, weth, wbtc, some_user):
+    # Swap the WETH collateral for WBTC and add debt: four operations, one health check
+    with boa.env.prank(some_user):
+        wbtc.approve(dsce_minted, COLLATERAL_AMOUNT // 10)
+
+    gas_bench.measure(
+        "dsc_engine.execute[rebalance]",
+        dsce_minted, "execute",
+        [
+            (1, wbtc.address, COLLATERAL_AMOUNT // 10),  # DEPOSIT
+            (2, weth.address, COLLATERAL_AMOUNT),  # REDEEM
+            (4, weth.address, AMOUNT_TO_MINT),  # MINT
+            (8, weth.address, AMOUNT_TO_MINT // 2),  # BURN
+        ],
+        sender=some_user
+    )
+
+
+# ------------------------------------------------------------------
+#                         DSCENGINE: MINT
+# ------------------------------------------------------------------
+def test_gas_mint_dsc(gas_bench, dsce_deposited, some_user):
+    gas_bench.measure(
+        "dsc_engine.mint_dsc[first]",
+        dsce_deposited, "mint_dsc", AMOUNT_TO_MINT, sender=some_user
+    )
+    gas_bench.measure(
+        "dsc_engine.mint_dsc[health_factor_boundary]",
+        dsce_deposited, "mint_dsc", BOUNDARY_MINT - AMOUNT_TO_MINT, sender=some_user
+    )
+    assert dsce_deposited.health_factor(some_user) == dsce_deposited.MIN_HEALTH_FACTOR()
+
+
+# ------------------------------------------------------------------
+#                     DSCENGINE: REDEEM AND BURN
+# ------------------------------------------------------------------
+def test_gas_redeem_collateral(gas_bench, dsce_deposited, weth, some_user):
+    gas_bench.measure(
+        "dsc_engine.redeem_collateral[no_debt]",
+        dsce_deposited, "redeem_collateral", weth, COLLATERAL_AMOUNT // 2, sender=some_user
+    )
+    with boa.env.prank(some_user):
+        dsce_deposited.mint_dsc(AMOUNT_TO_MINT)
+    gas_bench.measure(
+        "dsc_engine.redeem_collateral[with_debt]",
+        dsce_deposited, "redeem_collateral", weth, COLLATERAL_AMOUNT // 4, sender=some_user
+    )
+
+
+def test_gas_redeem_for_dsc(gas_bench, dsce_minted, weth, some_user):
+    gas_bench.measure(
+        "dsc_engine.redeem_for_dsc[partial]",
+        dsce_minted, "redeem_for_dsc", weth, COLLATERAL_AMOUNT // 2, AMOUNT_TO_MINT // 2,
+        sender=some_user
+    )
+    gas_bench.measure(
+        "dsc_engine.redeem_for_dsc[close]",
+        dsce_minted, "redeem_for_dsc", weth, COLLATERAL_AMOUNT // 2, AMOUNT_TO_MINT // 2,
+        sender=some_user
+    )
+    assert dsce_minted.get_collateral_balance_of_user(some_user, weth) == 0
+
+
+def test_gas_burn_dsc(gas_bench, dsce_minted, some_user):
+    gas_bench.measure(
+        "dsc_engine.burn_dsc[partial]",
+        dsce_minted, "burn_dsc", AMOUNT_TO_MINT // 2, sender=some_user
+    )
+    gas_bench.measure(
+        "dsc_engine.burn_dsc[full]",
+        dsce_minted, "burn_dsc", AMOUNT_TO_MINT // 2, sender=some_user
+    )
+
+
+# ------------------------------------------------------------------
+#                       DSCENGINE: LIQUIDATION
+# ------------------------------------------------------------------
+def test_gas_liquidate(gas_bench, dsce_minted, weth, eth_usd, some_user, liquidator):
+    other_user = boa.env.generate_address()
+    _open_position(dsce_minted, weth, other_user)
+    _fund_liquidator(dsce_minted, weth, liquidator, 2)
+    eth_usd.updateAnswer(CRASHED_ETH_PRICE)
+
+    gas_bench.measure(
+        "dsc_engine.liquidate[partial]",
+        dsce_minted, "liquidate", weth, some_user, AMOUNT_TO_MINT // 2, sender=liquidator
+    )
+    gas_bench.measure(
+        "dsc_engine.liquidate[full]",
+        dsce_minted, "liquidate", weth, other_user, AMOUNT_TO_MINT, sender=liquidator
+    )
+    assert dsce_minted.user_to_dsc_minted(other_user) == 0
+
+
+def test_gas_liquidate_many(gas_bench, dsce, weth, eth_usd, liquidator):
+    users = [boa.env.generate_address() for _ in range(5)]
+    for user in users:
+        _open_position(dsce, weth, user)
+    _fund_liquidator(dsce, weth, liquidator, len(users))
+    eth_usd.updateAnswer(CRASHED_ETH_PRICE)
+
+    gas_bench.measure(
+        "dsc_engine.liquidate_many[5_users]",
+        dsce, "liquidate_many", weth, users, [AMOUNT_TO_MINT] * len(users), False,
+        sender=liquidator
+    )
+
+
+# ------------------------------------------------------------------
+#                   DSCENGINE: BATCHED OPERATIONS
+# ------------------------------------------------------------------
+def test_gas_batched_deposit_and_mint(gas_bench, dsce, weth):
+    """With the per-transaction price cache, only the first operation pays for the feed"""
+    for times in (1, 4):
+        router = mock_engine_router.deploy(dsce)
+        with boa.env.prank(router.address):
+            weth.mint_amount(COLLATERAL_AMOUNT)
+        gas_bench.measure(
+            f"mock_engine_router.deposit_and_mint_many[{times}]",
+            router, "deposit_and_mint_many", weth, COLLATERAL_AMOUNT // times, AMOUNT_TO_MINT, times
+        )
+
+
+# ------------------------------------------------------------------
+#                          DSCENGINE: VIEWS
+# ------------------------------------------------------------------
+def test_gas_views(gas_bench, dsce_minted, weth, some_user):
+    gas_bench.measure(
+        "dsc_engine.get_account_information",
+        dsce_minted, "get_account_information", some_user
+    )
+    gas_bench.measure("dsc_engine.health_factor", dsce_minted, "health_factor", some_user)
+    gas_bench.measure(
+        "dsc_engine.get_usd_value", dsce_minted, "get_usd_value", weth, COLLATERAL_AMOUNT
+    )
+    gas_bench.measure(
+        "dsc_engine.get_token_amount_from_usd",
+        dsce_minted, "get_token_amount_from_usd", weth, AMOUNT_TO_MINT
+    )
+    gas_bench.measure(
+        "dsc_engine.calculate_health_factor",
+        dsce_minted, "calculate_health_factor", AMOUNT_TO_MINT, to_wei(20_000, "ether")
+    )
+    gas_bench.measure(
+        "dsc_engine.get_collateral_balance_of_user",
+        dsce_minted, "get_collateral_balance_of_user", some_user, weth
+    )
+    gas_bench.measure("dsc_engine.get_protocol_state", dsce_minted, "get_protocol_state")
+    gas_bench.measure("dsc_engine.get_max_mintable", dsce_minted, "get_max_mintable", some_user)
+    gas_bench.measure(
+        "dsc_engine.get_max_redeemable", dsce_minted, "get_max_redeemable", some_user, weth
+    )
+
+
+def test_gas_get_accounts_information(gas_bench, dsce_minted, weth, some_user):
+    users = [some_user] + [boa.env.generate_address() for _ in range(9)]
+    for user in users[1:]:
+        _open_position(dsce_minted, weth, user)
+
+    gas_bench.measure(
+        "dsc_engine.get_accounts_information[10_users]",
+        dsce_minted, "get_accounts_information", users
+    )
+
+
+# ------------------------------------------------------------------
+#                    DECENTRALIZED STABLE COIN
+# ------------------------------------------------------------------
+def test_gas_dsc(gas_bench, dsce_minted, dsc, some_user, liquidator):
+    engine = dsce_minted.address
+
+    gas_bench.measure(
+        "decentralized_stable_coin.transfer",
+        dsc, "transfer", liquidator, AMOUNT_TO_MINT // 2, sender=some_user
+    )
+    gas_bench.measure(
+        "decentralized_stable_coin.approve",
+        dsc, "approve", engine, AMOUNT_TO_MINT, sender=some_user
+    )
+    gas_bench.measure(
+        "decentralized_stable_coin.mint",
+        dsc, "mint", some_user, AMOUNT_TO_MINT, sender=engine
+    )
+    gas_bench.measure(
+        "decentralized_stable_coin.minter_burn_from",
+        dsc, "minter_burn_from", some_user, AMOUNT_TO_MINT // 2, sender=engine
+    )
+    gas_bench.measure(
+        "decentralized_stable_coin.burn_from",
+        dsc, "burn_from", some_user, AMOUNT_TO_MINT // 2, sender=engine
+    )
+    gas_bench.measure(
+        "decentralized_stable_coin.set_minter",
+        dsc, "set_minter", liquidator, True, sender=engine
+    )
+    gas_bench.measure(
+        "decentralized_stable_coin.transfer_ownership",
+        dsc, "transfer_ownership", liquidator, sender=engine
+    )
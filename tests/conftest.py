@@ -1,8 +1,19 @@
+import copy
+import copyreg
+from contextlib import contextmanager
+
 import boa
 import pytest
 from moccasin.config import get_active_network
+from script import hooks
+
+# Before any test module's `from contracts import ...`
+hooks.install()
+
 from script.deploy_dsc_engine import deploy_dsc_engine
+from eth.db import journal, slow_journal
 from eth_account import Account
+from lru import LRU
 from eth_utils import to_wei
 
 BALANCE = to_wei(10, "ether")
@@ -39,6 +50,11 @@ def btc_usd(active_network):
     return active_network.manifest_named("btc_usd_price_feed")
 
 
+@pytest.fixture(scope="session")
+def dsc(active_network):
+    return active_network.manifest_named("decentralized_stable_coin")
+
+
 @pytest.fixture(scope="session")
 def some_user(weth, wbtc):
     entropy = 13
@@ -60,66 +76,205 @@ def liquidator(weth, wbtc):
         wbtc.mock_mint()
     return account.address
 
-    
+
 # ------------------------------------------------------------------
-#                         FUNCTION SCOPED
+#                            SNAPSHOTS
 # ------------------------------------------------------------------
-@pytest.fixture(scope="function")
-def dsc(active_network):
-    return active_network.manifest_named("decentralized_stable_coin")
+# Journals mark deleted keys with module-level sentinels compared by identity
+_JOURNAL_SENTINELS = (
+    journal.DELETE_WRAPPED,
+    journal.REVERT_TO_WRAPPED,
+    slow_journal.DELETED_ENTRY,
+    slow_journal.ERASE_CREATED_ENTRY,
+)
+
+
+@contextmanager
+def _empty_lru_copies():
+    """
+    pyevm's caches are C LRU objects that cannot be copied. They only cache
+    what the journals hold, so a copied state starts with empty ones. Only
+    registered for the copy, so no other deepcopy or pickle of an LRU changes
+    """
+    previous = copyreg.dispatch_table.get(LRU)
+    copyreg.dispatch_table[LRU] = lambda cache: (LRU, (cache.get_size(),))
+    try:
+        yield
+    finally:
+        if previous is None:
+            del copyreg.dispatch_table[LRU]
+        else:
+            copyreg.dispatch_table[LRU] = previous
+
+
+def _copy_account_db(account_db):
+    with _empty_lru_copies():
+        return copy.deepcopy(account_db, {id(sentinel): sentinel for sentinel in _JOURNAL_SENTINELS})
+
+
+class EvmSnapshot:
+    """
+    A frozen copy of the pyevm state. Every fixture state is built once per
+    session and snapshotted; each test then runs on its own copy of the
+    snapshot, so it starts from a bit-identical state and its writes never
+    reach another test.
+    """
+
+    def __init__(self):
+        evm = boa.env.evm
+        self._account_db = _copy_account_db(evm.vm.state._account_db)
+        self._block = (evm.patch.block_number, evm.patch.timestamp)
+        # Tests deploy at the addresses of the snapshot's contracts once their
+        # nonces revert, so the address -> contract registry is restored too
+        self._contracts = dict(boa.env._contracts)
+
+    @contextmanager
+    def restore(self):
+        state, patch = boa.env.evm.vm.state, boa.env.evm.patch
+        live_account_db, live_contracts = state._account_db, boa.env._contracts
+        state._account_db = _copy_account_db(self._account_db)
+        boa.env._contracts = {**live_contracts, **self._contracts}
+        with patch.anchor():
+            patch.block_number, patch.timestamp = self._block
+            try:
+                yield
+            finally:
+                state._account_db, boa.env._contracts = live_account_db, live_contracts
+
+
+# Each state depends on every session fixture that writes to the chain, so
+# those writes are part of the snapshot.
+@pytest.fixture(scope="session")
+def _deployed_state(dsc, weth, wbtc, eth_usd, btc_usd, some_user, liquidator):
+    # Built in an anchor, so the live state never sees the engine
+    with boa.env.anchor():
+        dsce = deploy_dsc_engine(dsc)
+        return dsce, EvmSnapshot()
 
 
+@pytest.fixture(scope="session")
+def _deposited_state(_deployed_state, some_user, weth):
+    dsce, deployed = _deployed_state
+    with deployed.restore():
+        with boa.env.prank(some_user):
+            weth.approve(dsce.address, COLLATERAL_AMOUNT)
+            dsce.deposit_collateral(weth.address, COLLATERAL_AMOUNT)
+        return EvmSnapshot()
+
+
+@pytest.fixture(scope="session")
+def _minted_state(_deployed_state, some_user, weth):
+    dsce, deployed = _deployed_state
+    with deployed.restore():
+        with boa.env.prank(some_user):
+            weth.approve(dsce.address, COLLATERAL_AMOUNT)
+            dsce.deposit_and_mint(
+                weth.address, COLLATERAL_AMOUNT, AMOUNT_TO_MINT
+            )
+        return EvmSnapshot()
+
+
+@pytest.fixture(scope="session")
+def _liquidated_state(_deployed_state, _minted_state, weth, some_user, liquidator, eth_usd):
+    dsce, _ = _deployed_state
+    with _minted_state.restore():
+        weth.mock_mint()
+
+        eth_usd_updated_price = 18 * 10**8  
+        eth_usd.updateAnswer(eth_usd_updated_price)
+
+        with boa.env.prank(liquidator):
+            weth.mock_mint()
+            weth.approve(dsce, COLLATERAL_TO_COVER)
+            dsce.deposit_and_mint(
+                weth, COLLATERAL_TO_COVER, AMOUNT_TO_MINT
+            )
+            dsce.liquidate(weth, some_user, AMOUNT_TO_MINT)
+        return EvmSnapshot()
+
+
+# ------------------------------------------------------------------
+#                         FUNCTION SCOPED
+# ------------------------------------------------------------------
+# Each fixture switches the test to a fresh copy of its state, and back
+# to the previous state on teardown. Fixtures depend on dsce, so the
+# most specific state is always the last one restored.
 @pytest.fixture(scope="function")
-def dsce(dsc, weth, wbtc, eth_usd, btc_usd):
-    return deploy_dsc_engine(dsc)
+def dsce(_deployed_state):
+    dsce, snapshot = _deployed_state
+    with snapshot.restore():
+        yield dsce
 
 
 @pytest.fixture(scope="function")
-def dsce_deposited(dsce, some_user, weth):
-    with boa.env.prank(some_user):
-        weth.approve(dsce.address, COLLATERAL_AMOUNT)
-        dsce.deposit_collateral(weth.address, COLLATERAL_AMOUNT)
-    return dsce
+def dsce_deposited(dsce, _deposited_state):
+    with _deposited_state.restore():
+        yield dsce
 
 
 @pytest.fixture(scope="function")
-def dsce_minted(dsce, some_user, weth):
-    with boa.env.prank(some_user):
-        weth.approve(dsce.address, COLLATERAL_AMOUNT)
-        dsce.deposit_and_mint(
-            weth.address, COLLATERAL_AMOUNT, AMOUNT_TO_MINT
-        )
-    return dsce
+def dsce_minted(dsce, _minted_state):
+    with _minted_state.restore():
+        yield dsce
 
 
 @pytest.fixture(scope="function")
 def starting_liquidator_weth_balance(liquidator, weth):
     return weth.balanceOf(liquidator)
 
-    
+
 @pytest.fixture(scope="function")
-def dsce_liquidated(
-    starting_liquidator_weth_balance,
-    dsce_minted,
-    weth,
-    dsc,
-    some_user,
-    liquidator,
-    eth_usd,
-):
-    weth.mock_mint()
-
-    eth_usd_updated_price = 18 * 10**8  
-    eth_usd.updateAnswer(eth_usd_updated_price)
-
-    with boa.env.prank(liquidator):
-        weth.mock_mint()
-        weth.approve(dsce_minted, COLLATERAL_TO_COVER)
-        dsce_minted.deposit_and_mint(
-            weth, COLLATERAL_TO_COVER, AMOUNT_TO_MINT
-        )
-        dsc.approve(dsce_minted, AMOUNT_TO_MINT)
-        dsce_minted.liquidate(weth, some_user, AMOUNT_TO_MINT)
-
-    return dsce_minted
-    
\ No newline at end of file
+def dsce_liquidated(starting_liquidator_weth_balance, dsce_minted, _liquidated_state):
+    with _liquidated_state.restore():
+        yield dsce_minted
+
+
+# ------------------------------------------------------------------
+#                             PERMITS
+# ------------------------------------------------------------------
+def sign_permit(token, account, spender, amount, deadline):
+    """Sign an EIP-2612 permit for `token` with `account`'s key"""
+    _, name, version, chain_id, verifying_contract, _, _ = token.eip712Domain()
+    signed = Account.sign_typed_data(
+        account.key,
+        full_message={
+            "types": {
+                "EIP712Domain": [
+                    {"name": "name", "type": "string"},
+                    {"name": "version", "type": "string"},
+                    {"name": "chainId", "type": "uint256"},
+                    {"name": "verifyingContract", "type": "address"},
+                ],
+                "Permit": [
+                    {"name": "owner", "type": "address"},
+                    {"name": "spender", "type": "address"},
+                    {"name": "value", "type": "uint256"},
+                    {"name": "nonce", "type": "uint256"},
+                    {"name": "deadline", "type": "uint256"},
+                ],
+            },
+            "primaryType": "Permit",
+            "domain": {
+                "name": name,
+                "version": version,
+                "chainId": chain_id,
+                "verifyingContract": verifying_contract,
+            },
+            "message": {
+                "owner": account.address,
+                "spender": str(spender),
+                "value": amount,
+                "nonce": token.nonces(account.address),
+                "deadline": deadline,
+            },
+        },
+    )
+    return signed.v, signed.r.to_bytes(32, "big"), signed.s.to_bytes(32, "big")
+
+
+def new_permit_user(weth):
+    """A fresh account with WETH and no allowance to the engine"""
+    account = Account.create()
+    with boa.env.prank(account.address):
+        weth.mint_amount(COLLATERAL_AMOUNT)
+    return account
@@ -1,7 +1,17 @@
-from hypothesis.stateful import RuleBasedStateMachine, initialize, rule, invariant
-from hypothesis import assume, settings
-from script.deploy_dsc import deploy_dsc
-from script.deploy_dsc_engine import deploy_dsc_engine
+import csv
+import functools
+import json
+import os
+import random
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+from hypothesis.stateful import RuleBasedStateMachine, initialize, rule, invariant, run_state_machine_as_test
+from hypothesis import assume, seed, settings
+from script.deploy import deploy_dsc_system
 from moccasin.config import get_active_network
 from eth.constants import ZERO_ADDRESS
 from boa.util.abi import Address
@@ -15,18 +25,120 @@ from contracts.mocks import MockV3Aggregator
 
 USERS_SIZE = 10
 MAX_DEPOSIT_SIZE = to_wei(1000, "ether")
+# FUZZ_VERBOSE=1 brings back the debug prints of every step
+FUZZ_VERBOSE = os.environ.get("FUZZ_VERBOSE", "0") == "1"
+FUZZ_STATS_DIR = Path(os.environ.get("FUZZ_STATS_DIR", "out/fuzz_stats"))
+
+
+# ------------------------------------------------------------------
+#                         INSTRUMENTATION
+# ------------------------------------------------------------------
+def _bucket(value) -> int:
+    """Power-of-two lower bound of a histogram bucket"""
+    value = int(value)
+    return 1 << (value.bit_length() - 1) if value > 0 else 0
+
+
+class FuzzStats:
+    """Call counts, time and gas of every rule and invariant in a fuzz run"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.calls = {}
+        self._depth = 0
+
+    @contextmanager
+    def measure(self, name: str, kind: str):
+        # A rule calling other rules is one step, billed to the outer rule
+        if self._depth:
+            yield
+            return
+        self._depth += 1
+        start_time, start_gas = time.perf_counter(), boa.env.get_gas_used()
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            seconds = time.perf_counter() - start_time
+            gas = boa.env.get_gas_used() - start_gas
+            entry = self.calls.setdefault(name, {
+                "kind": kind, "calls": 0, "seconds": 0.0, "gas": 0,
+                "time_histogram_us": Counter(), "gas_histogram": Counter(),
+            })
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            entry["gas"] += gas
+            entry["time_histogram_us"][_bucket(seconds * 1e6)] += 1
+            entry["gas_histogram"][_bucket(gas)] += 1
+
+    def _total(self, kind: str, field: str):
+        return sum(entry[field] for entry in self.calls.values() if entry["kind"] == kind)
+
+    @property
+    def steps(self) -> int:
+        return self._total("rule", "calls")
+
+    def report(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        rule_seconds, invariant_seconds = self._total("rule", "seconds"), self._total("invariant", "seconds")
+        return {
+            "worker": os.environ.get("PYTEST_XDIST_WORKER", "main"),
+            "seed": FUZZ_SEED,
+            "elapsed_seconds": elapsed,
+            "steps": self.steps,
+            "steps_per_second": self.steps / elapsed if elapsed else 0.0,
+            # Share of the time in rules and invariants spent checking invariants
+            "invariant_overhead": invariant_seconds / ((rule_seconds + invariant_seconds) or 1),
+            "calls": {
+                name: {
+                    **entry,
+                    "time_histogram_us": dict(sorted(entry["time_histogram_us"].items())),
+                    "gas_histogram": dict(sorted(entry["gas_histogram"].items())),
+                }
+                for name, entry in sorted(self.calls.items())
+            },
+        }
+
+    def write(self, directory: Path) -> Path:
+        """Write the report as <worker>.json and a per-call summary as <worker>.csv"""
+        report = self.report()
+        directory.mkdir(parents=True, exist_ok=True)
+        json_path = directory / f"{report['worker']}.json"
+        json_path.write_text(json.dumps(report, indent=4) + "\n")
+        with open(directory / f"{report['worker']}.csv", "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["name", "kind", "calls", "seconds", "mean_ms", "gas", "mean_gas"])
+            for name, entry in report["calls"].items():
+                calls = entry["calls"]
+                writer.writerow([
+                    name, entry["kind"], calls, f"{entry['seconds']:.6f}",
+                    f"{entry['seconds'] * 1000 / calls:.3f}", entry["gas"], entry["gas"] // calls,
+                ])
+        return json_path
+
+
+def instrumented(kind: str):
+    """Measure every call of a rule, invariant or initializer in the machine's FuzzStats"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(self, *args, **kwargs):
+            with self.stats.measure(function.__name__, kind):
+                return function(self, *args, **kwargs)
+        return wrapper
+    return decorator
 
 # Invariant: Property of the system that should always be true
 
 
 class StablecoinFuzzer(RuleBasedStateMachine):
-    def __init__(self):
+    def __init__(self, stats=None):
         super().__init__()
+        self.stats = stats or FuzzStats()
 
     @initialize()
+    @instrumented("setup")
     def setup(self):
-        self.dsc  = deploy_dsc()
-        self.dsce = deploy_dsc_engine(self.dsc)
+        self.dsc, self.dsce = deploy_dsc_system()
 
         active_network = get_active_network()
         self.weth = active_network.manifest_named("weth")
@@ -44,16 +156,18 @@ class StablecoinFuzzer(RuleBasedStateMachine):
         user_seed= st.integers(min_value=0, max_value=USERS_SIZE - 1),
         amount = strategy("uint256", min_value=1, max_value=MAX_DEPOSIT_SIZE)
     )
+    @instrumented("rule")
     def mint_and_deposit(self, collateral_seed, user_seed, amount):
         # 1. Select a random collateral -> collateral_seed
         # 2. Select a random user       -> user_seed
         # 3. Deposit a random amount    -> amount
 
-        print("Depositing collateral!")
         collateral = self._get_collateral_from_seed(collateral_seed)
         user = self.users[user_seed]
-        print(collateral.name())
-        print(amount)
+        if FUZZ_VERBOSE:
+            print("Depositing collateral!")
+            print(collateral.name())
+            print(amount)
         with boa.env.prank(user):
             collateral.mint_amount(amount)
             collateral.approve(self.dsce.address, amount)
@@ -65,14 +179,16 @@ class StablecoinFuzzer(RuleBasedStateMachine):
         user_seed= st.integers(min_value=0, max_value=USERS_SIZE - 1),
         percentage = st.integers(min_value=1, max_value=100)
     )
+    @instrumented("rule")
     def redeem_collateral(self, collateral_seed, user_seed, percentage):
-        print("Redeem collateral!")
         collateral = self._get_collateral_from_seed(collateral_seed)
         user = self.users[user_seed]
-        max_redeemable = self.dsce.get_collateral_balance_of_user(user, collateral)
+        max_redeemable = self.dsce.get_max_redeemable(user, collateral)
         to_redeem = (max_redeemable * percentage) // 100
-        print(collateral.name())
-        print(to_redeem)
+        if FUZZ_VERBOSE:
+            print("Redeem collateral!")
+            print(collateral.name())
+            print(to_redeem)
         assume(to_redeem > 0)
 
         with boa.env.prank(user):
@@ -80,32 +196,23 @@ class StablecoinFuzzer(RuleBasedStateMachine):
         
 
     @rule(
-        collateral_seed = st.integers(min_value=0, max_value=1),
         user_seed= st.integers(min_value=0, max_value=USERS_SIZE - 1),
         amount = strategy("uint256", min_value=1, max_value=MAX_DEPOSIT_SIZE)
     )
-    def mint_dsc(self, user_seed, amount, collateral_seed):
+    @instrumented("rule")
+    def mint_dsc(self, user_seed, amount):
         user = self.users[user_seed]
-        with boa.env.prank(user):
-            try:
+        # Mint only what the collateral backs, instead of catching the revert
+        if amount <= self.dsce.get_max_mintable(user):
+            with boa.env.prank(user):
                 self.dsce.mint_dsc(amount)
-            except BoaError as e:
-                if "DSCEngine: Needs more than zero" in str(e.stack_trace[0].vm_error):
-                    collateral = self._get_collateral_from_seed(collateral_seed)
-                    collateral_amount = self.dsce.get_token_amount_from_usd(
-                        collateral.address, amount
-                    )
-                    if collateral_amount == 0: 
-                        collateral_amount = 1
-                    collateral_amount = collateral_amount * 2
-                    self.mint_and_deposit(collateral_seed, user_seed, collateral_amount)
-                    self.dsce.mint_dsc(amount)
 
     
     @rule(
         percentage_new_price=st.floats(min_value=0.8, max_value=1.15),
         collateral_seed = st.integers(min_value=0, max_value=1),                                 
     )
+    @instrumented("rule")
     def update_collateral_price(self, collateral_seed, percentage_new_price):
         collateral = self._get_collateral_from_seed(collateral_seed)
         price_feed = MockV3Aggregator.at(
@@ -121,6 +228,7 @@ class StablecoinFuzzer(RuleBasedStateMachine):
         user_seed= st.integers(min_value=0, max_value=USERS_SIZE - 1),
         amount = strategy("uint256", min_value=1, max_value=MAX_DEPOSIT_SIZE)
     )
+    @instrumented("rule")
     def mint_and_update(self, collateral_seed, user_seed, amount):
         self.mint_and_deposit(collateral_seed, user_seed, amount)
         self.update_collateral_price(collateral_seed, 0.85) # Only drop 15% instead of 70%
@@ -131,11 +239,13 @@ class StablecoinFuzzer(RuleBasedStateMachine):
         user_seed= st.integers(min_value=0, max_value=USERS_SIZE - 1),
         percentage = st.integers(min_value=1, max_value=100)
     )
+    @instrumented("rule")
     def liquidate_user(self, collateral_seed, user_seed, percentage):
         user = self.users[user_seed]
         health_factor = self.dsce.health_factor(user)
 
-        print(f"Attempting liquidation for user {user_seed}, health factor: {health_factor}")
+        if FUZZ_VERBOSE:
+            print(f"Attempting liquidation for user {user_seed}, health factor: {health_factor}")
         
         # Only proceed if health factor is broken
         assume(health_factor < int(1e18))
@@ -153,7 +263,8 @@ class StablecoinFuzzer(RuleBasedStateMachine):
         # Select collateral to seize
         collateral = self._get_collateral_from_seed(collateral_seed)
 
-        print(f"Liquidating {debt_to_cover} DSC worth of {collateral.name()}")
+        if FUZZ_VERBOSE:
+            print(f"Liquidating {debt_to_cover} DSC worth of {collateral.name()}")
         
         try:
             with boa.env.prank(self.liquidator):
@@ -163,26 +274,32 @@ class StablecoinFuzzer(RuleBasedStateMachine):
                 
                 # Perform liquidation
                 self.dsce.liquidate(collateral.address, user, debt_to_cover)
-                print(f"Successfully liquidated {debt_to_cover} DSC")
+                if FUZZ_VERBOSE:
+                    print(f"Successfully liquidated {debt_to_cover} DSC")
         except BoaError as e:
-            print(f"Liquidation failed: {e}")
+            if FUZZ_VERBOSE:
+                print(f"Liquidation failed: {e}")
             pass
 
 
    
     # Invariant: Protocol must have more value in collateral than total supply.    
     @invariant()
+    @instrumented("invariant")
     def protocol_must_have_more_value_than_total_supply(self):
-        total_supply = self.dsc.totalSupply()
-        weth_deposited = self.weth.balanceOf(self.dsce.address)
-        wbtc_deposited = self.wbtc.balanceOf(self.dsce.address)
+        # One call: the engine values its aggregate collateral and debt counters
+        collateral_value, total_debt, _ = self.dsce.get_protocol_state()
+        assert collateral_value >= total_debt
 
-        weth_value = self.dsce.get_usd_value(self.weth, weth_deposited)
-        wbtc_value = self.dsce.get_usd_value(self.wbtc, wbtc_deposited)
+    # Invariant: The aggregate counters behind get_protocol_state match the ledgers they summarize
+    @invariant()
+    @instrumented("invariant")
+    def protocol_counters_match_balances_and_supply(self):
+        for token in (self.weth, self.wbtc):
+            assert self.dsce.total_deposited(token) == token.balanceOf(self.dsce)
+        assert self.dsce.total_debt() == self.dsc.totalSupply()
 
-        assert (weth_value + wbtc_value) >= total_supply
 
-    
     def _get_collateral_from_seed(self, seed):
         if seed == 0:
             return self.weth
@@ -190,8 +307,58 @@ class StablecoinFuzzer(RuleBasedStateMachine):
             return self.wbtc
 
 
-stable_coin_fuzzer = StablecoinFuzzer.TestCase
-stable_coin_fuzzer.settings = settings(max_examples=64, stateful_step_count=64)
+# ------------------------------------------------------------------
+#                           CAMPAIGN
+# ------------------------------------------------------------------
+# The campaign is split into shards, each with its own Hypothesis seed, so
+# `mox test tests/fuzz -n auto` spreads them over one process per core. Every
+# worker process has its own boa environment and deployments. Scale the
+# campaign with FUZZ_SHARDS and FUZZ_EXAMPLES_PER_SHARD.
+FUZZ_SHARDS = int(os.environ.get("FUZZ_SHARDS", "8"))
+FUZZ_EXAMPLES_PER_SHARD = int(os.environ.get("FUZZ_EXAMPLES_PER_SHARD", "8"))
+
+
+def _base_seed() -> int:
+    """
+    FUZZ_SEED when set, to replay a run. Otherwise a new seed every run, so
+    runs keep exploring: xdist workers derive it from their shared run id
+    """
+    if "FUZZ_SEED" in os.environ:
+        return int(os.environ["FUZZ_SEED"])
+    if "PYTEST_XDIST_TESTRUNUID" in os.environ:
+        return int(os.environ["PYTEST_XDIST_TESTRUNUID"][:8], 16)
+    return random.getrandbits(32)
 
 
+FUZZ_SEED = _base_seed()
 
+
+def _shard_machine(shard, stats):
+    # One factory source for every shard, so all shards share one key in the
+    # example database: failures found by any shard are replayed by all
+    def make_machine():
+        return StablecoinFuzzer(stats)
+
+    return seed(FUZZ_SEED + shard)(make_machine)
+
+
+@pytest.fixture(scope="session")
+def fuzz_stats():
+    # Shown with the output of a failing shard: rerun it with this FUZZ_SEED
+    print(f"🎲 FUZZ_SEED={FUZZ_SEED}")
+    stats = FuzzStats()
+    yield stats
+    if stats.steps:
+        report_path = stats.write(FUZZ_STATS_DIR)
+        report = stats.report()
+        print(f"\n📊 {report['steps']} steps at {report['steps_per_second']:.1f} steps/s, "
+              f"{report['invariant_overhead']:.0%} of the time in invariants, "
+              f"FUZZ_SEED={FUZZ_SEED} -> {report_path}")
+
+
+@pytest.mark.parametrize("shard", range(FUZZ_SHARDS))
+def test_stable_coin_fuzzer(shard, fuzz_stats):
+    run_state_machine_as_test(
+        _shard_machine(shard, fuzz_stats),
+        settings=settings(max_examples=FUZZ_EXAMPLES_PER_SHARD, stateful_step_count=64),
+    )
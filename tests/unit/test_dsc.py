@@ -1,4 +1,15 @@
 import boa
+import pytest
+import rlp
+from eth_account import Account
+from eth_utils import keccak
+from boa.util.abi import Address
+from moccasin.config import get_active_network
+
+from contracts import decentralized_stable_coin, dsc_engine
+from contracts.mocks import mock_token
+from script.deploy import deploy_dsc_system
+from script.deploy_batch import DeploymentBatch
 
 ZERO = "0x0000000000000000000000000000000000000000"
 
@@ -12,4 +23,141 @@ def test_cannot_mint_to_zero_address(dsc):
 def test_cant_burn_more_than_you_have(dsc):
     with boa.env.prank(dsc.owner()):
         with boa.reverts():
-            dsc.burn_from(dsc.owner(), 1)
\ No newline at end of file
+            dsc.burn_from(dsc.owner(), 1)
+
+
+def test_only_minter_can_burn_without_allowance(dsc, some_user):
+    with boa.env.prank(some_user):
+        with boa.reverts("erc20: access is denied"):
+            dsc.minter_burn_from(dsc.owner(), 0)
+
+
+def test_minter_burn_does_not_spend_allowance(dsce_minted, dsc, some_user):
+    with boa.env.prank(dsce_minted.address):
+        dsc.minter_burn_from(some_user, 1)
+    assert dsc.allowance(some_user, dsce_minted.address) == 0
+    assert dsc.balanceOf(some_user) == 100 * 10**18 - 1
+
+
+def test_system_deploy_hands_dsc_to_engine_at_construction(some_user):
+    # Anchored: the deploy replaces the named contracts only for this test
+    with boa.env.anchor():
+        dsc, dsce = deploy_dsc_system()
+        assert dsc.owner() == dsce.address
+        with boa.env.prank(dsce.address):
+            dsc.mint(some_user, 1)
+        assert dsc.balanceOf(some_user) == 1
+        # The engine's registry points at the batch-deployed mocks
+        assert dsce.COLLATERAL_TOKENS(1) == get_active_network().manifest_named("weth").address
+
+
+def test_system_deploy_leaves_deployer_without_minter_role(some_user):
+    with boa.env.anchor():
+        dsc, dsce = deploy_dsc_system()
+        with boa.env.prank(dsce.address):
+            dsc.mint(some_user, 100)
+        with boa.env.prank(boa.env.eoa):
+            with boa.reverts("erc20: access is denied"):
+                dsc.mint(boa.env.eoa, 1)
+            with boa.reverts("erc20: access is denied"):
+                dsc.minter_burn_from(some_user, 100)
+        assert dsc.balanceOf(some_user) == 100
+
+
+def test_deployer_cannot_burn_user_dsc_after_engine_deploy(dsce_minted, dsc, some_user):
+    # The deployer owned and minted the DSC until it was handed to the engine
+    balance = dsc.balanceOf(some_user)
+    with boa.env.prank(boa.env.eoa):
+        with boa.reverts("erc20: access is denied"):
+            dsc.minter_burn_from(some_user, balance)
+        with boa.reverts("erc20: access is denied"):
+            dsc.mint(boa.env.eoa, 1)
+    assert dsc.balanceOf(some_user) == balance
+
+
+def test_zksync_system_deploy_falls_back_to_sequential(monkeypatch, some_user):
+    # zkSync create addresses do not follow the nonce, so nothing is predicted
+    monkeypatch.setattr(get_active_network(), "is_zksync", True)
+    with boa.env.anchor():
+        dsc, dsce = deploy_dsc_system()
+        assert dsc.owner() == dsce.address
+        with boa.env.prank(boa.env.eoa):
+            with boa.reverts("erc20: access is denied"):
+                dsc.mint(some_user, 1)
+
+
+class _FakeNode:
+    """A JSON-RPC node backed by boa's pyevm: the transactions sent to it run on boa.env"""
+
+    def __init__(self, nonce_offset=0):
+        self.nonce_offset = nonce_offset
+        self.round_trips = []  # the methods of every request
+        self.receipts, self.receipt_polls = {}, 0
+
+    def fetch(self, method, params):
+        return self.fetch_multi([(method, params)])[0]
+
+    def fetch_multi(self, payloads):
+        self.round_trips.append([method for method, _ in payloads])
+        return [getattr(self, method)(*params) for method, params in payloads]
+
+    def eth_getTransactionCount(self, address, block):
+        return hex(boa.env.evm.vm.state.get_nonce(Address(address).canonical_address) + self.nonce_offset)
+
+    def eth_chainId(self):
+        return "0x1"
+
+    def eth_gasPrice(self):
+        return hex(10**9)
+
+    def eth_sendRawTransaction(self, raw):
+        nonce, _, gas, _, _, data, *_ = rlp.decode(bytes.fromhex(raw[2:]))
+        sender = Address(Account.recover_transaction(raw))
+        assert int.from_bytes(nonce, "big") == boa.env.evm.vm.state.get_nonce(sender.canonical_address)
+        address, _ = boa.env.deploy_code(sender=sender, gas=int.from_bytes(gas, "big"), bytecode=data)
+        tx_hash = "0x" + keccak(bytes.fromhex(raw[2:])).hex()
+        self.receipts[tx_hash] = {"status": "0x1", "contractAddress": str(address)}
+        return tx_hash
+
+    def eth_getTransactionReceipt(self, tx_hash):
+        # Nothing is mined on the first poll
+        self.receipt_polls += 1
+        return self.receipts[tx_hash] if self.receipt_polls > len(self.receipts) else None
+
+
+def test_batch_on_a_network_sends_every_creation_at_once(monkeypatch, weth, eth_usd, btc_usd):
+    account = Account.create()
+    monkeypatch.setattr(boa.env, "eoa", account.address)
+    node = _FakeNode()
+    with boa.env.anchor():
+        batch = DeploymentBatch(node, account)
+        wbtc_address = batch.add(mock_token)
+        dsc_address = batch.add(decentralized_stable_coin, batch.next_address(ahead=1))
+        dsce_address = batch.add(dsc_engine, [wbtc_address, weth], [btc_usd, eth_usd], dsc_address)
+        wbtc, dsc, dsce = batch.submit()
+
+        assert (wbtc.address, dsc.address, dsce.address) == (wbtc_address, dsc_address, dsce_address)
+        assert dsc.owner() == dsce.address
+        assert dsce.COLLATERAL_TOKENS(0) == wbtc.address
+    # Nonce, fees, one batch of sends and the receipts polled together
+    assert node.round_trips == [
+        ["eth_getTransactionCount"],
+        ["eth_chainId", "eth_gasPrice"],
+        ["eth_sendRawTransaction"] * 3,
+        ["eth_getTransactionReceipt"] * 3,
+        ["eth_getTransactionReceipt"] * 3,
+    ]
+
+
+def test_batch_sends_nothing_when_an_address_is_off_prediction(monkeypatch):
+    # A node nonce ahead of the chain: the DSC would get a wrong minter
+    account = Account.create()
+    monkeypatch.setattr(boa.env, "eoa", account.address)
+    node = _FakeNode(nonce_offset=1)
+    with boa.env.anchor():
+        batch = DeploymentBatch(node, account)
+        batch.add(decentralized_stable_coin, batch.next_address(ahead=1))
+        batch.add(decentralized_stable_coin, boa.env.eoa)
+        with pytest.raises(RuntimeError, match="expected"):
+            batch.submit()
+    assert ["eth_sendRawTransaction"] not in node.round_trips
@@ -1,12 +1,14 @@
 import boa
 import pytest
-from eth.codecs.abi.exceptions import EncodeError
+from eth_account import Account
 from eth_utils import to_wei
 
 from script.mocks.deploy_collateral import deploy_collateral
 from contracts import dsc_engine
 from contracts.mocks import mock_token
-from tests.conftest import COLLATERAL_AMOUNT, AMOUNT_TO_MINT, COLLATERAL_TO_COVER
+from contracts.mocks import MockV3Aggregator
+from contracts.mocks import mock_engine_router
+from tests.conftest import COLLATERAL_AMOUNT, AMOUNT_TO_MINT, COLLATERAL_TO_COVER, new_permit_user, sign_permit
 
 MIN_HEALTH_FACTOR = to_wei(1, "ether")
 LIQUIDATION_THRESHOLD = 50
@@ -45,14 +47,14 @@ def test_reverts_if_token_length_doesnt_match_price_feeds(
     print(f"   Difference:  {abs(len(token_addresses) - len(price_feed_addresses))} mismatch")
     
     print(f"\n🔴 Expected Behavior:")
-    print(f"   Deployment should FAIL with EncodeError")
+    print(f"   Deployment should REVERT")
     print(f"   Reason: Each token needs exactly one price feed")
     
     print(f"\n🧪 Attempting Deployment...")
 
     # Attempt deployment - should fail
     try:
-        with pytest.raises(EncodeError):
+        with boa.reverts("DSCEngine: Token and price feed lengths differ"):
             dsc_engine.deploy(
                 [wbtc.address if hasattr(wbtc, 'address') else wbtc,
                  weth.address if hasattr(weth, 'address') else weth,
@@ -61,7 +63,7 @@ def test_reverts_if_token_length_doesnt_match_price_feeds(
                  btc_usd.address if hasattr(btc_usd, 'address') else btc_usd],
                 dsc.address
             )
-        print(f"   ✅ SUCCESS: Deployment correctly failed with EncodeError")
+        print(f"   ✅ SUCCESS: Deployment correctly reverted")
         print(f"   The contract properly rejected mismatched array lengths")
     except Exception as e:
         print(f"   ❌ UNEXPECTED ERROR: {type(e).__name__}: {e}")
@@ -73,10 +75,146 @@ def test_reverts_if_token_length_doesnt_match_price_feeds(
 #def test_reverts_if_token_length_doesnt_match_price_feeds(
 #    dsc, eth_usd, btc_usd, weth, wbtc
 #):
-#    with pytest.raises(EncodeError):
+#    with boa.reverts():
 #        dsc_engine.deploy([wbtc, weth, weth], [eth_usd, btc_usd], dsc.address)
 
 
+def test_reverts_if_collateral_token_is_duplicated(dsc, eth_usd, btc_usd, weth):
+    """Test that deployment fails when the same token is registered twice"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Reverts if Collateral Token is Duplicated")
+    print(f"{'='*70}")
+
+    print(f"\n🪙  Token Addresses: [{weth.address}, {weth.address}]")
+    print(f"   Expected: Should REVERT (one registry entry per token)")
+
+    with boa.reverts("DSCEngine: Duplicate collateral token"):
+        dsc_engine.deploy(
+            [weth.address, weth.address], [eth_usd.address, btc_usd.address], dsc.address
+        )
+
+    print(f"   ✅ Correctly reverted!")
+    print(f"{'='*70}\n")
+
+
+# ------------------------------------------------------------------
+#                     COLLATERAL REGISTRY TESTS
+# ------------------------------------------------------------------
+def test_collateral_registry_is_set_at_construction(dsce, weth, wbtc, eth_usd, btc_usd):
+    """Test that tokens, price feeds and precisions are registered in deploy order"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Collateral Registry is Set at Construction")
+    print(f"{'='*70}")
+
+    expected = [(wbtc, btc_usd), (weth, eth_usd)]
+
+    print(f"\n📋 Registry:")
+    for i, (token, feed) in enumerate(expected):
+        print(f"   [{i}] token={dsce.COLLATERAL_TOKENS(i)} feed={dsce.COLLATERAL_PRICE_FEEDS(i)} precision={dsce.COLLATERAL_PRECISIONS(i)}")
+
+        assert dsce.COLLATERAL_TOKENS(i) == token.address
+        assert dsce.COLLATERAL_PRICE_FEEDS(i) == feed.address
+        assert dsce.COLLATERAL_PRECISIONS(i) == 10 ** token.decimals()
+        assert dsce.token_to_price_feed(token.address) == feed.address
+        assert dsce.token_to_collateral_id(token.address) == i + 1
+
+    print(f"\n🎯 SUCCESS: Registry matches the deployment arguments")
+    print(f"{'='*70}\n")
+
+
+def test_deposit_marks_collateral_as_held(dsce_deposited, some_user, weth, wbtc):
+    """Test that depositing a token sets only that token's bit in the user's bitmap"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Deposit Marks Collateral as Held")
+    print(f"{'='*70}")
+
+    weth_bit = 1 << (dsce_deposited.token_to_collateral_id(weth.address) - 1)
+    bitmap = dsce_deposited.user_to_collateral_bitmap(some_user)
+
+    print(f"\n📊 User Bitmap:")
+    print(f"   Bitmap: {bitmap:#b}")
+    print(f"   WETH bit: {weth_bit:#b}")
+    print(f"   WBTC deposited: {dsce_deposited.get_collateral_balance_of_user(some_user, wbtc.address)}")
+
+    assert bitmap == weth_bit
+
+    print(f"\n🎯 SUCCESS: Only WETH is valued for this user")
+    print(f"{'='*70}\n")
+
+
+def test_full_redeem_clears_held_collateral(dsce_deposited, some_user, weth):
+    """Test that redeeming the whole balance clears the token's bit"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Full Redeem Clears Held Collateral")
+    print(f"{'='*70}")
+
+    print(f"\n💸 Redeeming all {COLLATERAL_AMOUNT / 10**18} WETH...")
+    with boa.env.prank(some_user):
+        dsce_deposited.redeem_collateral(weth.address, COLLATERAL_AMOUNT)
+
+    bitmap = dsce_deposited.user_to_collateral_bitmap(some_user)
+    _, collateral_value = dsce_deposited.get_account_information(some_user)
+
+    print(f"\n📊 After Redeem:")
+    print(f"   Bitmap: {bitmap:#b}")
+    print(f"   Collateral Value: ${collateral_value / 10**18:,.2f}")
+
+    assert bitmap == 0
+    assert collateral_value == 0
+
+    print(f"\n🎯 SUCCESS: Empty positions are skipped during valuation")
+    print(f"{'='*70}\n")
+
+
+def test_packed_balances_are_independent(dsce_minted, some_user, weth, wbtc):
+    """Test that two tokens sharing a storage word keep separate balances and debt"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Packed Balances Are Independent")
+    print(f"{'='*70}")
+
+    print(f"\n💰 Depositing {COLLATERAL_AMOUNT / 10**18} WBTC next to the WETH...")
+    with boa.env.prank(some_user):
+        wbtc.approve(dsce_minted, COLLATERAL_AMOUNT)
+        dsce_minted.deposit_collateral(wbtc.address, COLLATERAL_AMOUNT)
+        dsce_minted.redeem_collateral(weth.address, COLLATERAL_AMOUNT // 2)
+
+    weth_balance = dsce_minted.get_collateral_balance_of_user(some_user, weth.address)
+    wbtc_balance = dsce_minted.user_to_token_to_amount_deposited(some_user, wbtc.address)
+    debt = dsce_minted.user_to_dsc_minted(some_user)
+
+    print(f"\n📊 Position:")
+    print(f"   WETH: {weth_balance / 10**18}")
+    print(f"   WBTC: {wbtc_balance / 10**18}")
+    print(f"   Debt: {debt / 10**18} DSC")
+    print(f"   Bitmap: {dsce_minted.user_to_collateral_bitmap(some_user):#b}")
+
+    assert weth_balance == COLLATERAL_AMOUNT // 2
+    assert wbtc_balance == COLLATERAL_AMOUNT
+    assert debt == AMOUNT_TO_MINT
+    assert dsce_minted.user_to_collateral_bitmap(some_user) == 0b11
+
+    print(f"\n🎯 SUCCESS: Each token keeps its own half of the word")
+    print(f"{'='*70}\n")
+
+
+def test_reverts_if_balance_exceeds_uint128(dsce, some_user, weth):
+    """Test that a balance which does not fit in its packed half reverts"""
+
+    too_much = 2**128
+    with boa.env.prank(some_user):
+        weth.mint_amount(too_much)
+        weth.approve(dsce, too_much)
+        with boa.reverts("DSCEngine: Amount exceeds uint128"):
+            dsce.deposit_collateral(weth.address, too_much)
+
+    print(f"\n🎯 SUCCESS: Balances above uint128 are rejected")
+
+
 # ------------------------------------------------------------------
 #                          PRICE TESTS
 # ------------------------------------------------------------------
@@ -161,6 +299,60 @@ def test_get_usd_value(dsce, weth):
     assert expected_usd == actual_usd, f"USD value mismatch: expected ${expected_usd / 10**18:,.2f}, got ${actual_usd / 10**18:,.2f}"
     
 
+def test_get_usd_value_with_18_decimal_feed(dsc, weth, wbtc, btc_usd):
+    """Test that an 18-decimal feed is scaled like an 8-decimal one"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Get USD Value With 18-Decimal Feed")
+    print(f"{'='*70}")
+
+    eth_usd_18 = MockV3Aggregator.deploy(18, to_wei(2000, "ether"))
+    engine = dsc_engine.deploy([wbtc, weth], [btc_usd, eth_usd_18], dsc)
+
+    print(f"\n📊 Price Scales:")
+    print(f"   WBTC (8-decimal feed): {engine.COLLATERAL_PRICE_SCALES(0)}")
+    print(f"   WETH (18-decimal feed): {engine.COLLATERAL_PRICE_SCALES(1)}")
+
+    assert engine.COLLATERAL_PRICE_SCALES(0) == engine.ADDITIONAL_FEE_PRECISION()
+    assert engine.COLLATERAL_PRICE_SCALES(1) == 1
+    assert engine.get_usd_value(weth, to_wei(15, "ether")) == to_wei(30_000, "ether")
+    assert engine.get_token_amount_from_usd(weth, to_wei(100, "ether")) == to_wei(0.05, "ether")
+
+    print(f"\n🎯 SUCCESS: Both feeds value 1 ETH at $2,000")
+    print(f"{'='*70}\n")
+
+
+def test_reverts_if_price_is_stale(dsce_minted, weth, some_user):
+    """Test that a price older than ORACLE_TIMEOUT is rejected"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Reverts if Price is Stale")
+    print(f"{'='*70}")
+
+    timeout = dsce_minted.ORACLE_TIMEOUT()
+    print(f"\n⏰ Moving time forward by {timeout + 1} seconds...")
+    boa.env.time_travel(seconds=timeout + 1)
+
+    with boa.reverts("DSCEngine: Stale price"):
+        dsce_minted.get_usd_value(weth, COLLATERAL_AMOUNT)
+
+    with boa.env.prank(some_user):
+        with boa.reverts("DSCEngine: Stale price"):
+            dsce_minted.mint_dsc(1)
+
+    print(f"   ✅ Correctly reverted!")
+    print(f"{'='*70}\n")
+
+
+def test_reverts_if_price_is_from_the_future(dsce_minted, weth, eth_usd):
+    """Test that an update time ahead of the block is a stale price, not an underflow"""
+    round_id, answer, started_at, _, _ = eth_usd.latestRoundData()
+    eth_usd.updateRoundData(round_id + 1, answer, boa.env.timestamp + 60, started_at)
+
+    with boa.reverts("DSCEngine: Stale price"):
+        dsce_minted.get_usd_value(weth, COLLATERAL_AMOUNT)
+
+
 # ------------------------------------------------------------------
 #                       DEPOSIT COLLATERAL
 # ------------------------------------------------------------------
@@ -680,6 +872,70 @@ def test_can_mint_with_deposited_collateral(dsce_minted, dsc, some_user, weth, e
         f"DSC balance mismatch: expected {AMOUNT_TO_MINT / 10**18} DSC, got {user_balance / 10**18} DSC"
 
 
+# ------------------------------------------------------------------
+#                          PERMIT TESTS
+# ------------------------------------------------------------------
+def test_can_deposit_and_mint_with_permit(dsce, dsc, weth):
+    """Test that a signed permit replaces the separate approve transaction"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Can Deposit and Mint With Permit")
+    print(f"{'='*70}")
+
+    account = new_permit_user(weth)
+    deadline = boa.env.timestamp + 3600
+    v, r, s = sign_permit(weth, account, dsce.address, COLLATERAL_AMOUNT, deadline)
+
+    print(f"\n✍️  Depositing {COLLATERAL_AMOUNT / 10**18} WETH and minting {AMOUNT_TO_MINT / 10**18} DSC with a permit...")
+    with boa.env.prank(account.address):
+        dsce.deposit_and_mint_with_permit(
+            weth.address, COLLATERAL_AMOUNT, AMOUNT_TO_MINT, deadline, v, r, s
+        )
+
+    print(f"\n📊 After Deposit:")
+    print(f"   Collateral: {dsce.get_collateral_balance_of_user(account.address, weth.address) / 10**18} WETH")
+    print(f"   DSC Balance: {dsc.balanceOf(account.address) / 10**18}")
+
+    assert dsce.get_collateral_balance_of_user(account.address, weth.address) == COLLATERAL_AMOUNT
+    assert dsc.balanceOf(account.address) == AMOUNT_TO_MINT
+    assert weth.allowance(account.address, dsce.address) == 0
+
+    print(f"\n🎯 SUCCESS: Approval, deposit and mint in one transaction")
+    print(f"{'='*70}\n")
+
+
+def test_deposit_with_permit_survives_front_run(dsce, weth, liquidator):
+    """Test that a permit already submitted by someone else does not block the deposit"""
+
+    account = new_permit_user(weth)
+    deadline = boa.env.timestamp + 3600
+    v, r, s = sign_permit(weth, account, dsce.address, COLLATERAL_AMOUNT, deadline)
+
+    # Someone copies the signature from the mempool and uses it first
+    with boa.env.prank(liquidator):
+        weth.permit(account.address, dsce.address, COLLATERAL_AMOUNT, deadline, v, r, s)
+
+    with boa.env.prank(account.address):
+        dsce.deposit_with_permit(weth.address, COLLATERAL_AMOUNT, deadline, v, r, s)
+
+    assert dsce.get_collateral_balance_of_user(account.address, weth.address) == COLLATERAL_AMOUNT
+    print(f"\n🎯 SUCCESS: Front-run permit still leads to a deposit")
+
+
+def test_reverts_if_permit_is_invalid(dsce, weth):
+    """Test that a permit signed by someone else is rejected"""
+
+    account = new_permit_user(weth)
+    deadline = boa.env.timestamp + 3600
+    v, r, s = sign_permit(weth, Account.create(), dsce.address, COLLATERAL_AMOUNT, deadline)
+
+    with boa.env.prank(account.address):
+        with boa.reverts("DSCEngine: Permit failed"):
+            dsce.deposit_with_permit(weth.address, COLLATERAL_AMOUNT, deadline, v, r, s)
+
+    print(f"\n🎯 SUCCESS: Invalid permit signatures are rejected")
+
+
 # ------------------------------------------------------------------
 #                          MINT DSC TESTS
 # ------------------------------------------------------------------
@@ -853,6 +1109,37 @@ def test_can_burn_dsc(dsce_minted, dsc, some_user):
     print(f"{'='*70}\n")
 
 
+def test_can_burn_dsc_and_liquidate_without_approval(dsce_minted, dsc, weth, eth_usd, some_user, liquidator):
+    """Test that burning and liquidating need no DSC approval of the engine"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Can Burn DSC and Liquidate Without Approval")
+    print(f"{'='*70}")
+
+    with boa.env.prank(liquidator):
+        weth.mint_amount(COLLATERAL_TO_COVER * 2)
+        weth.approve(dsce_minted, COLLATERAL_TO_COVER * 2)
+        dsce_minted.deposit_and_mint(weth, COLLATERAL_TO_COVER * 2, AMOUNT_TO_MINT)
+
+    print(f"\n🔥 Burning {AMOUNT_TO_MINT / 10**18 / 2} DSC without approve...")
+    with boa.env.prank(some_user):
+        dsce_minted.burn_dsc(AMOUNT_TO_MINT // 2)
+    assert dsce_minted.user_to_dsc_minted(some_user) == AMOUNT_TO_MINT // 2
+
+    print(f"\n💥 Liquidating the rest without approve...")
+    eth_usd.updateAnswer(8 * 10**8)
+    with boa.env.prank(liquidator):
+        dsce_minted.liquidate(weth, some_user, AMOUNT_TO_MINT // 2)
+
+    print(f"   Liquidator DSC: {dsc.balanceOf(liquidator) / 10**18}")
+    assert dsce_minted.user_to_dsc_minted(some_user) == 0
+    assert dsc.balanceOf(liquidator) == AMOUNT_TO_MINT // 2
+    assert dsc.allowance(liquidator, dsce_minted.address) == 0
+
+    print(f"\n🎯 SUCCESS: No approve transaction needed to repay debt")
+    print(f"{'='*70}\n")
+
+
 # ------------------------------------------------------------------
 #                     REDEEM COLLATERAL TESTS
 # ------------------------------------------------------------------
@@ -1005,6 +1292,64 @@ def test_health_factor_can_go_below_one(dsce_minted, eth_usd, some_user):
     print(f"{'='*70}\n")
 
 
+def test_health_factor_skips_oracle_without_debt(dsce_deposited, eth_usd, some_user, weth):
+    """Test that a debt-free user is valued without reading the price feed"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Health Factor Skips Oracle Without Debt")
+    print(f"{'='*70}")
+
+    # A negative answer cannot be converted to uint256, so any oracle read would revert
+    print(f"\n📉 Setting ETH/USD feed to an invalid answer (-1)...")
+    eth_usd.updateAnswer(-1)
+
+    health_factor = dsce_deposited.health_factor(some_user)
+    print(f"\n🏥 Health Factor: {health_factor}")
+    assert health_factor == 2**256 - 1
+
+    print(f"\n💸 Redeeming {COLLATERAL_AMOUNT / 10**18} WETH with no debt...")
+    with boa.env.prank(some_user):
+        dsce_deposited.redeem_collateral(weth.address, COLLATERAL_AMOUNT)
+
+    assert dsce_deposited.get_collateral_balance_of_user(some_user, weth.address) == 0
+
+    print(f"\n🎯 SUCCESS: No oracle read for a debt-free position")
+    print(f"{'='*70}\n")
+
+
+def test_get_accounts_information_matches_single_views(dsce_minted, some_user, liquidator, weth):
+    """Test that the batch view reports the same numbers as the per-user views"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Get Accounts Information Matches Single Views")
+    print(f"{'='*70}")
+
+    users = [some_user, liquidator, some_user]
+    accounts = dsce_minted.get_accounts_information(users)
+    weth_index = dsce_minted.token_to_collateral_id(weth.address) - 1
+
+    for user, account in zip(users, accounts):
+        total_dsc_minted, collateral_value_usd = dsce_minted.get_account_information(user)
+        print(f"\n📊 {user}:")
+        print(f"   Debt: {account.total_dsc_minted / 10**18} DSC")
+        print(f"   WETH: {account.collateral_balances[weth_index] / 10**18}")
+        print(f"   Collateral Value: ${account.collateral_value_usd / 10**18:,.2f}")
+        print(f"   Health Factor: {account.health_factor}")
+
+        assert account.total_dsc_minted == total_dsc_minted
+        assert account.collateral_value_usd == collateral_value_usd
+        assert account.health_factor == dsce_minted.health_factor(user)
+        assert account.collateral_balances[weth_index] == (
+            dsce_minted.get_collateral_balance_of_user(user, weth.address)
+        )
+
+    assert accounts[0].collateral_balances[weth_index] == COLLATERAL_AMOUNT
+    assert accounts[1].health_factor == 2**256 - 1
+
+    print(f"\n🎯 SUCCESS: One call returns every user's position")
+    print(f"{'='*70}\n")
+
+
 # ------------------------------------------------------------------
 #                     LIQUIDATION TESTS
 # ------------------------------------------------------------------
@@ -1110,6 +1455,128 @@ def test_liquidation_payout_is_correct(
     print(f"{'='*70}\n")
 
 
+def _open_underwater_positions(dsce, weth, eth_usd, users):
+    """Give each user a 10 WETH / 100 DSC position, then drop ETH to $18"""
+    for user in users:
+        with boa.env.prank(user):
+            weth.mint_amount(COLLATERAL_AMOUNT)
+            weth.approve(dsce, COLLATERAL_AMOUNT)
+            dsce.deposit_and_mint(weth, COLLATERAL_AMOUNT, AMOUNT_TO_MINT)
+    eth_usd.updateAnswer(18 * 10**8)
+
+
+def _fund_liquidator(dsce, dsc, weth, liquidator, positions):
+    """Let the liquidator mint enough DSC to cover `positions` debts"""
+    collateral = COLLATERAL_TO_COVER * positions
+    debt = AMOUNT_TO_MINT * positions
+    with boa.env.prank(liquidator):
+        weth.mint_amount(collateral)
+        weth.approve(dsce, collateral)
+        dsce.deposit_and_mint(weth, collateral, debt)
+        dsc.approve(dsce, debt)
+
+
+def test_liquidate_many_liquidates_every_user(dsce, dsc, weth, eth_usd, some_user, liquidator):
+    """Test that a batch liquidation covers every user like single liquidations would"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Liquidate Many Liquidates Every User")
+    print(f"{'='*70}")
+
+    users = [some_user, boa.env.generate_address()]
+    _open_underwater_positions(dsce, weth, eth_usd, users)
+    _fund_liquidator(dsce, dsc, weth, liquidator, len(users))
+
+    expected_per_user = dsce.get_token_amount_from_usd(weth.address, AMOUNT_TO_MINT)
+    expected_per_user += expected_per_user // dsce.LIQUIDATION_BONUS()
+    starting_weth = weth.balanceOf(liquidator)
+    starting_dsc = dsc.balanceOf(liquidator)
+
+    print(f"\n🦈 Liquidating {len(users)} users in one call...")
+    with boa.env.prank(liquidator):
+        liquidated = dsce.liquidate_many(
+            weth.address, users, [AMOUNT_TO_MINT] * len(users), False
+        )
+
+    print(f"   Liquidated: {liquidated}")
+    print(f"   WETH gained: {(weth.balanceOf(liquidator) - starting_weth) / 10**18:.18f}")
+
+    assert liquidated == len(users)
+    for user in users:
+        assert dsce.user_to_dsc_minted(user) == 0
+    assert weth.balanceOf(liquidator) - starting_weth == expected_per_user * len(users)
+    assert starting_dsc - dsc.balanceOf(liquidator) == AMOUNT_TO_MINT * len(users)
+
+    print(f"\n🎯 SUCCESS: Every position was liquidated")
+    print(f"{'='*70}\n")
+
+
+def test_liquidate_many_skips_healthy_users(dsce, dsc, weth, eth_usd, some_user, liquidator):
+    """Test that healthy users are left untouched when skip_healthy is set"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Liquidate Many Skips Healthy Users")
+    print(f"{'='*70}")
+
+    healthy_user = boa.env.generate_address()
+    with boa.env.prank(healthy_user):
+        weth.mint_amount(COLLATERAL_AMOUNT * 10)
+        weth.approve(dsce, COLLATERAL_AMOUNT * 10)
+        dsce.deposit_and_mint(weth, COLLATERAL_AMOUNT * 10, AMOUNT_TO_MINT)
+    _open_underwater_positions(dsce, weth, eth_usd, [some_user])
+    _fund_liquidator(dsce, dsc, weth, liquidator, 1)
+
+    print(f"\n🏥 Health Factors:")
+    print(f"   Healthy user: {dsce.health_factor(healthy_user) / 10**18:.4f}")
+    print(f"   Underwater user: {dsce.health_factor(some_user) / 10**18:.4f}")
+
+    with boa.env.prank(liquidator):
+        print(f"\n❌ Without skip_healthy: should REVERT")
+        with boa.reverts("DSCEngine: Health factor is good"):
+            dsce.liquidate_many(
+                weth.address, [healthy_user, some_user], [AMOUNT_TO_MINT, AMOUNT_TO_MINT], False
+            )
+
+        print(f"\n✅ With skip_healthy: only the underwater user is liquidated")
+        liquidated = dsce.liquidate_many(
+            weth.address, [healthy_user, some_user], [AMOUNT_TO_MINT, AMOUNT_TO_MINT], True
+        )
+
+    assert liquidated == 1
+    assert dsce.user_to_dsc_minted(healthy_user) == AMOUNT_TO_MINT
+    assert dsce.user_to_dsc_minted(some_user) == 0
+
+    print(f"\n🎯 SUCCESS: Healthy positions were skipped")
+    print(f"{'='*70}\n")
+
+
+def test_liquidate_many_ignores_stale_feed_of_unheld_token(dsce, dsc, weth, wbtc, eth_usd, btc_usd, some_user, liquidator):
+    """Test that a stale feed of a collateral no listed user holds does not block a batch"""
+    users = [some_user, boa.env.generate_address()]
+    _open_underwater_positions(dsce, weth, eth_usd, users)
+    _fund_liquidator(dsce, dsc, weth, liquidator, len(users))
+
+    # Only the ETH feed is refreshed: the BTC feed is now stale
+    boa.env.time_travel(seconds=dsce.ORACLE_TIMEOUT() + 1)
+    eth_usd.updateAnswer(18 * 10**8)
+    with boa.reverts("DSCEngine: Stale price"):
+        dsce.get_usd_value(wbtc, 1)
+
+    with boa.env.prank(liquidator):
+        liquidated = dsce.liquidate_many(
+            weth.address, users, [AMOUNT_TO_MINT] * len(users), False
+        )
+    assert liquidated == len(users)
+    assert _calls_to(dsce._computation, btc_usd) == 0
+
+
+def test_liquidate_many_reverts_if_lengths_differ(dsce, weth, some_user):
+    """Test that users and debts must have the same length"""
+
+    with boa.reverts("DSCEngine: Users and debts lengths differ"):
+        dsce.liquidate_many(weth.address, [some_user], [], True)
+
+
 def test_cant_redeem_if_breaks_health_factor(dsce_minted, weth, some_user):
     """Test that redemption fails if it would break health factor"""
     
@@ -1142,3 +1609,411 @@ def test_cant_redeem_if_breaks_health_factor(dsce_minted, weth, some_user):
     print(f"{'='*70}\n")
 
 
+
+
+# ------------------------------------------------------------------
+#                          EVENT TESTS
+# ------------------------------------------------------------------
+def _engine_logs(dsce):
+    """Events logged by the engine itself in its last call, without token events"""
+    return [log for log in dsce.get_logs() if log.address == dsce.address]
+
+
+def test_liquidation_logs_real_from_and_to(dsce_minted, dsc, weth, eth_usd, some_user, liquidator):
+    """Test that seized collateral is logged as leaving the user, not the liquidator"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Liquidation Logs Real From and To")
+    print(f"{'='*70}")
+
+    _fund_liquidator(dsce_minted, dsc, weth, liquidator, 1)
+    eth_usd.updateAnswer(18 * 10**8)
+
+    with boa.env.prank(liquidator):
+        dsce_minted.liquidate(weth.address, some_user, AMOUNT_TO_MINT)
+    redeem, liquidation = _engine_logs(dsce_minted)
+
+    print(f"\n📜 Logs:")
+    print(f"   {redeem}")
+    print(f"   {liquidation}")
+
+    assert type(redeem).__name__ == "CollateralRedeem"
+    assert redeem.redeemed_from == some_user
+    assert redeem.redeemed_to == liquidator
+    assert type(liquidation).__name__ == "Liquidation"
+    assert liquidation.user == some_user
+    assert liquidation.liquidator == liquidator
+    assert liquidation.debt_covered == AMOUNT_TO_MINT
+    assert liquidation.collateral_seized == redeem.amount
+
+    print(f"\n🎯 SUCCESS: Liquidation is attributed to the liquidated user")
+    print(f"{'='*70}\n")
+
+
+def test_positions_can_be_rebuilt_from_logs(dsce, dsc, weth, wbtc, eth_usd, some_user, liquidator):
+    """Test that replaying the engine's logs gives the same positions as storage"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Positions Can Be Rebuilt From Logs")
+    print(f"{'='*70}")
+
+    logs = []
+    with boa.env.prank(some_user):
+        weth.approve(dsce, COLLATERAL_AMOUNT)
+        dsce.deposit_and_mint(weth.address, COLLATERAL_AMOUNT, AMOUNT_TO_MINT)
+        logs += _engine_logs(dsce)
+        wbtc.approve(dsce, COLLATERAL_AMOUNT)
+        dsce.deposit_collateral(wbtc.address, COLLATERAL_AMOUNT)
+        logs += _engine_logs(dsce)
+        dsc.approve(dsce, AMOUNT_TO_MINT)
+        dsce.redeem_for_dsc(wbtc.address, COLLATERAL_AMOUNT, AMOUNT_TO_MINT // 4)
+        logs += _engine_logs(dsce)
+
+    _fund_liquidator(dsce, dsc, weth, liquidator, 1)
+    logs += _engine_logs(dsce)
+    eth_usd.updateAnswer(14 * 10**8)
+    with boa.env.prank(liquidator):
+        dsce.liquidate(weth.address, some_user, AMOUNT_TO_MINT // 2)
+        logs += _engine_logs(dsce)
+
+    debts, balances = {}, {}
+    for log in logs:
+        event = type(log).__name__
+        if event == "CollateralDeposited":
+            balances[(log.user, log.token)] = balances.get((log.user, log.token), 0) + log.amount
+        elif event == "CollateralRedeem":
+            balances[(log.redeemed_from, log.token)] -= log.amount
+        elif event == "DscMinted":
+            debts[log.user] = debts.get(log.user, 0) + log.amount
+        elif event == "DscBurned":
+            debts[log.on_behalf_of] -= log.amount
+        elif event == "Liquidation":
+            debts[log.user] -= log.debt_covered
+
+    print(f"\n📜 Replayed {len(logs)} logs:")
+    for user in (some_user, liquidator):
+        print(f"   {user}: debt {debts[user] / 10**18} DSC")
+        assert debts[user] == dsce.user_to_dsc_minted(user)
+        for token in (weth, wbtc):
+            assert balances.get((user, token.address), 0) == (
+                dsce.get_collateral_balance_of_user(user, token.address)
+            )
+
+    print(f"\n🎯 SUCCESS: Logs alone reproduce every position")
+    print(f"{'='*70}\n")
+
+
+# ------------------------------------------------------------------
+#                       PROTOCOL STATE TESTS
+# ------------------------------------------------------------------
+def _assert_counters_match_balances(dsce, dsc, tokens):
+    for token in tokens:
+        assert dsce.total_deposited(token) == token.balanceOf(dsce)
+    assert dsce.total_debt() == dsc.totalSupply()
+
+
+def test_protocol_counters_follow_every_position_change(
+    dsce_liquidated, dsc, weth, wbtc, eth_usd, some_user, liquidator
+):
+    """Test that the aggregate counters equal balances and supply after deposits, mints, burns, redeems and a liquidation"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Protocol Counters Follow Every Position Change")
+    print(f"{'='*70}")
+
+    dsce = dsce_liquidated
+    _assert_counters_match_balances(dsce, dsc, [weth, wbtc])
+    print(f"\n🔨 After liquidation: {dsce.total_debt() / 10**18} DSC debt, "
+          f"{dsce.total_deposited(weth) / 10**18} WETH deposited")
+
+    with boa.env.prank(liquidator):
+        wbtc.approve(dsce, COLLATERAL_AMOUNT)
+        dsce.deposit_and_mint(wbtc, COLLATERAL_AMOUNT, AMOUNT_TO_MINT)
+        dsce.redeem_for_dsc(weth, COLLATERAL_AMOUNT, AMOUNT_TO_MINT // 2)
+        dsce.burn_dsc(AMOUNT_TO_MINT // 4)
+    _assert_counters_match_balances(dsce, dsc, [weth, wbtc])
+
+    # One call values the counters like the fuzz invariant values the balances
+    collateral_value, total_debt, collateral_ratio = dsce.get_protocol_state()
+    expected_value = (
+        dsce.get_usd_value(weth, weth.balanceOf(dsce)) + dsce.get_usd_value(wbtc, wbtc.balanceOf(dsce))
+    )
+    print(f"\n📊 Collateral ${collateral_value / 10**18:,.2f}, debt {total_debt / 10**18:,.2f} DSC, "
+          f"ratio {collateral_ratio / 10**18:.4f}")
+    assert collateral_value == expected_value
+    assert total_debt == dsc.totalSupply()
+    assert collateral_ratio == collateral_value * 10**18 // total_debt
+
+    print(f"\n🎯 SUCCESS: Counters match balances and supply")
+    print(f"{'='*70}\n")
+
+
+def test_protocol_state_without_debt(dsce_deposited, weth, wbtc):
+    """Test that a protocol without debt reports the maximum collateral ratio"""
+    collateral_value, total_debt, collateral_ratio = dsce_deposited.get_protocol_state()
+    assert collateral_value == dsce_deposited.get_usd_value(weth, COLLATERAL_AMOUNT)
+    assert total_debt == 0
+    assert collateral_ratio == 2**256 - 1
+    assert dsce_deposited.total_deposited(wbtc) == 0
+
+
+# ------------------------------------------------------------------
+#                        PRICE CACHE TESTS
+# ------------------------------------------------------------------
+def _calls_to(computation, contract) -> int:
+    """Messages sent to `contract` anywhere in the call tree of `computation`"""
+    calls = int(computation.msg.to == contract.address.canonical_address)
+    return calls + sum(_calls_to(child, contract) for child in computation.children)
+
+
+def test_price_cache_reads_each_feed_once_per_transaction(dsce, dsc, weth, eth_usd):
+    """Test that a batch of operations in one transaction calls the price feed only once"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Price Cache Reads Each Feed Once Per Transaction")
+    print(f"{'='*70}")
+
+    router = mock_engine_router.deploy(dsce)
+    with boa.env.prank(router.address):
+        weth.mint_amount(COLLATERAL_AMOUNT)
+
+    router.deposit_and_mint_many(weth, COLLATERAL_AMOUNT // 4, AMOUNT_TO_MINT, 4)
+    feed_calls = _calls_to(router._computation, eth_usd)
+    print(f"\n📦 4 deposit_and_mint in one transaction: {feed_calls} call to the ETH feed")
+    assert feed_calls == 1
+    assert dsce.user_to_dsc_minted(router) == 4 * AMOUNT_TO_MINT
+    assert dsc.balanceOf(router) == 4 * AMOUNT_TO_MINT
+
+    # The cache dies with the transaction: the next one sees the new price
+    eth_usd.updateAnswer(50 * 10**8)
+    assert dsce.health_factor(router) < MIN_HEALTH_FACTOR
+    with boa.reverts("DSCEngine: Health factor broken"):
+        with boa.env.prank(router.address):
+            dsce.mint_dsc(1)
+
+    print(f"\n🎯 SUCCESS: One feed call per transaction, none carried over")
+    print(f"{'='*70}\n")
+
+
+# ------------------------------------------------------------------
+#                       POSITION LIMIT TESTS
+# ------------------------------------------------------------------
+def test_get_max_mintable_is_exact(dsce_minted, eth_usd, some_user):
+    """Test that the max mintable amount can be minted and one wei more cannot"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Get Max Mintable Is Exact")
+    print(f"{'='*70}")
+
+    # A price with odd digits, so every division of the health factor rounds
+    eth_usd.updateAnswer(1999_12345678)
+    max_mintable = dsce_minted.get_max_mintable(some_user)
+    print(f"\n📊 Max mintable: {max_mintable / 10**18:,.6f} DSC")
+
+    with boa.env.prank(some_user):
+        with boa.reverts("DSCEngine: Health factor broken"):
+            dsce_minted.mint_dsc(max_mintable + 1)
+        dsce_minted.mint_dsc(max_mintable)
+
+    assert dsce_minted.health_factor(some_user) >= MIN_HEALTH_FACTOR
+    assert dsce_minted.get_max_mintable(some_user) == 0
+
+    # Below the minimum nothing can be minted
+    eth_usd.updateAnswer(1000_00000000)
+    assert dsce_minted.health_factor(some_user) < MIN_HEALTH_FACTOR
+    assert dsce_minted.get_max_mintable(some_user) == 0
+
+    print(f"\n🎯 SUCCESS: Max mintable is the exact limit")
+    print(f"{'='*70}\n")
+
+
+def test_get_max_redeemable_is_exact(dsce, weth, wbtc, eth_usd, btc_usd, some_user):
+    """Test that the max redeemable amount of each collateral can be redeemed and one unit more cannot"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Get Max Redeemable Is Exact")
+    print(f"{'='*70}")
+
+    eth_usd.updateAnswer(1999_12345678)
+    btc_usd.updateAnswer(30001_98765432)
+    with boa.env.prank(some_user):
+        weth.approve(dsce, COLLATERAL_AMOUNT)
+        wbtc.approve(dsce, COLLATERAL_AMOUNT)
+        dsce.deposit_collateral(weth, COLLATERAL_AMOUNT)
+        dsce.deposit_collateral(wbtc, COLLATERAL_AMOUNT // 20)
+        dsce.mint_dsc(dsce.get_max_mintable(some_user) * 2 // 3 + 12345)
+
+    for token in (weth, wbtc):
+        balance = dsce.get_collateral_balance_of_user(some_user, token)
+        max_redeemable = dsce.get_max_redeemable(some_user, token)
+        print(f"\n📊 {token.symbol()}: {max_redeemable} of {balance} redeemable")
+        assert 0 < max_redeemable < balance
+
+        with boa.env.anchor(), boa.env.prank(some_user):
+            with boa.reverts("DSCEngine: Health factor broken"):
+                dsce.redeem_collateral(token, max_redeemable + 1)
+            dsce.redeem_collateral(token, max_redeemable)
+            assert dsce.health_factor(some_user) >= MIN_HEALTH_FACTOR
+            assert dsce.get_max_redeemable(some_user, token) == 0
+
+    print(f"\n🎯 SUCCESS: Max redeemable is the exact limit for each collateral")
+    print(f"{'='*70}\n")
+
+
+def test_get_max_redeemable_without_debt_or_health(dsce_deposited, weth, wbtc, eth_usd, some_user):
+    """Test the max redeemable amount of a debt-free position and of a broken one"""
+    assert dsce_deposited.get_max_redeemable(some_user, weth) == COLLATERAL_AMOUNT
+    assert dsce_deposited.get_max_redeemable(some_user, wbtc) == 0
+
+    with boa.env.prank(some_user):
+        dsce_deposited.mint_dsc(AMOUNT_TO_MINT)
+    eth_usd.updateAnswer(18 * 10**8)
+    assert dsce_deposited.health_factor(some_user) < MIN_HEALTH_FACTOR
+    assert dsce_deposited.get_max_redeemable(some_user, weth) == 0
+    with boa.reverts("DSCEngine: Token not supported"):
+        dsce_deposited.get_max_redeemable(some_user, dsce_deposited.address)
+
+
+# ------------------------------------------------------------------
+#                     MULTI-COLLATERAL TESTS
+# ------------------------------------------------------------------
+def test_multi_collateral_round_trip_checks_health_once(dsce, dsc, weth, wbtc, eth_usd, btc_usd, some_user):
+    """Test that deposit_multi_and_mint and burn_and_redeem_multi move every collateral in one transaction"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Multi-Collateral Round Trip Checks Health Once")
+    print(f"{'='*70}")
+
+    tokens = [weth, wbtc]
+    amounts = [COLLATERAL_AMOUNT, COLLATERAL_AMOUNT // 10]
+    with boa.env.prank(some_user):
+        weth.approve(dsce, amounts[0])
+        wbtc.approve(dsce, amounts[1])
+        dsce.deposit_multi_and_mint(tokens, amounts, AMOUNT_TO_MINT)
+
+    # One health factor evaluation: each feed is read once
+    print(f"\n📦 Deposit WETH + WBTC & mint: "
+          f"{_calls_to(dsce._computation, eth_usd)} ETH feed call, {_calls_to(dsce._computation, btc_usd)} BTC feed call")
+    assert _calls_to(dsce._computation, eth_usd) == 1
+    assert _calls_to(dsce._computation, btc_usd) == 1
+    assert dsce.user_to_dsc_minted(some_user) == AMOUNT_TO_MINT
+    assert dsce.user_to_collateral_bitmap(some_user) == 0b11
+    for token, amount in zip(tokens, amounts):
+        assert dsce.get_collateral_balance_of_user(some_user, token) == amount
+
+    with boa.env.prank(some_user):
+        dsce.burn_and_redeem_multi(tokens, amounts, AMOUNT_TO_MINT)
+
+    # Without debt left, the health check needs no price at all
+    assert _calls_to(dsce._computation, eth_usd) == 0
+    assert dsce.user_to_dsc_minted(some_user) == 0
+    assert dsce.user_to_collateral_bitmap(some_user) == 0
+    assert dsc.balanceOf(some_user) == 0
+    assert weth.balanceOf(dsce) == 0 and wbtc.balanceOf(dsce) == 0
+
+    print(f"\n🎯 SUCCESS: Both collaterals moved, one health check per transaction")
+    print(f"{'='*70}\n")
+
+
+def test_multi_collateral_reverts(dsce_minted, weth, wbtc, some_user):
+    """Test that the multi-collateral functions check lengths and the final health factor"""
+    with boa.env.prank(some_user):
+        with boa.reverts("DSCEngine: Tokens and amounts lengths differ"):
+            dsce_minted.deposit_multi_and_mint([weth, wbtc], [COLLATERAL_AMOUNT], 0)
+        with boa.reverts("DSCEngine: Tokens and amounts lengths differ"):
+            dsce_minted.burn_and_redeem_multi([weth], [], 0)
+        with boa.reverts("DSCEngine: Health factor broken"):
+            dsce_minted.burn_and_redeem_multi([weth], [COLLATERAL_AMOUNT], AMOUNT_TO_MINT // 2)
+        # Redeeming exactly what the views allow still passes
+        dsce_minted.burn_and_redeem_multi(
+            [weth], [dsce_minted.get_max_redeemable(some_user, weth)], 0
+        )
+
+
+# ------------------------------------------------------------------
+#                           EXECUTE TESTS
+# ------------------------------------------------------------------
+# Values of the Action flag
+DEPOSIT, REDEEM, MINT, BURN = 1, 2, 4, 8
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+
+def test_execute_checks_only_the_final_health_factor(dsce_minted, dsc, weth, wbtc, eth_usd, btc_usd, some_user):
+    """Test that execute may pass through unhealthy states as long as the final one is healthy"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Execute Checks Only The Final Health Factor")
+    print(f"{'='*70}")
+
+    # Swap the WETH collateral for WBTC and double the debt: after the redeem,
+    # the position has debt and no collateral at all
+    wbtc_amount = COLLATERAL_AMOUNT // 10
+    operations = [
+        (REDEEM, weth.address, COLLATERAL_AMOUNT),
+        (DEPOSIT, wbtc.address, wbtc_amount),
+        (MINT, ZERO_ADDRESS, 2 * AMOUNT_TO_MINT),
+        (BURN, ZERO_ADDRESS, AMOUNT_TO_MINT),
+    ]
+    with boa.env.prank(some_user):
+        wbtc.approve(dsce_minted, wbtc_amount)
+        dsce_minted.execute(operations)
+
+    print(f"\n📦 4 operations: {_calls_to(dsce_minted._computation, btc_usd)} call to the BTC feed, "
+          f"{_calls_to(dsce_minted._computation, eth_usd)} to the ETH feed")
+    assert _calls_to(dsce_minted._computation, btc_usd) == 1
+    assert _calls_to(dsce_minted._computation, eth_usd) == 0
+    assert dsce_minted.user_to_collateral_bitmap(some_user) == 1 << (dsce_minted.token_to_collateral_id(wbtc) - 1)
+    assert dsce_minted.get_collateral_balance_of_user(some_user, wbtc) == wbtc_amount
+    assert dsce_minted.user_to_dsc_minted(some_user) == 2 * AMOUNT_TO_MINT
+    assert dsc.balanceOf(some_user) == 2 * AMOUNT_TO_MINT
+    assert dsce_minted.health_factor(some_user) >= MIN_HEALTH_FACTOR
+
+    print(f"\n🎯 SUCCESS: Collateral swapped and debt raised in one transaction")
+    print(f"{'='*70}\n")
+
+
+def test_execute_reverts(dsce_minted, weth, some_user):
+    """Test that execute reverts on a broken final health factor and on unknown actions"""
+    with boa.env.prank(some_user):
+        with boa.reverts("DSCEngine: Health factor broken"):
+            dsce_minted.execute([
+                (MINT, ZERO_ADDRESS, AMOUNT_TO_MINT),
+                (REDEEM, weth.address, COLLATERAL_AMOUNT),
+            ])
+        for action in (0, DEPOSIT | REDEEM):
+            with boa.reverts("DSCEngine: Unknown action"):
+                dsce_minted.execute([(action, weth.address, 1)])
+        # An empty batch only checks the health factor
+        dsce_minted.execute([])
+
+
+# ------------------------------------------------------------------
+#                      FIXTURE ISOLATION TESTS
+# ------------------------------------------------------------------
+# What the first test wrote, checked by the test that runs after it
+_WRITTEN = {}
+
+
+def test_fixture_state_can_be_written(dsce_minted, dsc, weth, eth_usd, some_user):
+    """Write storage, balances, a price, the clock and a deployment for the next test to miss"""
+    with boa.env.prank(some_user):
+        dsce_minted.redeem_collateral(weth, COLLATERAL_AMOUNT // 2)
+    eth_usd.updateAnswer(1_000 * 10**8)
+    boa.env.time_travel(seconds=60)
+    _WRITTEN.update(
+        token=mock_token.deploy().address,
+        timestamp=boa.env.timestamp,
+        collateral=dsce_minted.get_collateral_balance_of_user(some_user, weth),
+    )
+
+
+def test_fixture_state_does_not_leak_into_the_next_test(dsce_minted, weth, eth_usd, some_user):
+    """Test that the writes of the previous test are gone from a fresh copy of the snapshot"""
+    assert _WRITTEN, "runs after test_fixture_state_can_be_written"
+    assert dsce_minted.get_collateral_balance_of_user(some_user, weth) == COLLATERAL_AMOUNT
+    assert _WRITTEN["collateral"] == COLLATERAL_AMOUNT // 2
+    assert eth_usd.latestAnswer() == 2_000 * 10**8
+    assert boa.env.timestamp < _WRITTEN["timestamp"]
+    assert boa.env.get_code(_WRITTEN["token"]) == b""
+    # The address is free again: the same deployment lands on it
+    assert mock_token.deploy().address == _WRITTEN["token"]
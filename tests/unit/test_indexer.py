@@ -0,0 +1,120 @@
+import boa
+import pytest
+
+from script.indexer import PositionIndexer, PyevmLogSource, RpcLogSource, moccasin_main
+from tests.conftest import COLLATERAL_AMOUNT, AMOUNT_TO_MINT, COLLATERAL_TO_COVER
+
+
+@pytest.fixture(scope="function")
+def log_source(dsce):
+    source = PyevmLogSource(dsce)
+    yield source
+    source.close()
+
+
+def _assert_book_matches_storage(indexer, dsce, users, tokens):
+    accounts = dsce.get_accounts_information(users)
+    for user, account in zip(users, accounts):
+        assert indexer.debt_of(user) == account.total_dsc_minted
+        for token in tokens:
+            assert indexer.collateral_of(user, token) == (
+                dsce.get_collateral_balance_of_user(user, token)
+            )
+
+
+# ------------------------------------------------------------------
+#                          INDEXER TESTS
+# ------------------------------------------------------------------
+def test_indexer_rebuilds_positions_from_logs(
+    log_source, dsce, weth, wbtc, eth_usd, some_user, liquidator, tmp_path
+):
+    """Test that the indexed book equals storage after every kind of position change"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Indexer Rebuilds Positions From Logs")
+    print(f"{'='*70}")
+
+    with boa.env.prank(some_user):
+        weth.approve(dsce, COLLATERAL_AMOUNT)
+        wbtc.approve(dsce, COLLATERAL_AMOUNT)
+        dsce.deposit_and_mint(weth, COLLATERAL_AMOUNT, AMOUNT_TO_MINT)
+        dsce.deposit_collateral(wbtc, COLLATERAL_AMOUNT)
+        dsce.redeem_for_dsc(wbtc, COLLATERAL_AMOUNT, AMOUNT_TO_MINT // 4)
+
+    with boa.env.prank(liquidator):
+        weth.mint_amount(COLLATERAL_TO_COVER)
+        weth.approve(dsce, COLLATERAL_TO_COVER)
+        dsce.deposit_and_mint(weth, COLLATERAL_TO_COVER, AMOUNT_TO_MINT)
+    eth_usd.updateAnswer(14 * 10**8)
+    with boa.env.prank(liquidator):
+        dsce.liquidate(weth, some_user, AMOUNT_TO_MINT // 2)
+
+    indexer = PositionIndexer(dsce, log_source, tmp_path / "checkpoint.json")
+    applied = indexer.sync()
+
+    print(f"\n📜 Applied {applied} logs for {len(indexer.positions)} positions")
+    for user in (some_user, liquidator):
+        print(f"   {user}: debt {indexer.debt_of(user) / 10**18} DSC, "
+              f"{indexer.collateral_of(user, weth) / 10**18} WETH")
+
+    _assert_book_matches_storage(indexer, dsce, [some_user, liquidator], [weth, wbtc])
+    assert applied == 9
+
+    print(f"\n🎯 SUCCESS: Book matches storage without a single per-user read")
+    print(f"{'='*70}\n")
+
+
+def test_indexer_restart_only_replays_new_blocks(log_source, dsce, weth, some_user, tmp_path):
+    """Test that an indexer restarted from its checkpoint skips logs it already applied"""
+
+    checkpoint_path = tmp_path / "checkpoint.json"
+    with boa.env.prank(some_user):
+        weth.approve(dsce, COLLATERAL_AMOUNT)
+        dsce.deposit_and_mint(weth, COLLATERAL_AMOUNT // 2, AMOUNT_TO_MINT)
+    assert PositionIndexer(dsce, log_source, checkpoint_path).sync() == 2
+
+    # More activity, in the same block and in a later one
+    with boa.env.prank(some_user):
+        dsce.deposit_collateral(weth, COLLATERAL_AMOUNT // 4)
+        boa.env.time_travel(blocks=1)
+        dsce.deposit_and_mint(weth, COLLATERAL_AMOUNT // 4, AMOUNT_TO_MINT)
+
+    restarted = PositionIndexer(dsce, log_source, checkpoint_path)
+    assert restarted.debt_of(some_user) == AMOUNT_TO_MINT
+    assert restarted.sync() == 3
+    assert restarted.sync() == 0
+
+    _assert_book_matches_storage(restarted, dsce, [some_user], [weth])
+    print(f"\n🎯 SUCCESS: Restart resumed from the checkpointed cursor")
+
+
+class _HistoryRpc:
+    """Answers eth_getCode like a node on which the engine was deployed at `block`"""
+
+    def __init__(self, block, latest):
+        self.block, self.latest, self.calls = block, latest, 0
+
+    def fetch(self, method, params):
+        if method == "eth_blockNumber":
+            return hex(self.latest)
+        self.calls += 1
+        return "0x60" if int(params[1], 16) >= self.block else "0x"
+
+
+def test_rpc_source_finds_the_deployment_block(dsce):
+    """Test that the first sync starts at the engine's deployment block, not at genesis"""
+    rpc = _HistoryRpc(block=1_234_567, latest=2_000_000)
+    assert RpcLogSource(dsce, rpc).deployment_block() == 1_234_567
+    assert rpc.calls <= 21
+
+
+def test_entry_point_never_deploys_an_engine(dsce):
+    """Test that the entry point refuses pyevm, where it would index a brand new engine"""
+    with pytest.raises(RuntimeError, match="no log history"):
+        moccasin_main()
+
+
+def test_rpc_source_talks_to_the_network_url(dsce):
+    """Test that the default client comes from the network's url, which pyevm does not have"""
+    with pytest.raises(RuntimeError, match="has no url"):
+        RpcLogSource(dsce)
@@ -0,0 +1,160 @@
+import boa
+import pytest
+
+from script.indexer import PositionIndexer, PyevmLogSource
+from script.keeper import LiquidationKeeper, moccasin_main
+from tests.conftest import COLLATERAL_AMOUNT
+
+ONE_WETH = 10**18
+LIQUIDATOR_DSC = 5_000 * 10**18
+
+
+@pytest.fixture(scope="function")
+def log_source(dsce):
+    source = PyevmLogSource(dsce)
+    yield source
+    source.close()
+
+
+def _open_position(dsce, weth, wbtc, weth_amount, wbtc_amount, debt):
+    user = boa.env.generate_address()
+    with boa.env.prank(user):
+        weth.mint_amount(weth_amount)
+        weth.approve(dsce, weth_amount)
+        dsce.deposit_collateral(weth, weth_amount)
+        if wbtc_amount:
+            wbtc.mint_amount(wbtc_amount)
+            wbtc.approve(dsce, wbtc_amount)
+            dsce.deposit_collateral(wbtc, wbtc_amount)
+        dsce.mint_dsc(debt)
+    return user
+
+
+# ------------------------------------------------------------------
+#                           KEEPER TESTS
+# ------------------------------------------------------------------
+def test_keeper_only_liquidates_crossed_positions(
+    log_source, dsce, dsc, weth, wbtc, eth_usd, btc_usd, liquidator, tmp_path
+):
+    """Test that a price tick only checks and liquidates the positions whose trigger it crossed"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Keeper Only Liquidates Crossed Positions")
+    print(f"{'='*70}")
+
+    # ETH and BTC at $2,000. Trigger prices of ETH: 1600, 1300, 1200 and 400
+    risky = _open_position(dsce, weth, wbtc, ONE_WETH, 0, 800 * 10**18)
+    multi = _open_position(dsce, weth, wbtc, ONE_WETH, ONE_WETH // 20, 700 * 10**18)
+    medium = _open_position(dsce, weth, wbtc, ONE_WETH, 0, 600 * 10**18)
+    safe = _open_position(dsce, weth, wbtc, ONE_WETH, 0, 200 * 10**18)
+    with boa.env.prank(liquidator):
+        weth.approve(dsce, COLLATERAL_AMOUNT)
+        dsce.deposit_and_mint(weth, COLLATERAL_AMOUNT, LIQUIDATOR_DSC)
+
+    indexer = PositionIndexer(dsce, log_source, tmp_path / "checkpoint.json")
+    keeper = LiquidationKeeper(dsce, dsc, indexer, [btc_usd, eth_usd], liquidator)
+    assert keeper.triggers[(risky, 1)] == 1600 * 10**8
+    assert keeper.triggers[(multi, 1)] == 1300 * 10**8
+
+    # Nothing ticked: no candidate is even checked
+    assert keeper.poll() == []
+    assert keeper.checked == 0
+
+    eth_usd.updateAnswer(1250 * 10**8)
+    print(f"\n📉 ETH crashed to $1,250")
+    liquidations = keeper.poll()
+    for user, token_index, debt_covered in liquidations:
+        print(f"   Liquidated {user} with token {token_index}: {debt_covered / 10**18:,.2f} DSC")
+    print(f"   Checked {keeper.checked} of {len(indexer.positions)} positions")
+
+    assert sorted(user for user, _, _ in liquidations) == sorted([risky, multi])
+    assert keeper.checked == 2
+    for user in (risky, multi, medium, safe, liquidator):
+        assert dsce.health_factor(user) >= dsce.MIN_HEALTH_FACTOR()
+    assert dsce.user_to_dsc_minted(medium) == 600 * 10**18
+    assert dsce.user_to_dsc_minted(safe) == 200 * 10**18
+
+    # Liquidated positions left the heaps: the same price does nothing
+    assert keeper.poll() == []
+    assert keeper.checked == 2
+
+    print(f"\n🎯 SUCCESS: Only crossed positions were checked and liquidated")
+    print(f"{'='*70}\n")
+
+
+def test_keeper_rekeys_multi_collateral_positions(
+    log_source, dsce, dsc, weth, wbtc, eth_usd, btc_usd, liquidator, tmp_path
+):
+    """Test that a tick of one token moves the trigger of positions that also hold it"""
+
+    multi = _open_position(dsce, weth, wbtc, ONE_WETH, ONE_WETH // 20, 700 * 10**18)
+    with boa.env.prank(liquidator):
+        weth.approve(dsce, COLLATERAL_AMOUNT)
+        dsce.deposit_and_mint(weth, COLLATERAL_AMOUNT, LIQUIDATOR_DSC)
+
+    indexer = PositionIndexer(dsce, log_source, tmp_path / "checkpoint.json")
+    keeper = LiquidationKeeper(dsce, dsc, indexer, [btc_usd, eth_usd], liquidator)
+
+    # BTC going to zero leaves 1 WETH backing 700 DSC: the ETH trigger rises to 1400
+    btc_usd.updateAnswer(1)
+    assert keeper.poll() == []
+    assert keeper.triggers[(multi, 1)] == 1400 * 10**8
+
+    eth_usd.updateAnswer(1350 * 10**8)
+    assert [user for user, _, _ in keeper.poll()] == [multi]
+    assert dsce.health_factor(multi) >= dsce.MIN_HEALTH_FACTOR()
+    print(f"\n🎯 SUCCESS: BTC tick re-keyed the ETH trigger of a multi-collateral position")
+
+
+def test_keeper_entry_point_never_deploys_an_engine(dsce):
+    """Test that the keeper refuses to run against an engine deployed by its own process"""
+    with pytest.raises(RuntimeError, match="no log history"):
+        moccasin_main()
+
+
+def test_keeper_keeps_going_when_a_liquidation_reverts(
+    log_source, dsce, dsc, weth, wbtc, eth_usd, btc_usd, liquidator, tmp_path
+):
+    """Test that a reverting liquidate neither stops the poll nor drops the user from the heaps"""
+
+    stale = _open_position(dsce, weth, wbtc, ONE_WETH, 0, 800 * 10**18)
+    other = _open_position(dsce, weth, wbtc, ONE_WETH, 0, 750 * 10**18)
+    with boa.env.prank(liquidator):
+        weth.approve(dsce, COLLATERAL_AMOUNT)
+        dsce.deposit_and_mint(weth, COLLATERAL_AMOUNT, LIQUIDATOR_DSC)
+
+    indexer = PositionIndexer(dsce, log_source, tmp_path / "checkpoint.json")
+    keeper = LiquidationKeeper(dsce, dsc, indexer, [btc_usd, eth_usd], liquidator)
+    # The indexer is behind the chain: it believes in more debt than there is
+    indexer.positions[stale].debt = 900 * 10**18
+
+    eth_usd.updateAnswer(1250 * 10**8)
+    assert [user for user, _, _ in keeper.poll()] == [other]
+    assert dsce.user_to_dsc_minted(stale) == 800 * 10**18
+    # Re-keyed with the unresolved positions, so the next poll tries again
+    assert (stale, 1) in keeper.triggers
+    assert stale not in keeper.bad_debt
+    print(f"\n🎯 SUCCESS: A reverting liquidation was logged and the poll went on")
+
+
+def test_keeper_reports_unfunded_liquidator_apart_from_bad_debt(
+    log_source, dsce, dsc, weth, wbtc, eth_usd, btc_usd, tmp_path
+):
+    """Test that a liquidator without DSC does not turn healthy-collateral positions into bad debt"""
+
+    risky = _open_position(dsce, weth, wbtc, ONE_WETH, 0, 800 * 10**18)
+    broke_liquidator = boa.env.generate_address()
+
+    indexer = PositionIndexer(dsce, log_source, tmp_path / "checkpoint.json")
+    keeper = LiquidationKeeper(dsce, dsc, indexer, [btc_usd, eth_usd], broke_liquidator)
+
+    eth_usd.updateAnswer(1250 * 10**8)
+    assert keeper.poll() == []
+    assert keeper.unfunded == {risky}
+    assert keeper.bad_debt == set()
+
+    # Collateral worth less than the debt plus bonus is bad debt, funded or not
+    eth_usd.updateAnswer(500 * 10**8)
+    assert keeper.poll() == []
+    assert keeper.bad_debt == {risky}
+    print(f"\n🎯 SUCCESS: An unfunded liquidator is reported apart from bad debt")
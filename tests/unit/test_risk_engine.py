@@ -0,0 +1,86 @@
+import random
+
+import boa
+
+from script.risk_engine import RiskEngine
+from tests.conftest import COLLATERAL_AMOUNT
+
+N_USERS = 12
+N_SCENARIOS = 6
+
+
+def _open_random_positions(dsce, weth, wbtc, rng):
+    """Random WETH/WBTC deposits and debts, each minted at a safe health factor"""
+    users, debts, amounts = [], [], []
+    for _ in range(N_USERS):
+        user = boa.env.generate_address()
+        weth_amount = rng.randrange(1, COLLATERAL_AMOUNT)
+        wbtc_amount = rng.randrange(0, COLLATERAL_AMOUNT)
+        with boa.env.prank(user):
+            weth.mint_amount(weth_amount)
+            weth.approve(dsce, weth_amount)
+            dsce.deposit_collateral(weth, weth_amount)
+            if wbtc_amount:
+                wbtc.mint_amount(wbtc_amount)
+                wbtc.approve(dsce, wbtc_amount)
+                dsce.deposit_collateral(wbtc, wbtc_amount)
+            _, collateral_value = dsce.get_account_information(user)
+            debt = rng.randrange(0, collateral_value // 2)
+            if debt:
+                dsce.mint_dsc(debt)
+        users.append(user)
+        debts.append(debt)
+        # Indexed like COLLATERAL_TOKENS: [wbtc, weth]
+        amounts.append([wbtc_amount, weth_amount])
+    return users, debts, amounts
+
+
+# ------------------------------------------------------------------
+#                       DIFFERENTIAL TESTS
+# ------------------------------------------------------------------
+def test_risk_engine_matches_contract(dsce, weth, wbtc, eth_usd, btc_usd):
+    """Test that the vectorized engine reproduces the contract's health factors bit for bit"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Risk Engine Matches Contract")
+    print(f"{'='*70}")
+
+    rng = random.Random(2024)
+    users, debts, amounts = _open_random_positions(dsce, weth, wbtc, rng)
+    risk_engine = RiskEngine.from_engine(dsce, 2)
+
+    # Crashes and rallies around $1000 BTC / $2000 ETH, with odd prices to exercise the floors
+    prices = [
+        [rng.randrange(10**8, 3000 * 10**8), rng.randrange(10**8, 5000 * 10**8)]
+        for _ in range(N_SCENARIOS)
+    ]
+    # Small chunks, so several blocks are stitched together
+    health_factors = risk_engine.health_factors(debts, amounts, prices, chunk_cells=5)
+    values = risk_engine.usd_values(amounts, prices)
+
+    for s, (btc_price, eth_price) in enumerate(prices):
+        btc_usd.updateAnswer(btc_price)
+        eth_usd.updateAnswer(eth_price)
+        for p, user in enumerate(users):
+            _, collateral_value = dsce.get_account_information(user)
+            assert values[s, p] == collateral_value
+            assert health_factors[s, p] == dsce.health_factor(user)
+        print(f"\n📈 Scenario {s}: BTC ${btc_price / 10**8:,.2f}, ETH ${eth_price / 10**8:,.2f}")
+        print(f"   Liquidatable: {(health_factors[s] < dsce.MIN_HEALTH_FACTOR()).sum()} / {N_USERS}")
+
+    counts = risk_engine.liquidatable_counts(debts, amounts, prices, chunk_cells=7)
+    assert list(counts) == [(row < dsce.MIN_HEALTH_FACTOR()).sum() for row in health_factors]
+
+    print(f"\n🎯 SUCCESS: {N_USERS * N_SCENARIOS} health factors equal the contract's")
+    print(f"{'='*70}\n")
+
+
+def test_price_shocks_floor_like_integers():
+    """Test that shocked prices are floored basis-point moves of the base price"""
+    risk_engine = RiskEngine([10**10], [10**18])
+    shocked = risk_engine.price_shocks([2000 * 10**8 + 1], [[-5000], [0], [333]])
+    assert list(shocked[:, 0]) == [
+        (2000 * 10**8 + 1) * 5000 // 10_000,
+        2000 * 10**8 + 1,
+        (2000 * 10**8 + 1) * 10_333 // 10_000,
+    ]
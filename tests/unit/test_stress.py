@@ -0,0 +1,34 @@
+from script.stress import stream_paths, summarize
+
+N_PATHS = 4
+# Violent enough to liquidate someone in a few steps
+PATH_SETTINGS = dict(n_steps=8, n_users=8, volatility=0.3, seed=7)
+
+
+# ------------------------------------------------------------------
+#                           STRESS TESTS
+# ------------------------------------------------------------------
+def test_stress_paths_stream_from_every_worker():
+    """Test that paths run in worker processes and only depend on their seed and id"""
+
+    print(f"\n{'='*70}")
+    print(f"TEST: Stress Paths Stream From Every Worker")
+    print(f"{'='*70}")
+
+    results = list(stream_paths(n_paths=N_PATHS, workers=2, **PATH_SETTINGS))
+    report = summarize(results)
+    for result in sorted(results):
+        print(f"\n🎲 Path {result.path_id}: {result.liquidations} liquidations, "
+              f"bad debt {result.bad_debt / 10**18:,.2f} DSC, worst step {result.worst_step}")
+
+    assert sorted(result.path_id for result in results) == list(range(N_PATHS))
+    assert report["liquidations"] > 0
+    for result in results:
+        assert result.worst_total_supply > 0
+
+    # Another pool with another worker count replays the same paths
+    replayed = list(stream_paths(n_paths=2, workers=1, **PATH_SETTINGS))
+    assert sorted(replayed) == sorted(results)[:2]
+
+    print(f"\n🎯 SUCCESS: {report['paths']} paths, {report['liquidations']} liquidations")
+    print(f"{'='*70}\n")